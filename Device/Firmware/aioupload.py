@@ -0,0 +1,197 @@
+import json
+import time
+import asyncio
+import logging
+
+import aiohttp
+
+
+class Response:
+    """The parts of a requests.Response the upload handlers use."""
+
+    def __init__(self, status_code, content, timing):
+        self.status_code = status_code
+        self.content     = content
+        self.timing      = timing
+
+    @property
+    def text(self):
+        return self.content.decode(errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+
+def _request_kwargs(kwargs):
+    """Translate requests.post() keyword arguments (as built by
+    uploader.encode_chunk) into aiohttp ones."""
+    files = kwargs.pop('files', None)
+    if files:
+        form = aiohttp.FormData()
+        for name, value in (kwargs.pop('data', None) or {}).items():
+            form.add_field(name, str(value))
+        for name, (filename, content, content_type) in files.items():
+            form.add_field(name, content, filename=filename, content_type=content_type)
+        kwargs['data'] = form
+    return kwargs
+
+
+class AsyncUploadClient:
+    """asyncio counterpart of uploader.UploadClient.
+
+    One aiohttp session whose connector keeps up to `pool_size` connections
+    alive. post() takes the same keyword arguments as UploadClient.post() and
+    returns a Response carrying `timing` phases like UploadClient's, so
+    handlers and stats read the same either way, except that there is no
+    `tls`: aiohttp does the TLS handshake inside connection setup and has no
+    hook between the two, so `connect` covers both. The session is opened on
+    first use, inside the running loop.
+    """
+
+    PHASES = ('connect', 'ttfb', 'total')
+
+    def __init__(self, pool_size=2, timeout=10, headers=None):
+        self.pool_size = pool_size
+        self.timeout   = timeout
+        self.headers   = headers
+        self.session   = None
+
+        self.requests = 0
+        self.reused   = 0
+        self._sum     = dict.fromkeys(self.PHASES, 0.0)
+        self._max     = dict.fromkeys(self.PHASES, 0.0)
+        self.last     = None
+
+    def _open(self):
+        trace = aiohttp.TraceConfig()
+
+        async def connect_start(session, ctx, params):
+            ctx.trace_request_ctx['connect_at'] = time.monotonic()
+
+        async def connect_end(session, ctx, params):
+            timing = ctx.trace_request_ctx
+            timing['connect'] = time.monotonic() - timing.pop('connect_at')
+
+        trace.on_connection_create_start.append(connect_start)
+        trace.on_connection_create_end.append(connect_end)
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.pool_size),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers=self.headers,
+            trace_configs=[trace],
+        )
+
+    async def post(self, url, **kwargs):
+        if self.session is None:
+            self._open()
+        kwargs.pop('timeout', None)
+        phases = {}
+        start  = time.monotonic()
+        async with self.session.post(url, trace_request_ctx=phases,
+                                     **_request_kwargs(kwargs)) as resp:
+            ttfb    = time.monotonic() - start
+            content = await resp.read()
+        timing = {
+            'connect': phases.get('connect', 0.0),   # TCP and TLS
+            'ttfb':    ttfb,
+            'total':   time.monotonic() - start,
+        }
+        self._record(timing, reused='connect' not in phases)
+        return Response(resp.status, content, timing)
+
+    def _record(self, timing, reused):
+        self.requests += 1
+        self.reused   += reused
+        for phase in self.PHASES:
+            self._sum[phase] += timing[phase]
+            self._max[phase] = max(self._max[phase], timing[phase])
+        self.last = timing
+
+    def stats(self):
+        """Request count, connection reuse and mean/max milliseconds per phase."""
+        n = self.requests or 1
+        out = {'requests': self.requests, 'reused': self.reused}
+        for phase in self.PHASES:
+            out[f'{phase}_avg_ms'] = round(self._sum[phase] / n * 1000, 1)
+            out[f'{phase}_max_ms'] = round(self._max[phase] * 1000, 1)
+        return out
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+
+class AsyncUploadPool:
+    """asyncio counterpart of uploader.UploadPool.
+
+    `handler(data, meta)` is a coroutine run as a task on `loop` for each
+    submitted chunk; at most `limit` run at once, plus `priority_limit` for
+    priority items, which never wait behind the bulk stream. Like
+    UploadPool it should return True on success.
+
+    submit() may be called from any thread, even before the loop is running;
+    the task starts once it is. There is no queue policy: the spool in front
+    of the pool already bounds how much is outstanding.
+    """
+
+    def __init__(self, loop, handler, limit=2, priority_limit=1, name='upload'):
+        self.loop     = loop
+        self.handler  = handler
+        self.name     = name
+
+        self._bulk     = asyncio.Semaphore(limit)
+        self._priority = asyncio.Semaphore(priority_limit)
+        self._tasks    = set()
+
+        self.waiting   = 0
+        self.in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed    = 0
+
+    def submit(self, data, meta=None, callback=None, priority=False):
+        """Schedule one chunk. `callback(ok)` runs on the loop once it is done."""
+        self.loop.call_soon_threadsafe(self._start, data, meta or {}, callback, priority)
+        return True
+
+    def _start(self, data, meta, callback, priority):
+        self.submitted += 1
+        task = self.loop.create_task(self._send(data, meta, callback, priority))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, data, meta, callback, priority):
+        self.waiting += 1
+        async with (self._priority if priority else self._bulk):
+            self.waiting   -= 1
+            self.in_flight += 1
+            try:
+                ok = bool(await self.handler(data, meta))
+            except Exception as e:
+                logging.error(f"[{self.name.upper()}][EXCEPTION] {e}")
+                ok = False
+            finally:
+                self.in_flight -= 1
+        if ok:
+            self.completed += 1
+        else:
+            self.failed += 1
+        if callback:
+            try:
+                callback(ok)
+            except Exception as e:
+                logging.error(f"[{self.name.upper()}][CALLBACK] {e}")
+
+    def stats(self):
+        return {
+            'waiting':   self.waiting,
+            'in_flight': self.in_flight,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed':    self.failed,
+        }
+
+    async def close(self, timeout=10):
+        """Let scheduled chunks finish, up to `timeout`."""
+        if self._tasks:
+            await asyncio.wait(self._tasks, timeout=timeout)
@@ -0,0 +1,225 @@
+"""Micro-benchmarks for the recorder's hot paths.
+
+Run on the device (or any machine with requirements.txt installed):
+
+    python3 bench.py encoding
+    python3 bench.py gain
+    python3 bench.py codec
+    python3 bench.py meter
+"""
+import os
+import sys
+import time
+import argparse
+import resource
+import subprocess
+import threading
+
+SAMPLE_RATE      = 88200
+BYTES_PER_SAMPLE = 2
+CHANNELS         = 1
+CHUNK_SIZE       = SAMPLE_RATE * BYTES_PER_SAMPLE * CHANNELS
+
+
+def cpu_time(fn, repeat):
+    """Average process CPU seconds per call."""
+    start = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - start) / repeat
+
+
+def row(label, cpu_s, nbytes):
+    print(f"{label:<12} {cpu_s * 1000:9.2f} ms CPU {nbytes:>10,} bytes on the wire")
+
+
+# === UPLOAD ENCODING ===
+def bench_encoding(args):
+    import requests
+    from uploader import ENCODINGS, encode_chunk
+
+    chunk  = os.urandom(CHUNK_SIZE)
+    fields = {
+        "userId": "bench",
+        "timestamp": int(time.time() * 1000),
+        "chunkId": "bench-chunk-1",
+        "sessionId": "bench",
+    }
+
+    def prepare(encoding):
+        # Build exactly the request requests.post() would send, without the network
+        kwargs = encode_chunk(encoding, chunk, fields)
+        return requests.Request('POST', 'http://localhost/api/audio/upload', **kwargs).prepare()
+
+    print(f"Per {CHUNK_SIZE:,}-byte chunk, averaged over {args.repeat} runs:")
+    for encoding in ENCODINGS:
+        req = prepare(encoding)
+        body = len(req.body)
+        head = sum(len(k) + len(v) + 4 for k, v in req.headers.items())
+        row(encoding, cpu_time(lambda: prepare(encoding), args.repeat), body + head)
+
+
+# === GAIN STAGE ===
+def test_signal(seconds):
+    import numpy as np
+    t = np.arange(SAMPLE_RATE * seconds) / SAMPLE_RATE
+    x = 4000 * np.sin(2 * np.pi * 440 * t) + 300 * np.random.randn(len(t)) + 200
+    return x.astype('<i2').tobytes()
+
+
+def report(label, cpu_s, latencies, seconds):
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    print(f"{label:<8} {cpu_s / seconds * 100:6.2f}% of one core  "
+          f"chunk latency p50 {p50:7.2f} ms  p99 {p99:7.2f} ms")
+
+
+def bench_gain(args):
+    from dsp import build_chain
+
+    audio  = test_signal(args.seconds)
+    chunks = [audio[i:i + CHUNK_SIZE] for i in range(0, len(audio), CHUNK_SIZE)]
+    print(f"{args.seconds} s of {SAMPLE_RATE} Hz mono S16_LE in {CHUNK_SIZE:,}-byte chunks")
+
+    # in-process NumPy chain
+    chain = build_chain(args.gain, remove_dc=True, limiter=True)
+    latencies = []
+    cpu_start = time.process_time()
+    for chunk in chunks:
+        start = time.perf_counter()
+        chain.process(chunk)
+        latencies.append(time.perf_counter() - start)
+    cpu = time.process_time() - cpu_start
+    report('numpy', cpu, latencies, args.seconds)
+
+    # sox subprocess, fed and drained through pipes like the old recorder
+    try:
+        sox = subprocess.Popen([
+            'sox',
+            '-t', 'raw', '-r', str(SAMPLE_RATE),
+            '-e', 'signed-integer', '-b', '16', '-c', str(CHANNELS), '-',
+            '-t', 'raw', '-',
+            'gain', str(args.gain)
+        ], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except FileNotFoundError:
+        print(f"{'sox':<8} skipped (not installed)")
+        return
+    sent = []
+
+    def feed():
+        for chunk in chunks:
+            sent.append(time.perf_counter())
+            sox.stdin.write(chunk)
+            sox.stdin.flush()
+        sox.stdin.close()
+
+    latencies = []
+    children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu_start = time.process_time()
+    writer = threading.Thread(target=feed)
+    writer.start()
+    for i in range(len(chunks)):
+        if not sox.stdout.read(len(chunks[i])):
+            break
+        latencies.append(time.perf_counter() - sent[i])
+    writer.join()
+    sox.wait()
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (time.process_time() - cpu_start
+           + children.ru_utime - children_before.ru_utime
+           + children.ru_stime - children_before.ru_stime)
+    report('sox', cpu, latencies, args.seconds)
+
+
+# === UPLOAD CODECS ===
+CODEC_SETTINGS = [
+    ('pcm',  {}),
+    ('opus', {'bitrate_kbps': 16, 'frame_ms': 20}),
+    ('opus', {'bitrate_kbps': 24, 'frame_ms': 20}),
+    ('opus', {'bitrate_kbps': 32, 'frame_ms': 20}),
+    ('opus', {'bitrate_kbps': 64, 'frame_ms': 20}),
+    ('opus', {'bitrate_kbps': 24, 'frame_ms': 60}),
+]
+
+
+def bench_codec(args):
+    from codec import make_codec
+
+    audio  = test_signal(args.seconds)
+    chunks = [audio[i:i + CHUNK_SIZE] for i in range(0, len(audio), CHUNK_SIZE)]
+    print(f"{args.seconds} s of {SAMPLE_RATE} Hz mono, streamed chunk by chunk:")
+
+    for name, options in CODEC_SETTINGS:
+        codec = make_codec(name, SAMPLE_RATE, CHANNELS, **options)
+        children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu_start = time.process_time()
+
+        try:
+            codec.start()
+        except FileNotFoundError as e:
+            print(f"{codec!r:<58} skipped ({e.filename} not installed)")
+            continue
+        sent = sum(len(codec.encode(chunk)) for chunk in chunks)
+        sent += len(codec.finish())
+
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu = (time.process_time() - cpu_start
+               + children.ru_utime - children_before.ru_utime
+               + children.ru_stime - children_before.ru_stime)
+        print(f"{codec!r:<58} {sent * 8 / args.seconds / 1000:8.1f} kbit/s "
+              f"{sent / len(audio) * 100:6.1f}% of PCM  {cpu / args.seconds * 100:6.2f}% of one core")
+
+
+# === LEVEL METER ===
+def bench_meter(args):
+    import numpy as np
+    from dsp import measure
+
+    audio = test_signal(args.seconds)
+    # the same signal driven into the rails, the worst case for clip counting
+    hot   = np.clip(np.frombuffer(audio, '<i2').astype(np.int32) * 10, -32768, 32767)
+    hot   = hot.astype('<i2').tobytes()
+    print(f"{args.seconds} s of {SAMPLE_RATE} Hz mono S16_LE in {CHUNK_SIZE:,}-byte chunks")
+
+    for label, source in (('normal', audio), ('clipping', hot)):
+        chunks = [source[i:i + CHUNK_SIZE] for i in range(0, len(source), CHUNK_SIZE)]
+        latencies = []
+        cpu_start = time.process_time()
+        for chunk in chunks:
+            start = time.perf_counter()
+            level = measure(chunk)
+            latencies.append(time.perf_counter() - start)
+        cpu = time.process_time() - cpu_start
+        report(label, cpu, latencies, args.seconds)
+        print(f"{'':<8} last chunk: {level.rms_dbfs:.1f} dBFS rms, "
+              f"{level.peak_dbfs:.1f} dBFS peak, {level.clipped} samples clipped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='bench', required=True)
+
+    p = sub.add_parser('encoding', help='CPU and wire size of each upload encoding')
+    p.add_argument('--repeat', type=int, default=20)
+    p.set_defaults(func=bench_encoding)
+
+    p = sub.add_parser('gain', help='NumPy gain/DC/limiter chain against the old sox pipe')
+    p.add_argument('--seconds', type=int, default=60)
+    p.add_argument('--gain', type=float, default=10)
+    p.set_defaults(func=bench_gain)
+
+    p = sub.add_parser('codec', help='Bandwidth and CPU for each upload codec setting')
+    p.add_argument('--seconds', type=int, default=60)
+    p.set_defaults(func=bench_codec)
+
+    p = sub.add_parser('meter', help='CPU of the per-chunk RMS/peak/clip meter')
+    p.add_argument('--seconds', type=int, default=60)
+    p.set_defaults(func=bench_meter)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
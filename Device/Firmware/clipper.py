@@ -0,0 +1,108 @@
+import io
+import time
+import wave
+import logging
+import threading
+
+
+class HighlightClipper:
+    """Cuts highlight clips out of the capture ring's in-memory pre-roll.
+
+    mark() notes the stream position at the moment the button is pressed.
+    Attached to the ring as a consumer, the clipper waits until
+    `post_seconds` more audio has been captured, then copies the
+    `pre_seconds` before the press through the end of the post-roll out of
+    the ring and hands it to `on_clip(wav_bytes, info)` as a WAV file. The
+    ring must hold pre + post seconds plus whatever the clipper lags by;
+    audio the ring no longer holds (or that predates the session) is
+    trimmed from the start of the clip.
+
+    `info` has the session, the clip number, the press and clip positions in
+    samples from the start of the session, and the wall-clock time of the
+    press.
+    """
+
+    def __init__(self, ring, sample_rate, channels, sampwidth=2,
+                 pre_seconds=10, post_seconds=10, on_clip=None, session=None,
+                 name='clipper'):
+        self.ring         = ring
+        self.session      = session
+        self.sample_rate  = sample_rate
+        self.channels     = channels
+        self.sampwidth    = sampwidth
+        self.frame_bytes  = sampwidth * channels
+        self.pre_frames   = int(pre_seconds * sample_rate)
+        self.post_frames  = int(post_seconds * sample_rate)
+        self.on_clip      = on_clip
+        self.name         = name
+
+        self._lock    = threading.Lock()
+        self._pending = []       # clip info dicts waiting for their post-roll
+        self.marked   = 0
+        self.cut      = 0
+        self.trimmed  = 0
+
+    def mark(self):
+        """Note a highlight at the current capture position. Returns its info."""
+        ring  = self.ring
+        frame = ring.bytes_written // self.frame_bytes
+        if ring.written_at is not None:
+            # audio captured since the last chunk landed in the ring
+            since = int((time.monotonic() - ring.written_at) * self.sample_rate)
+            frame += min(since, ring.last_length // self.frame_bytes)
+        with self._lock:
+            self.marked += 1
+            info = {
+                'session':    self.session,
+                'clip':       self.marked,
+                'press':      frame,
+                'start':      max(0, frame - self.pre_frames),
+                'end':        frame + self.post_frames,
+                'press_time': time.time(),
+            }
+            self._pending.append(info)
+        return dict(info)
+
+    def on_chunk(self, view, info):
+        """Ring consumer: cut every clip whose post-roll is now in the ring."""
+        captured = self.ring.bytes_written // self.frame_bytes
+        with self._lock:
+            ready = [c for c in self._pending if c['end'] <= captured]
+            self._pending = [c for c in self._pending if c['end'] > captured]
+        for info in ready:
+            self._cut(info)
+
+    def flush(self):
+        """Cut pending clips with whatever post-roll was captured (stream stopped)."""
+        with self._lock:
+            ready, self._pending = self._pending, []
+        for info in ready:
+            self._cut(info)
+
+    def stats(self):
+        with self._lock:
+            return {'marked': self.marked, 'cut': self.cut,
+                    'trimmed': self.trimmed, 'pending': len(self._pending)}
+
+    def _cut(self, info):
+        first, pcm = self.ring.copy(info['start'] * self.frame_bytes,
+                                    info['end'] * self.frame_bytes)
+        if not pcm:
+            logging.warning(f"[{self.name.upper()}] Highlight {info['clip']} is no longer in the ring")
+            return
+        start = first // self.frame_bytes
+        if start > info['start']:
+            self.trimmed += 1
+            logging.warning(f"[{self.name.upper()}] Highlight {info['clip']} lost "
+                            f"{(start - info['start']) / self.sample_rate:.1f}s of pre-roll")
+        info = dict(info, start=start, end=start + len(pcm) // self.frame_bytes)
+
+        buf = io.BytesIO()
+        with wave.open(buf, 'wb') as wf:
+            wf.setnchannels(self.channels)
+            wf.setsampwidth(self.sampwidth)
+            wf.setframerate(self.sample_rate)
+            wf.writeframes(pcm)
+        self.cut += 1
+        if self.on_clip:
+            self.on_clip(buf.getvalue(), info)
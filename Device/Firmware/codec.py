@@ -0,0 +1,124 @@
+import os
+import subprocess
+import threading
+
+
+class PcmCodec:
+    """Pass-through: chunks go out as the raw S16_LE PCM they were captured as."""
+
+    name = 'pcm'
+    ext  = 'raw'
+    mime = 'audio/raw'
+
+    def __init__(self, sample_rate, channels):
+        self.sample_rate = sample_rate
+        self.channels    = channels
+
+    def start(self):
+        pass
+
+    def encode(self, pcm):
+        return pcm
+
+    def drain(self):
+        """Whatever encoded data is ready, without feeding the encoder."""
+        return b''
+
+    def finish(self):
+        return b''
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.sample_rate} Hz, {self.channels} ch)"
+
+
+class OpusCodec(PcmCodec):
+    """Streams PCM through a long-running `opusenc` and returns Ogg/Opus bytes.
+
+    One encoder runs per session. encode() feeds a PCM chunk and returns
+    whatever Ogg data the encoder has produced so far, so each upload carries
+    the next slice of a single Ogg stream; concatenated in order they form a
+    playable .opus file. `max_delay_ms` bounds how long opusenc holds a page
+    back before flushing it.
+    """
+
+    name = 'opus'
+    ext  = 'opus'
+    mime = 'audio/ogg'
+
+    def __init__(self, sample_rate, channels, bitrate_kbps=24, frame_ms=20,
+                 max_delay_ms=200, speech=True):
+        super().__init__(sample_rate, channels)
+        self.bitrate_kbps = bitrate_kbps
+        self.frame_ms     = frame_ms
+        self.max_delay_ms = max_delay_ms
+        self.speech       = speech
+        self._proc    = None
+        self._reader  = None
+        self._lock    = threading.Lock()
+        self._pending = bytearray()
+
+    def command(self):
+        return [
+            'opusenc', '--quiet',
+            '--raw', '--raw-bits', '16', '--raw-endianness', '0',
+            '--raw-rate', str(self.sample_rate), '--raw-chan', str(self.channels),
+            '--bitrate', str(self.bitrate_kbps),
+            '--framesize', str(self.frame_ms),
+            '--max-delay', str(self.max_delay_ms),
+            '--speech' if self.speech else '--music',
+            '-', '-'
+        ]
+
+    def start(self):
+        self._proc = subprocess.Popen(
+            self.command(), stdin=subprocess.PIPE, stdout=subprocess.PIPE, bufsize=0
+        )
+        self._reader = threading.Thread(target=self._drain, daemon=True)
+        self._reader.start()
+
+    def _drain(self):
+        fd = self._proc.stdout.fileno()
+        while True:
+            data = os.read(fd, 65536)
+            if not data:
+                break
+            with self._lock:
+                self._pending += data
+
+    def _take(self):
+        with self._lock:
+            out = bytes(self._pending)
+            self._pending.clear()
+        return out
+
+    def encode(self, pcm):
+        self._proc.stdin.write(pcm)
+        return self._take()
+
+    def drain(self):
+        return self._take()
+
+    def finish(self):
+        """Close the encoder and return the last pages of the stream."""
+        if not self._proc:
+            return b''
+        self._proc.stdin.close()
+        self._proc.wait()
+        self._reader.join()
+        self._proc = None
+        return self._take()
+
+    def __repr__(self):
+        return (f"{type(self).__name__}({self.sample_rate} Hz, {self.channels} ch, "
+                f"{self.bitrate_kbps} kbps, {self.frame_ms} ms frames)")
+
+
+CODECS = {c.name: c for c in (PcmCodec, OpusCodec)}
+
+
+def make_codec(name, sample_rate, channels, **options):
+    if name not in CODECS:
+        raise ValueError(f"Unknown codec: {name}")
+    if name == 'pcm':
+        return PcmCodec(sample_rate, channels)
+    return CODECS[name](sample_rate, channels, **options)
@@ -0,0 +1,264 @@
+from math import gcd, ceil, log10, sqrt
+from collections import namedtuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+INT16_SCALE = 32768.0
+
+
+class Stage:
+    """One step of the in-process DSP chain.
+
+    process() takes and returns a float32 array of samples in [-1, 1)
+    (longer runs may overshoot until the chain clips at the end). Stages
+    may keep state between chunks and may work in place.
+    """
+
+    def process(self, x):
+        raise NotImplementedError
+
+    def __repr__(self):
+        args = ', '.join(f"{k}={v!r}" for k, v in vars(self).items() if not k.startswith('_'))
+        return f"{type(self).__name__}({args})"
+
+
+class Gain(Stage):
+    """Fixed gain in dB, the equivalent of `sox ... gain <db>`."""
+
+    def __init__(self, db):
+        self.db = db
+        self._factor = np.float32(10 ** (db / 20))
+
+    def process(self, x):
+        x *= self._factor
+        return x
+
+
+class DCBlock(Stage):
+    """Removes DC offset by subtracting a running average of chunk means.
+
+    `smoothing` is the weight of each new chunk; 0.1 with one-second chunks
+    settles in roughly ten seconds.
+    """
+
+    def __init__(self, smoothing=0.1):
+        self.smoothing = smoothing
+        self._dc = None
+
+    def process(self, x):
+        if not len(x):
+            return x
+        mean = float(x.mean())
+        self._dc = mean if self._dc is None else self._dc + self.smoothing * (mean - self._dc)
+        x -= np.float32(self._dc)
+        return x
+
+
+class Limiter(Stage):
+    """Soft-knee limiter: samples past `threshold` are bent towards full scale with tanh."""
+
+    def __init__(self, threshold=0.9):
+        self.threshold = threshold
+
+    def process(self, x):
+        t = np.float32(self.threshold)
+        over = np.abs(x) > t
+        if over.any():
+            knee = np.float32(1 - self.threshold)
+            y = x[over]
+            x[over] = np.sign(y) * (t + knee * np.tanh((np.abs(y) - t) / knee))
+        return x
+
+
+class Resampler(Stage):
+    """Streaming rational-ratio polyphase resampler.
+
+    A Kaiser-windowed sinc low-pass is designed at the upsampled rate and
+    split into `up` phases; each output sample is one dot product of a phase
+    against the most recent input samples, so nothing is ever zero-stuffed.
+    `zero_crossings` per side sets the quality (and cost) of the filter. The
+    tail of each chunk is kept so chunk boundaries are seamless.
+    """
+
+    BLOCK = 4096    # outputs computed per vectorised step, bounds temporary memory
+
+    def __init__(self, rate_in, rate_out, zero_crossings=16, beta=8.0, rolloff=0.92):
+        self.rate_in  = rate_in
+        self.rate_out = rate_out
+        g = gcd(rate_in, rate_out)
+        self._up, self._down = rate_out // g, rate_in // g
+
+        # taps per phase = input samples each output looks at
+        taps = ceil(2 * zero_crossings * max(self._up, self._down) / self._up)
+        n    = taps * self._up
+        cutoff = rolloff / max(self._up, self._down)    # fraction of the upsampled Nyquist
+        k = np.arange(n) - (n - 1) / 2
+        h = cutoff * np.sinc(cutoff * k) * np.kaiser(n, beta) * self._up
+
+        # phases[p, i] = h[p + i*up], reversed so it lines up with a forward window
+        self._phases = np.ascontiguousarray(h.reshape(taps, self._up).T[:, ::-1], dtype=np.float32)
+        self._taps   = taps
+        self._hist   = np.zeros(taps - 1, dtype=np.float32)
+        self._t      = 0    # upsampled-time position of the next output within the chunk
+
+    def process(self, x):
+        if self._up == self._down:
+            return x
+        buf = np.concatenate((self._hist, x))
+        up, down = self._up, self._down
+
+        ts = np.arange(self._t, len(x) * up, down)
+        self._t = (ts[-1] + down if len(ts) else self._t) - len(x) * up
+        self._hist = buf[len(buf) - (self._taps - 1):].copy()
+
+        windows = sliding_window_view(buf, self._taps)
+        out = np.empty(len(ts), dtype=np.float32)
+        for start in range(0, len(ts), self.BLOCK):
+            t = ts[start:start + self.BLOCK]
+            out[start:start + len(t)] = np.einsum(
+                'ij,ij->i', windows[t // up], self._phases[t % up])
+        return out
+
+
+class Chain:
+    """Runs S16_LE PCM chunks through a list of stages.
+
+    Stages see normalised float32 samples; the result is clipped back into
+    int16, and the number of clipped samples is kept in `clipped`.
+    """
+
+    def __init__(self, stages=()):
+        self.stages  = list(stages)
+        self.clipped = 0
+
+    def append(self, stage):
+        self.stages.append(stage)
+        return self
+
+    def process(self, chunk):
+        if not self.stages:
+            return chunk
+        x = np.frombuffer(chunk, dtype='<i2').astype(np.float32)
+        x *= np.float32(1 / INT16_SCALE)
+        for stage in self.stages:
+            x = stage.process(x)
+        x *= np.float32(INT16_SCALE)
+        over = (x > 32767) | (x < -32768)
+        self.clipped += int(np.count_nonzero(over))
+        np.clip(x, -32768, 32767, out=x)
+        np.rint(x, out=x)
+        return x.astype('<i2').tobytes()
+
+    def __repr__(self):
+        return f"Chain({self.stages!r})"
+
+
+def build_chain(gain_db=0, remove_dc=False, limiter=False, rate_in=None, rate_out=None):
+    """The recorder's standard chain: resampling if the rates differ, then
+    optional DC removal, gain and limiter on the (smaller) output stream."""
+    chain = Chain()
+    if rate_in and rate_out and rate_in != rate_out:
+        chain.append(Resampler(rate_in, rate_out))
+    if remove_dc:
+        chain.append(DCBlock())
+    if gain_db:
+        chain.append(Gain(gain_db))
+    if limiter:
+        chain.append(Limiter())
+    return chain
+
+
+# Level of one chunk: rms and peak in dBFS (never below FLOOR_DBFS, so
+# digital silence stays a finite number) and the samples at full scale.
+Level = namedtuple('Level', 'rms_dbfs peak_dbfs clipped')
+
+FLOOR_DBFS = -120.0
+
+
+def _dbfs(ratio):
+    return max(FLOOR_DBFS, 20 * log10(ratio)) if ratio > 0 else FLOOR_DBFS
+
+
+def measure(chunk):
+    """Level of an S16_LE chunk, read in place.
+
+    One min/max pass gives the peak; samples at full scale are only counted
+    when the peak says there are any, and the energy is a single float32 dot
+    product, so a second of 88.2 kHz audio costs well under a millisecond.
+    """
+    x = np.frombuffer(chunk, dtype='<i2')
+    if not x.size:
+        return Level(FLOOR_DBFS, FLOOR_DBFS, 0)
+    lo, hi = int(x.min()), int(x.max())
+    clipped = 0
+    if hi >= 32767 or lo <= -32767:
+        clipped = int(np.count_nonzero((x >= 32767) | (x <= -32767)))
+    y = x.astype(np.float32)
+    rms = sqrt(float(np.dot(y, y)) / x.size)
+    return Level(_dbfs(rms / INT16_SCALE), _dbfs(max(hi, -lo) / INT16_SCALE), clipped)
+
+
+class VoiceDetector:
+    """Energy and zero-crossing voice activity detector for S16_LE chunks.
+
+    Each chunk is cut into `window_ms` windows and all of them are scored in
+    one vectorised pass. A window is active when its energy is `margin_db`
+    above the tracked noise floor, or at least half that with a crossing rate
+    in `zcr_range` (quiet fricatives like "s" and "f" are noisy rather than
+    loud). A chunk is speech when `min_windows` windows are active, and stays
+    speech for `hangover` more chunks so pauses between words are kept.
+
+    The noise floor follows the quietest tenth of the windows: straight down
+    when the room gets quieter, slowly (`floor_rise` per chunk) when it gets
+    louder. The floor never goes below `min_db`.
+    """
+
+    def __init__(self, sample_rate, channels=1, window_ms=20, margin_db=10,
+                 min_db=-55, zcr_range=(0.1, 0.5), min_windows=3, hangover=2,
+                 floor_rise=0.1):
+        self.window      = max(1, sample_rate * window_ms // 1000)
+        self.channels    = channels
+        self.margin_db   = margin_db
+        self.min_db      = min_db
+        self.zcr_range   = zcr_range
+        self.min_windows = min_windows
+        self.hangover    = hangover
+        self.floor_rise  = floor_rise
+        self.floor_db    = None
+        self._hold       = 0
+
+    def is_speech(self, chunk):
+        x = np.frombuffer(chunk, dtype='<i2')
+        if self.channels > 1:
+            x = x[:len(x) - len(x) % self.channels].reshape(-1, self.channels).mean(axis=1)
+        n = len(x) // self.window
+        if not n:
+            return bool(self._hold)
+        w = x[:n * self.window].reshape(n, self.window).astype(np.float32)
+        w *= np.float32(1 / INT16_SCALE)
+
+        energy = 10 * np.log10(np.mean(np.square(w), axis=1) + np.float32(1e-12))
+        zcr = np.count_nonzero(np.diff(np.signbit(w), axis=1), axis=1) / self.window
+
+        quiet = max(float(np.percentile(energy, 10)), self.min_db)
+        if self.floor_db is None or quiet < self.floor_db:
+            self.floor_db = quiet
+        else:
+            self.floor_db += self.floor_rise * (quiet - self.floor_db)
+        floor = self.floor_db
+
+        lo, hi = self.zcr_range
+        active = (energy > floor + self.margin_db) | (
+            (energy > floor + self.margin_db / 2) & (zcr >= lo) & (zcr <= hi))
+        if int(np.count_nonzero(active)) >= self.min_windows:
+            self._hold = self.hangover
+            return True
+        if self._hold:
+            self._hold -= 1
+            return True
+        return False
+
+    def reset(self):
+        self.floor_db = None
+        self._hold    = 0
@@ -0,0 +1,87 @@
+import struct
+import zlib
+
+# Self-describing chunk envelope understood by upload.php.
+#
+#   offset size field
+#        0    4 magic          b'SCRB'
+#        4    1 version        1
+#        5    1 codec          0 = PCM, 1 = Ogg/Opus
+#        6    1 channels
+#        7    1 bits per sample
+#        8    2 header length  bytes before the payload
+#       10    2 flags          bit 0: last chunk of the session
+#                              bit 1: silence marker, no payload; `frames`
+#                                     (v2) frames of silence
+#       12    4 sample rate
+#       16    4 seq            chunk number within the session, from 1
+#       20    8 byte offset    where the payload goes in the session stream
+#       28    8 sample offset  frames captured before this chunk
+#       36    8 capture time   unix epoch, microseconds
+#       44    4 payload length
+#       48    4 crc32          of the payload
+#   version 2 appends:
+#       52    8 capture mono   monotonic clock, microseconds
+#       60    4 frames         frames of audio captured for this chunk
+#   version 3 appends:
+#       64    2 rms            hundredths of a dBFS
+#       66    2 peak           hundredths of a dBFS
+#       68    4 clipped        samples at full scale
+#
+# All fields are little-endian. Readers must skip `header length` bytes so
+# later versions can append fields.
+
+MAGIC      = b'SCRB'
+VERSION    = 3
+HEADER     = struct.Struct('<4sBBBBHHIIQQqII')
+EXTENSION  = struct.Struct('<qI')          # version 2 fields
+LEVELS     = struct.Struct('<hhI')         # version 3 fields
+HEADER_LEN = HEADER.size + EXTENSION.size + LEVELS.size
+
+FLAG_FINAL   = 1
+FLAG_SILENCE = 2
+
+CODEC_IDS = {'pcm': 0, 'opus': 1}
+CODEC_NAMES = {v: k for k, v in CODEC_IDS.items()}
+
+
+def pack(payload, seq, byte_offset, sample_offset, capture_us,
+         codec='pcm', sample_rate=16000, channels=1, bits=16, flags=0,
+         mono_us=0, frames=0, rms_dbfs=0.0, peak_dbfs=0.0, clipped=0):
+    header = HEADER.pack(
+        MAGIC, VERSION, CODEC_IDS[codec], channels, bits, HEADER_LEN, flags,
+        sample_rate, seq, byte_offset, sample_offset, capture_us,
+        len(payload), zlib.crc32(payload),
+    )
+    levels = LEVELS.pack(_centi(rms_dbfs), _centi(peak_dbfs), clipped)
+    return header + EXTENSION.pack(mono_us, frames) + levels + payload
+
+
+def _centi(db):
+    return max(-32768, min(32767, round(db * 100)))
+
+
+def unpack(data):
+    """Split an envelope into (fields, payload). Raises ValueError if it is damaged."""
+    if len(data) < HEADER.size or data[:4] != MAGIC:
+        raise ValueError("not a chunk envelope")
+    (_, version, codec, channels, bits, header_len, flags, sample_rate, seq,
+     byte_offset, sample_offset, capture_us, length, crc) = HEADER.unpack_from(data)
+    payload = data[header_len:header_len + length]
+    if len(payload) != length:
+        raise ValueError("truncated payload")
+    if zlib.crc32(payload) != crc:
+        raise ValueError("checksum mismatch")
+    fields = {
+        'version': version, 'codec': CODEC_NAMES.get(codec, codec),
+        'channels': channels, 'bits': bits, 'sample_rate': sample_rate,
+        'seq': seq, 'byte_offset': byte_offset, 'sample_offset': sample_offset,
+        'capture_us': capture_us, 'flags': flags,
+        'mono_us': 0, 'frames': 0, 'rms_dbfs': None, 'peak_dbfs': None, 'clipped': 0,
+    }
+    if header_len >= HEADER.size + EXTENSION.size:
+        fields['mono_us'], fields['frames'] = EXTENSION.unpack_from(data, HEADER.size)
+    if header_len >= HEADER_LEN:
+        rms, peak, fields['clipped'] = LEVELS.unpack_from(data, HEADER.size + EXTENSION.size)
+        fields['rms_dbfs'], fields['peak_dbfs'] = rms / 100, peak / 100
+    return fields, payload
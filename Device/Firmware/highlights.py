@@ -0,0 +1,74 @@
+import os
+import json
+import queue
+import logging
+import datetime
+import threading
+
+CSV_HEADER = 'event,press_sample,start_sample,end_sample,sample_rate,press_time\n'
+
+
+class HighlightLog:
+    """Append-only stream of highlight events, recorded off the button thread.
+
+    press() only queues the event, so the gpiozero callback never touches the
+    disk or the network. A writer thread appends each event as one line to
+    the local `{session}_Highlights.csv` and as one JSON line to `spool`,
+    which delivers it on its own, independent of the audio backlog. Events
+    carry sample offsets into the session and an id, `{session}-{event}`,
+    that lets the server drop the duplicates a retry produces.
+    """
+
+    def __init__(self, directory, spool, sample_rate, name='highlights'):
+        self.directory   = directory
+        self.spool       = spool
+        self.sample_rate = sample_rate
+        self.name        = name
+        self._queue      = queue.Queue()
+        self.recorded    = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._writer, name=f"{name}-writer", daemon=True)
+        self._thread.start()
+
+    def press(self, mark):
+        """Queue one event. `mark` is the HighlightClipper.mark() result."""
+        self._queue.put(dict(
+            id=f"{mark['session']}-{mark['clip']}",
+            session=mark['session'],
+            event=mark['clip'],
+            press_sample=mark['press'],
+            start_sample=mark['start'],
+            end_sample=mark['end'],
+            sample_rate=self.sample_rate,
+            press_time=mark['press_time'],
+        ))
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _writer(self):
+        while True:
+            event = self._queue.get()
+            if event is None:
+                return
+            try:
+                self._write_csv(event)
+                self.spool.append(json.dumps(event).encode() + b'\n', {
+                    'is_event': True,
+                    'session':  event['session'],
+                    'event':    event['event'],
+                })
+                self.recorded += 1
+            except Exception as e:
+                logging.error(f"[{self.name.upper()}][ERROR] Event {event['id']}: {e}")
+
+    def _write_csv(self, event):
+        path = os.path.join(self.directory, f"{event['session']}_Highlights.csv")
+        press_time = datetime.datetime.fromtimestamp(event['press_time']).isoformat(timespec='milliseconds')
+        with open(path, 'a') as f:
+            if f.tell() == 0:
+                f.write(CSV_HEADER)
+            f.write(f"{event['event']},{event['press_sample']},{event['start_sample']},"
+                    f"{event['end_sample']},{event['sample_rate']},{press_time}\n")
@@ -0,0 +1,163 @@
+import math
+import time
+import threading
+
+IDLE      = 'idle'
+RECORDING = 'recording'
+
+TICK = 0.05     # seconds per animation frame
+
+
+def _table(period, fn):
+    """One period of an animation as (r, g, b) frames, TICK apart."""
+    n = max(1, round(period / TICK))
+    return tuple(tuple(round(v, 3) for v in fn(i / n)) for i in range(n))
+
+
+def _pulse(period, rgb):
+    return _table(period, lambda p: tuple(c * (math.sin(2 * math.pi * p) + 1) / 2 for c in rgb))
+
+
+# precomputed once; the controller only indexes into these
+CROSSFADE   = _table(4.0, lambda p: (0, 0.5 * (1 - math.cos(2 * math.pi * p)),
+                                     0.5 * (1 + math.cos(2 * math.pi * p))))
+PULSE_BLUE  = _pulse(2.0, (0, 0, 1))
+PULSE_GREEN = _pulse(2.0, (0, 1, 0))
+PULSE_RED   = _pulse(1.0, (1, 0, 0))
+SLOW_BLUE   = _pulse(3.0, (0, 0, 1))
+SOLID_GREEN = ((0, 1, 0),)
+
+
+class LedController:
+    """Event-driven RGB status LED.
+
+    The recorder reports events (mode changes, highlights, upload state,
+    errors) and a single thread works out which animation applies:
+
+        flash       a fixed colour for a moment (startup)
+        error       red pulse while the last upload failed
+        highlight   green pulse for `seconds` after a press
+        recording   blue pulse for the first 5 s, then solid green
+        idle        slow blue pulse while uploads drain, otherwise the
+                    blue/green crossfade
+
+    Animated states step through precomputed tables every TICK. A static
+    colour is written once and the thread then sleeps until the next event
+    or timed transition, and PWM values are only touched when they change.
+
+    Given an asyncio `loop`, frames are driven by call_later() on that loop
+    instead of a thread of their own.
+    """
+
+    def __init__(self, red, green, blue, intro_seconds=5, loop=None):
+        self.leds          = (red, green, blue)
+        self.intro_seconds = intro_seconds
+
+        self._cond      = threading.Condition()
+        self._mode      = IDLE
+        self._since     = time.monotonic()     # when the current mode began
+        self._highlight = (0, 0)               # (start, until)
+        self._flash     = (None, 0)            # (colour, until)
+        self._uploading = False
+        self._error     = False
+        self._shown     = None
+        self.writes     = 0
+        self._loop      = loop
+        self._timer     = None
+
+        if loop is not None:
+            self._thread = None
+            loop.call_soon_threadsafe(self._step)
+        else:
+            self._thread = threading.Thread(target=self._run, name='leds', daemon=True)
+            self._thread.start()
+
+    # === EVENTS ===
+    def set_mode(self, mode):
+        with self._cond:
+            if mode != self._mode:
+                self._mode  = mode
+                self._since = time.monotonic()
+                if mode == IDLE:
+                    self._highlight = (0, 0)
+                self._wake()
+
+    def highlight(self, seconds=10):
+        with self._cond:
+            now = time.monotonic()
+            self._highlight = (now, now + seconds)
+            self._wake()
+
+    def flash(self, rgb, seconds):
+        with self._cond:
+            self._flash = (rgb, time.monotonic() + seconds)
+            self._wake()
+
+    def set_uploading(self, uploading):
+        self._set('_uploading', uploading)
+
+    def set_error(self, error):
+        self._set('_error', error)
+
+    def _set(self, name, value):
+        with self._cond:
+            if getattr(self, name) != value:
+                setattr(self, name, value)
+                self._wake()
+
+    # === ANIMATION ===
+    def _animation(self, now):
+        """(frames, start time, time this choice expires or None)."""
+        colour, until = self._flash
+        if now < until:
+            return (colour,), now, until
+        if self._error:
+            return PULSE_RED, self._since, None
+        start, until = self._highlight
+        if now < until:
+            return PULSE_GREEN, start, until
+        if self._mode == RECORDING:
+            intro_end = self._since + self.intro_seconds
+            if now < intro_end:
+                return PULSE_BLUE, self._since, intro_end
+            return SOLID_GREEN, intro_end, None
+        if self._uploading:
+            return SLOW_BLUE, self._since, None
+        return CROSSFADE, self._since, None
+
+    def _tick(self):
+        """Show the current frame; returns seconds until the next, or None."""
+        now = time.monotonic()
+        frames, start, until = self._animation(now)
+        if len(frames) == 1:
+            self._show(frames[0])
+            return None if until is None else until - now
+        self._show(frames[int((now - start) / TICK) % len(frames)])
+        return TICK if until is None else min(TICK, until - now)
+
+    def _run(self):
+        with self._cond:
+            while True:
+                self._cond.wait(self._tick())
+
+    def _step(self):
+        with self._cond:
+            if self._timer is not None:
+                self._timer.cancel()
+            timeout = self._tick()
+            self._timer = None if timeout is None else self._loop.call_later(max(0, timeout), self._step)
+
+    def _wake(self):
+        """Re-evaluate the animation now. Called holding the lock."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._step)
+        else:
+            self._cond.notify()
+
+    def _show(self, rgb):
+        if rgb == self._shown:
+            return
+        for led, value in zip(self.leds, rgb):
+            led.value = value
+        self._shown = rgb
+        self.writes += 1
@@ -0,0 +1,17 @@
+from collections import namedtuple
+
+# alsa_rate:   rate arecord captures at (what the I2S mic is clocked at)
+# sample_rate: rate that is stored and uploaded; resampled in-process if different
+CaptureProfile = namedtuple('CaptureProfile', 'name alsa_rate sample_rate channels')
+
+PROFILES = {p.name: p for p in (
+    CaptureProfile('speech-16k', alsa_rate=48000, sample_rate=16000, channels=1),
+    CaptureProfile('music-48k',  alsa_rate=48000, sample_rate=48000, channels=1),
+    CaptureProfile('raw-88k',    alsa_rate=88200, sample_rate=88200, channels=1),
+)}
+
+
+def get_profile(name):
+    if name not in PROFILES:
+        raise ValueError(f"Unknown capture profile: {name} (choose from {', '.join(PROFILES)})")
+    return PROFILES[name]
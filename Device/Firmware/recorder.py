@@ -1,14 +1,22 @@
 import os
 import time
-import uuid
-import threading
-import subprocess
-import datetime
-import requests
-import wave
+import json
+import asyncio
 import logging
-import math
 from gpiozero import Button, PWMLED
+from aioupload import AsyncUploadPool, AsyncUploadClient
+from clipper import HighlightClipper
+from codec import make_codec
+from dsp import VoiceDetector, build_chain, measure
+from highlights import HighlightLog
+from leds import LedController, IDLE, RECORDING
+from profiles import get_profile
+from ring import AudioRing
+from segments import SegmentWriter
+from spool import ChunkSpool
+from state import RecorderState
+from timeline import TimelineWriter
+from uploader import encode_chunk
 
 # === CONFIG ===
 DEVICE_ID        = "Buckley-Scribe-v1.2"#stable
@@ -17,26 +25,81 @@ AUDIO_DIR        = SCRIPT_DIR
 os.makedirs(AUDIO_DIR, exist_ok=True)
 
 UPLOAD_URL       = 'http://172.20.10.12:3000/api/audio/upload'
+UPLOAD_ENCODING  = 'octet'   # 'octet' (raw body + X- headers), 'multipart' or legacy 'json'
 API_KEY          = '@YourPassword123'
 BUTTON_HIGHLIGHT = Button(27, bounce_time=0.1)
 BUTTON_UPLOAD    = Button(17, bounce_time=0.1)
 
 # audio parameters
-SAMPLE_RATE      = 88200
+CAPTURE_PROFILE  = 'speech-16k'   # 'speech-16k', 'music-48k' or 'raw-88k' (see profiles.py)
+PROFILE          = get_profile(CAPTURE_PROFILE)
+ALSA_RATE        = PROFILE.alsa_rate      # what arecord captures at
+SAMPLE_RATE      = PROFILE.sample_rate    # what is stored and uploaded
 BYTES_PER_SAMPLE = 2    # 16-bit
-CHANNELS         = 1
+CHANNELS         = PROFILE.channels
 CHUNK_SECONDS    = 1
-CHUNK_SIZE       = SAMPLE_RATE * BYTES_PER_SAMPLE * CHANNELS * CHUNK_SECONDS
+CHUNK_SIZE       = ALSA_RATE * BYTES_PER_SAMPLE * CHANNELS * CHUNK_SECONDS   # bytes read per chunk
 
 # ALSA tuning
 ARECORD_BUFFER_SIZE = 2 * 1048576   # 2 MB
 ARECORD_PERIOD_SIZE = 131072        # 128 KB
 
+# in-process DSP (replaces the old `sox ... gain 10` pipe)
+DSP_GAIN_DB   = 10
+DSP_REMOVE_DC = True
+DSP_LIMITER   = True
+
+# voice activity detection: silent chunks are neither stored nor uploaded,
+# only sent as markers carrying their length, so the timeline stays exact.
+# Off here: /api/audio/upload takes no empty markers nor sample offsets, so
+# its server would see holes in the chunk ids and lose the silence's length
+VAD_ENABLED   = False
+VAD_MARGIN_DB = 10      # speech is this far above the tracked noise floor
+VAD_HANGOVER  = 2       # chunks still kept after speech stops
+
+# upload codec: 'pcm' sends raw chunks, 'opus' streams Ogg/Opus pages from opusenc
+UPLOAD_CODEC  = 'pcm'  # the /api/audio/upload server must accept Ogg/Opus before switching
+CODEC_OPTIONS = {'bitrate_kbps': 24, 'frame_ms': 20}
+
+# capture ring: processed chunks shared by the disk writer, uploader and
+# level meter; a consumer more than RING_SECONDS behind loses chunks
+RING_SECONDS    = 30
+RING_DEPTH      = RING_SECONDS // CHUNK_SECONDS
+RING_SLOT_BYTES = (SAMPLE_RATE * CHUNK_SECONDS + 64) * BYTES_PER_SAMPLE * CHANNELS   # slack for resampler rounding
+
+# highlight clips: cut from the ring as soon as the post-roll is captured and
+# sent ahead of the bulk stream. The ring must hold PRE + POST seconds.
+HIGHLIGHT_PRE_SECONDS  = 10
+HIGHLIGHT_POST_SECONDS = 10
+HIGHLIGHT_DIR          = os.path.join(AUDIO_DIR, 'highlights')
+
+# local recording: rotating WAV segments, listed in recordings/index.json.
+# Segments the server already has are pruned, oldest first, past the quota;
+# the sessions' .timeline files count toward it and go with their last segment.
+SEGMENT_DIR         = os.path.join(AUDIO_DIR, 'recordings')
+SEGMENT_SECONDS     = 300           # rotate every 5 minutes of audio...
+SEGMENT_MAX_BYTES   = 64 * 1048576  # ...or 64 MB, whichever comes first
+SEGMENT_QUOTA_BYTES = 2048 * 1048576
+
+# uploads run as tasks on the event loop
+UPLOAD_WORKERS      = 2             # bulk uploads in flight at once (highlights get their own lane)
+
+# durable upload spool: every chunk is on disk until the server has it.
+# Kept outside the checkout because start_scribe.sh re-clones it on boot.
+SPOOL_DIR       = os.path.expanduser('~/scribe_spool')
+SPOOL_WINDOW    = 1                  # chunks in flight at once; 1 keeps server order
+SPOOL_MAX_BYTES = 1024 * 1048576     # oldest undelivered chunks are evicted past 1 GB
+SPOOL_BATCH_MAX = 1                  # the upload API takes one chunk per request
+
+# highlight events: one small JSON post per press, spooled separately from audio
+EVENT_SPOOL_DIR = os.path.expanduser('~/scribe_events')
+HIGHLIGHT_URL   = 'http://172.20.10.12:3000/api/audio/highlights'
+
 UPLOAD_DEBOUNCE_SEC = 2.0
-last_upload_time    = 0
-idle_mode           = False
-session_id          = uuid.uuid4().hex[:8]
-chunk_counter       = 0
+
+# session lifecycle and input level, shared by the button callbacks, the
+# streaming thread and the upload workers
+state = RecorderState(SAMPLE_RATE, CHANNELS, debounce=UPLOAD_DEBOUNCE_SEC)
 
 # === LOGGING ===
 LOG_PATH = os.path.join(SCRIPT_DIR, 'scribe.log')
@@ -50,189 +113,316 @@ def log(msg, level='info'):
     print(msg)
     getattr(logging, level)(msg)
 
-# === LEDs ===
-led_r = PWMLED(24)
-led_g = PWMLED(23)
-led_b = PWMLED(22)
-
-def set_led(r=0, g=0, b=0):
-    led_r.value, led_g.value, led_b.value = r, g, b
-
-# State for LED controller
-recording_start_time = None
-highlight_start       = None
-highlight_until       = 0
-crossfade_start_time  = time.time()
-
-# === LED CONTROLLER ===
-def led_controller():
-    global recording_start_time, highlight_start, highlight_until, crossfade_start_time
-
-    crossfade_period = 4.0    # seconds for full blue↔green cycle
-    pulse_period     = 2.0    # pulse period for highlights and blue pulses
-    refresh_rate     = 0.05   # 50 ms update
-
-    while True:
-        now = time.time()
-
-        if idle_mode:
-            # end any highlight
-            highlight_until = 0
-            # smooth crossfade idle between blue and green and back
-            phase = ((now - crossfade_start_time) % crossfade_period) / crossfade_period
-            g_val = 0.5 * (1 - math.cos(2 * math.pi * phase))
-            b_val = 0.5 * (1 + math.cos(2 * math.pi * phase))
-            set_led(0, g_val, b_val)
-            recording_start_time = None
+# === EVENT LOOP ===
+# one loop runs capture, uploads, the spool senders, the LED animation and the
+# button handlers; created up front so they can schedule work on it before it
+# starts running
+loop = asyncio.new_event_loop()
 
-        else:
-            # Highlight override during recording
-            if highlight_start and now < highlight_until:
-                phase      = ((now - highlight_start) % pulse_period) / pulse_period
-                brightness = (math.sin(2 * math.pi * phase) + 1) / 2
-                set_led(0, brightness, 0)
-
-            else:
-                # Recording mode without highlight or after highlight expired
-                if recording_start_time is None:
-                    recording_start_time = now
-                    # reset fade when returning to idle later
-                    crossfade_start_time = now
-                elapsed = now - recording_start_time
-                if elapsed < 5:
-                    # blue pulse for first 5s
-                    phase      = (elapsed % pulse_period) / pulse_period
-                    brightness = (math.sin(2 * math.pi * phase) + 1) / 2
-                    set_led(0, 0, brightness)
-                else:
-                    # solid green afterwards
-                    set_led(0, 1, 0)
-
-        time.sleep(refresh_rate)
+# === LEDs ===
+# animations are timers on the loop; everything else just reports events to
+# the controller (mode changes, highlights, upload results)
+leds = LedController(PWMLED(24), PWMLED(23), PWMLED(22), loop=loop)
 
 # === UPLOAD WORKER ===
-chunk_counter = 0
+# one keep-alive session for every upload, plus a connection for the priority lane
+upload_client = AsyncUploadClient(pool_size=UPLOAD_WORKERS + 1, timeout=10)
 
-def async_upload(chunk_bytes, is_csv=False):
-    global chunk_counter
-    
+async def async_upload(chunk_bytes, is_csv=False, **meta):
     if is_csv:
         # Skip CSV uploads for now - focus on audio
         log("[UPLOAD] Skipping CSV upload (not implemented for new API)")
-        return
-    
-    chunk_counter += 1
+        return True
+    if meta.get('is_event'):
+        return await upload_event(chunk_bytes, meta)
+    if not chunk_bytes:
+        return True  # end-of-session or silence marker; the API only takes audio
     
-    # Convert bytes to list of integers for the API
-    audio_data = list(chunk_bytes)
-    
-    payload = {
+    # everything below was fixed at capture time, so a retried chunk
+    # keeps its original id
+    chunk = meta.get('chunk')
+    fields = {
         "userId": DEVICE_ID,
-        "timestamp": int(time.time() * 1000),
-        "audioData": audio_data,
-        "chunkId": f"{session_id}-chunk-{chunk_counter}",
-        "sessionId": session_id
+        "timestamp": meta.get('timestamp'),
+        "chunkId": f"{meta.get('session')}-chunk-{chunk}",
+        "sessionId": meta.get('session'),
+        "codec": meta.get('codec', 'pcm'),
+        "sampleRate": meta.get('rate'),
+        "channels": meta.get('channels'),
+        "rmsDbfs": meta.get('rms_dbfs'),
+        "peakDbfs": meta.get('peak_dbfs'),
+        "clippedSamples": meta.get('clipped'),
     }
     
     try:
-        resp = requests.post(
-            UPLOAD_URL, 
-            json=payload,
-            headers={'Content-Type': 'application/json'},
-            timeout=10
+        resp = await upload_client.post(
+            UPLOAD_URL,
+            **encode_chunk(UPLOAD_ENCODING, chunk_bytes, fields)
         )
         if resp.status_code != 200:
             log(f"[UPLOAD][ERROR] {resp.status_code}: {resp.text}", 'error')
-        else:
-            response_data = resp.json()
-            log(f"[UPLOAD] Success: {response_data.get('message', 'OK')}")
-            print(f"Audio chunk {chunk_counter} uploaded.")
+            return False
+        response_data = resp.json()
+        log(f"[UPLOAD] Success: {response_data.get('message', 'OK')} ({resp.timing['total'] * 1000:.0f} ms)")
+        print(f"Audio chunk {chunk} uploaded.")
+        return True
     except Exception as e:
         log(f"[UPLOAD][EXCEPTION] {e}", 'error')
+        return False
+
+async def upload_event(event_bytes, meta):
+    event = json.loads(event_bytes)
+    try:
+        resp = await upload_client.post(HIGHLIGHT_URL, json={
+            "userId":      DEVICE_ID,
+            "sessionId":   event['session'],
+            "eventId":     event['id'],
+            "pressSample": event['press_sample'],
+            "startSample": event['start_sample'],
+            "endSample":   event['end_sample'],
+            "sampleRate":  event['sample_rate'],
+            "pressTime":   int(event['press_time'] * 1000),
+        })
+        if resp.status_code != 200:
+            log(f"[UPLOAD][ERROR] Highlight {event['id']}: {resp.status_code}: {resp.text}", 'error')
+            return False
+        log(f"[UPLOAD] Highlight {event['id']} delivered")
+        return True
+    except Exception as e:
+        log(f"[UPLOAD][EXCEPTION] {e}", 'error')
+        return False
+
+async def upload_and_report(data, meta):
+    ok = await async_upload(data, **meta)
+    # red pulse until an upload gets through; slow blue while idle with a backlog
+    leds.set_error(not ok)
+    leds.set_uploading(upload_spool.stats()['pending'] > 1)
+    return ok
+
+upload_pool = AsyncUploadPool(loop, upload_and_report, limit=UPLOAD_WORKERS)
+
+# audio the spool evicts over quota never reaches the server, so the local
+# segments holding it must outlive the quota
+def keep_evicted(meta):
+    if meta and 'sample_offset' in meta:
+        recording.undelivered(meta['session'], meta['sample_offset'], meta['frames'])
+
+upload_spool = ChunkSpool(
+    SPOOL_DIR, upload_pool.submit,
+    window=SPOOL_WINDOW,
+    max_bytes=SPOOL_MAX_BYTES,
+    on_evict=keep_evicted,
+    batch_max=SPOOL_BATCH_MAX,
+    loop=loop,
+)
+
+# highlight events get a spool of their own and the pool's priority lane, so
+# they are durable but never wait behind the audio backlog
+event_spool = ChunkSpool(
+    EVENT_SPOOL_DIR,
+    lambda data, meta, done: upload_pool.submit(data, meta, done, priority=True),
+    name='events',
+    loop=loop,
+)
+highlight_log = HighlightLog(AUDIO_DIR, event_spool, SAMPLE_RATE)
+
+recording = SegmentWriter(
+    SEGMENT_DIR, SAMPLE_RATE, CHANNELS, BYTES_PER_SAMPLE,
+    max_seconds=SEGMENT_SECONDS,
+    max_bytes=SEGMENT_MAX_BYTES,
+    quota_bytes=SEGMENT_QUOTA_BYTES,
+)
 
 # === STREAMING ===
-def stream_audio():
-    global idle_mode, session_id
-
-    wav_path = os.path.join(AUDIO_DIR, f"{session_id}.wav")
-    wf = wave.open(wav_path, 'wb')
-    wf.setnchannels(CHANNELS)
-    wf.setsampwidth(BYTES_PER_SAMPLE)
-    wf.setframerate(SAMPLE_RATE)
-
-    arec = subprocess.Popen([
-        'arecord', '-D', 'plughw:1,0',
-        '-f', 'S16_LE', '-r', str(SAMPLE_RATE), '-c', str(CHANNELS),
-        '--buffer-size', str(ARECORD_BUFFER_SIZE),
-        '--period-size', str(ARECORD_PERIOD_SIZE),
-        '-t', 'raw', '-q', '-'
-    ], stdout=subprocess.PIPE)
-
-    sox = subprocess.Popen([
-        'sox',
-        '-t', 'raw', '-r', str(SAMPLE_RATE),
-        '-e', 'signed-integer', '-b', '16', '-c', str(CHANNELS), '-',
-        '-t', 'raw', '-',
-        'gain', '10'
-    ], stdin=arec.stdout, stdout=subprocess.PIPE)
-
-    log("[STREAM] Starting audio…")
+async def stream_audio(session):
+    codec = make_codec(UPLOAD_CODEC, SAMPLE_RATE, CHANNELS, **CODEC_OPTIONS)
+    # waits for the previous session's stream to drain; False if this one
+    # was stopped before it got the chance to start
+    if not await asyncio.to_thread(state.begin, session, codec.name):
+        return
+    recording.start(session.id)
+    leds.set_mode(RECORDING)
+
+    arec = timeline = None
     try:
-        while not idle_mode:
-            chunk = sox.stdout.read(CHUNK_SIZE)
-            if not chunk:
+        arec = await asyncio.create_subprocess_exec(
+            'arecord', '-D', 'plughw:1,0',
+            '-f', 'S16_LE', '-r', str(ALSA_RATE), '-c', str(CHANNELS),
+            '--buffer-size', str(ARECORD_BUFFER_SIZE),
+            '--period-size', str(ARECORD_PERIOD_SIZE),
+            '-t', 'raw', '-q', '-',
+            stdout=asyncio.subprocess.PIPE, limit=CHUNK_SIZE * 2,
+        )
+
+        dsp = build_chain(DSP_GAIN_DB, DSP_REMOVE_DC, DSP_LIMITER,
+                          rate_in=ALSA_RATE, rate_out=SAMPLE_RATE)
+        vad = VoiceDetector(SAMPLE_RATE, CHANNELS, margin_db=VAD_MARGIN_DB,
+                            hangover=VAD_HANGOVER) if VAD_ENABLED else None
+        timeline = TimelineWriter(os.path.join(SEGMENT_DIR, f"{session.id}.timeline"))
+        codec.start()
+    except Exception as e:
+        # finish() never runs, so give back what begin() and start() took,
+        # or every later session would wait on this one for good
+        log(f"[STREAM][ERROR] Could not start session {session.id}: {e}", 'error')
+        if arec is not None and arec.returncode is None:
+            arec.terminate()
+            await arec.wait()
+        if timeline is not None:
+            timeline.close()
+        recording.stop()
+        state.end(session)
+        if not state.recording:
+            leds.set_mode(IDLE)
+        raise
+
+    def spool(data, frames, info=None, final=False, silent=False, level=None):
+        session.captured(frames, level)
+        # the encoder may not have flushed a page yet, in which case the next
+        # chunk carries these frames too; the final chunk is sent even when
+        # empty so the server knows the session is complete
+        if not (data or final or silent):
+            return
+        mono_us = info.mono_us if info else time.monotonic_ns() // 1000
+        wall_us = info.wall_us if info else time.time_ns() // 1000
+        meta = session.chunk(len(data), mono_us, wall_us, final, silent)
+        seq  = upload_spool.append(data, meta._asdict())
+        timeline.append(meta.chunk, meta.frames, meta.sample_offset,
+                        meta.byte_offset, mono_us, wall_us,
+                        meta.rms_dbfs, meta.peak_dbfs, meta.clipped)
+        recording.covered_by(seq, session.id, meta.sample_offset + meta.frames, final)
+
+    # capture only fills the ring; each consumer drains it on its own thread
+    # so a slow SD card or a busy uploader cannot stall arecord
+    ring = AudioRing(RING_SLOT_BYTES, RING_DEPTH)
+
+    def write_disk(view, info):
+        if info.voiced:
+            closed = recording.write(view)
+        else:
+            closed = recording.skip(len(view) // (BYTES_PER_SAMPLE * CHANNELS), view)
+        if closed:
+            recording.prune(upload_spool.stats()['acked'])
+
+    def upload(view, info):
+        # metered once here: the level goes to the status log, the chunk
+        # metadata and the timeline
+        frames = len(view) // (BYTES_PER_SAMPLE * CHANNELS)
+        level  = measure(view)
+        state.set_level(level)
+        if info.voiced:
+            spool(codec.encode(view), frames, info, level=level)
+            return
+        # send what the encoder holds of the speech before the silence, so
+        # the marker only carries silent frames
+        spool(codec.drain(), 0, info)
+        spool(b'', frames, info, silent=True, level=level)
+
+    ring.attach('disk', write_disk)
+    ring.attach('upload', upload)
+
+    clipper = HighlightClipper(
+        ring, SAMPLE_RATE, CHANNELS, BYTES_PER_SAMPLE,
+        pre_seconds=HIGHLIGHT_PRE_SECONDS,
+        post_seconds=HIGHLIGHT_POST_SECONDS,
+        on_clip=save_clip,
+        session=session.id,
+    )
+    ring.attach('clipper', clipper.on_chunk)
+    session.clipper = clipper
+
+    def process(data):
+        pcm = dsp.process(memoryview(data))
+        return pcm, vad.is_speech(pcm) if vad else True
+
+    def finish():
+        # blocking: waits for every consumer to drain the ring
+        ring.close()
+        ring.join()
+        clipper.flush()
+        recording.stop()
+        spool(codec.finish(), 0, final=True)
+        timeline.close()
+        state.end(session)
+        if not state.recording:
+            leds.set_mode(IDLE)   # arecord may have died without a button press
+        recording.prune(upload_spool.stats()['acked'])
+        log(f"[STREAM] Ring: {ring.stats()}")
+        log(f"[STREAM] Highlights: {clipper.stats()}")
+        log(f"[STREAM] Recording: {recording.stats()}")
+        if vad:
+            silent = session.silent_frames
+            voiced = session.frames - silent
+            sent   = session.bytes / voiced if voiced else 0   # upload bytes per frame of speech
+            log(f"[STREAM] VAD: {silent / SAMPLE_RATE:.0f}s of {session.frames / SAMPLE_RATE:.0f}s silent, "
+                f"{recording.skipped * BYTES_PER_SAMPLE * CHANNELS:,} bytes not stored, "
+                f"~{int(silent * sent):,} bytes not uploaded")
+        log(f"[STREAM] DSP {dsp}: {dsp.clipped} samples clipped by the chain, "
+            f"{session.clipped} at full scale in the recording, last level {state.level}")
+        log(f"[STREAM] Stopped. Upload pool: {upload_pool.stats()}")
+        log(f"[STREAM] Upload spool: {upload_spool.stats()}")
+        log(f"[STREAM] Upload timing: {upload_client.stats()}")
+
+    log(f"[STREAM] Starting audio… ({codec}, session {session.id})")
+    try:
+        while session.running:
+            try:
+                data = await arec.stdout.readexactly(CHUNK_SIZE)
+            except asyncio.IncompleteReadError as e:
+                data = e.partial    # arecord exited
+            if not data:
+                break
+            # filtering and VAD are per-sample work, kept off the loop
+            pcm, voiced = await asyncio.to_thread(process, data)
+            ring.write(pcm, voiced)
+            if len(data) < CHUNK_SIZE:
                 break
-            wf.writeframes(chunk)
-            threading.Thread(target=async_upload, args=(chunk,), daemon=True).start()
     finally:
-        wf.close()
-        arec.terminate()
-        sox.terminate()
-        log("[STREAM] Stopped.")
+        session.clipper = None
+        if arec.returncode is None:
+            arec.terminate()
+        await arec.wait()
+        # the consumers' teardown blocks, so it runs off the loop
+        await asyncio.to_thread(finish)
 
 # === HIGHLIGHT ===
+def save_clip(wav, info):
+    """Keep a highlight clip on disk; the upload API has no endpoint for them yet."""
+    os.makedirs(HIGHLIGHT_DIR, exist_ok=True)
+    path = os.path.join(HIGHLIGHT_DIR, f"{info['session']}_highlight_{info['clip']:03d}.wav")
+    with open(path, 'wb') as f:
+        f.write(wav)
+    log(f"[HIGHLIGHT] Clip {info['clip']}: {(info['end'] - info['start']) / SAMPLE_RATE:.1f}s -> {path}")
+
 def on_highlight_pressed():
-    global highlight_start, highlight_until
-    # record timestamps
-    t0 = datetime.datetime.now() - datetime.timedelta(seconds=10)
-    t1 = datetime.datetime.now()
-    t2 = t1 + datetime.timedelta(seconds=10)
-    entry = f"{t0},{t1},{t2}\n"
-    csv_path = os.path.join(AUDIO_DIR, f"{session_id}_Highlights.csv")
-    with open(csv_path, 'a') as f:
-        f.write(entry)
-    # immediate upload of full CSV
-    try:
-        with open(csv_path, 'rb') as f:
-            csv_bytes = f.read()
-        threading.Thread(target=async_upload, args=(csv_bytes, True), daemon=True).start()
-    except Exception as e:
-        log(f"[HIGHLIGHT][ERROR] CSV upload failed: {e}", 'error')
-    # start highlight pulse
-    highlight_start = time.time()
-    highlight_until = highlight_start + 10
+    # runs on the loop, so only in-memory work here: the clip is cut from the
+    # capture ring once the post-roll is in, and the event is written and
+    # uploaded by highlight_log's own thread
+    session = state.session
+    clipper = session and session.clipper
+    if clipper:
+        highlight_log.press(clipper.mark())
+    leds.highlight(10)
 
 # === UPLOAD BUTTON ===
 def on_upload_pressed():
-    global idle_mode, last_upload_time, session_id, crossfade_start_time, chunk_counter
-    now = time.time()
-    if now - last_upload_time < UPLOAD_DEBOUNCE_SEC:
-        return
-    last_upload_time = now
-
-    if not idle_mode:
-        idle_mode = True
-        crossfade_start_time = now
+    session = state.toggle()
+    if session is False:
+        leds.set_mode(IDLE)
         log("[UPLOAD] Stopping recording…")
-    else:
-        session_id = uuid.uuid4().hex[:8]
-        chunk_counter = 0  # Reset chunk counter for new session
-        idle_mode = False
-        threading.Thread(target=stream_audio, daemon=True).start()
+    elif session:
+        start_stream(session)
+
+def start_stream(session):
+    task = loop.create_task(stream_audio(session))
+    streams.add(task)
+    task.add_done_callback(streams.discard)
+
+streams = set()   # running stream tasks; the loop only keeps weak references
 
 # === SETUP BUTTONS & MAIN ===
-BUTTON_HIGHLIGHT.when_pressed = on_highlight_pressed
-BUTTON_UPLOAD.when_pressed    = on_upload_pressed
+# gpiozero calls these on its own thread; hand them to the loop
+BUTTON_HIGHLIGHT.when_pressed = lambda: loop.call_soon_threadsafe(on_highlight_pressed)
+BUTTON_UPLOAD.when_pressed    = lambda: loop.call_soon_threadsafe(on_upload_pressed)
 
 if __name__ == "__main__":
     for m in [
@@ -249,9 +439,10 @@ if __name__ == "__main__":
         "[SYSTEM] - Press the Green Highlight button to mark a 10-second highlight in the recording.",
         "[SYSTEM] - Press the Blue Upload button to toggle between recording and idle mode.",
         "[SYSTEM] LED Behavior:",
-        "[SYSTEM] - Idle Mode: Smooth crossfade between blue and green.",
+        "[SYSTEM] - Idle Mode: Smooth crossfade between blue and green (slow blue pulse while uploads catch up).",
         "[SYSTEM] - Recording Mode: Blue pulse for the first 5 seconds, then solid green.",
         "[SYSTEM] - Highlight: Green pulse for 10 seconds.",
+        "[SYSTEM] - Upload failing: Red pulse until an upload gets through.",
         "[SYSTEM] Upload Server:",
         f"[SYSTEM] - Audio chunks are uploaded to: {UPLOAD_URL}"
     ]
@@ -260,17 +451,9 @@ if __name__ == "__main__":
         log(line)
         print(line)
 
-    # start LED controller
-    threading.Thread(target=led_controller, daemon=True).start()
-
     # flash to show startup
-    set_led(1,1,1)
-    time.sleep(0.1)
-    set_led(0,0,0)
-
-    # start audio streaming
-    threading.Thread(target=stream_audio, daemon=True).start()
+    leds.flash((1, 1, 1), 0.1)
 
-    # keep main alive
-    while True:
-        time.sleep(1)
+    # start audio streaming and run the loop for good
+    start_stream(state.start())
+    loop.run_forever()
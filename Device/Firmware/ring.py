@@ -0,0 +1,203 @@
+import time
+import threading
+import logging
+from collections import namedtuple
+
+# Where and when a chunk was captured: `offset` is its first byte in the
+# stream, the times are taken as it lands in the ring (just after the read
+# that completed it). `voiced` is the capture side's voice activity verdict,
+# made once so every consumer agrees on it.
+ChunkInfo = namedtuple('ChunkInfo', 'seq offset length mono_us wall_us voiced')
+
+
+class AudioRing:
+    """Preallocated ring of audio chunks shared by one writer and many readers.
+
+    The capture thread copies each processed chunk into the next of `depth`
+    fixed slots of `slot_bytes` and never waits for anyone. Every consumer
+    has its own cursor and gets a memoryview straight into the slot, along
+    with the chunk's ChunkInfo, so the disk writer, uploader and meters all
+    read the same bytes without copies.
+
+    A consumer that falls more than `depth` chunks behind has been lapped:
+    its cursor jumps to the oldest chunk still held and the skipped chunks
+    are counted as overruns. A chunk overwritten while a consumer was still
+    using its view counts as an overrun too (see RingReader.intact).
+
+    Cursors are plain ints written by a single thread each, so the data path
+    takes no locks; the Condition only wakes readers waiting for new chunks.
+
+    The ring also remembers where each chunk sits in the stream, so the last
+    `depth` chunks double as an in-memory pre-roll: copy() cuts any byte
+    range of the stream that is still held.
+    """
+
+    def __init__(self, slot_bytes, depth, name='ring'):
+        self.slot_bytes = slot_bytes
+        self.depth      = depth
+        self.name       = name
+
+        self._buf     = bytearray(slot_bytes * depth)
+        self._view    = memoryview(self._buf)
+        self._chunks  = [None] * depth   # ChunkInfo of each slot's chunk
+        self._claimed = -1       # seq being written; its slot is no longer readable
+        self._written = 0        # chunks fully written
+        self._closed  = False
+        self._cond    = threading.Condition()
+        self._readers = []
+        self._threads = []
+
+        self.bytes_written = 0           # stream bytes written so far
+        self.written_at    = None        # monotonic time of the last write
+        self.last_length   = 0
+
+    # === WRITER ===
+    def write(self, data, voiced=True):
+        """Copy one chunk into the next slot. Returns its seq."""
+        n = len(data)
+        if n > self.slot_bytes:
+            raise ValueError(f"chunk of {n} bytes does not fit a {self.slot_bytes} byte slot")
+        seq  = self._written
+        slot = seq % self.depth
+        self._claimed = seq
+        start = slot * self.slot_bytes
+        self._view[start:start + n] = data
+        mono_us = time.monotonic_ns() // 1000
+        self._chunks[slot] = ChunkInfo(seq, self.bytes_written, n, mono_us,
+                                       time.time_ns() // 1000, voiced)
+        self.bytes_written += n
+        self.written_at     = mono_us / 1e6
+        self.last_length    = n
+        self._written = seq + 1
+        with self._cond:
+            self._cond.notify_all()
+        return seq
+
+    def close(self):
+        """No more chunks; readers drain what is left and stop."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def join(self, timeout=None):
+        for thread in self._threads:
+            thread.join(timeout)
+
+    # === READERS ===
+    def reader(self, name):
+        """A new cursor that starts at the next chunk written."""
+        reader = RingReader(self, name)
+        self._readers.append(reader)
+        return reader
+
+    def attach(self, name, handle):
+        """Run handle(view, info) for every chunk on its own thread. Returns the reader."""
+        reader = self.reader(name)
+
+        def run():
+            while True:
+                item = reader.read()
+                if item is None:
+                    return
+                info, view = item
+                try:
+                    handle(view, info)
+                except Exception as e:
+                    logging.error(f"[{self.name.upper()}] {name} failed on chunk {info.seq}: {e}")
+                reader.intact(info.seq)
+
+        thread = threading.Thread(target=run, name=f"{self.name}-{name}", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        return reader
+
+    def get(self, seq):
+        """View of chunk `seq` if the ring still holds it, else None."""
+        if seq >= self._written or seq <= self._claimed - self.depth:
+            return None
+        slot  = seq % self.depth
+        start = slot * self.slot_bytes
+        return self._view[start:start + self._chunks[slot].length]
+
+    def info(self, seq):
+        """ChunkInfo of chunk `seq` if the ring still holds it, else None."""
+        if seq >= self._written or seq <= self._claimed - self.depth:
+            return None
+        return self._chunks[seq % self.depth]
+
+    def copy(self, start, end):
+        """Copy stream bytes [start, end) that the ring still holds.
+
+        Returns (offset of the first byte copied, data); the range is trimmed
+        to what is held, so data may be short or empty.
+        """
+        while True:
+            oldest = max(0, self._claimed - self.depth + 1)
+            parts  = []
+            first  = None
+            for seq in range(oldest, self._written):
+                slot = seq % self.depth
+                off  = self._chunks[slot].offset
+                lo   = max(start, off)
+                hi   = min(end, off + self._chunks[slot].length)
+                if lo >= hi:
+                    continue
+                if first is None:
+                    first = lo
+                base = slot * self.slot_bytes
+                parts.append(self._view[base + lo - off:base + hi - off])
+            data = b''.join(parts)
+            if oldest > self._claimed - self.depth:
+                return (first if first is not None else start), data
+            # the writer lapped the oldest chunk mid-copy; try again without it
+
+    def stats(self):
+        return {
+            'depth':    self.depth,
+            'written':  self._written,
+            'lag':      {r.name: self._written - r.next_seq for r in self._readers},
+            'overruns': {r.name: r.overruns for r in self._readers},
+        }
+
+
+class RingReader:
+    """One consumer's cursor into an AudioRing."""
+
+    def __init__(self, ring, name):
+        self.ring     = ring
+        self.name     = name
+        self.next_seq = ring._written
+        self.overruns = 0
+
+    def read(self, timeout=None):
+        """Next chunk as (ChunkInfo, memoryview), or None once the ring is closed and drained.
+
+        Returns None on timeout as well.
+        """
+        ring = self.ring
+        with ring._cond:
+            while self.next_seq >= ring._written:
+                if ring._closed or not ring._cond.wait(timeout):
+                    return None
+        oldest = ring._claimed - ring.depth + 1
+        if self.next_seq < oldest:
+            skipped = oldest - self.next_seq
+            self.overruns += skipped
+            logging.warning(f"[{ring.name.upper()}] {self.name} overrun, skipped {skipped} chunks")
+            self.next_seq = oldest
+        seq  = self.next_seq
+        info = ring.info(seq)
+        view = ring.get(seq)
+        self.next_seq += 1
+        if info is None or view is None:   # lapped between the check and get()
+            self.overruns += 1
+            return self.read(timeout)
+        return info, view
+
+    def intact(self, seq):
+        """True if chunk `seq` was not overwritten while it was being used."""
+        if seq > self.ring._claimed - self.ring.depth:
+            return True
+        self.overruns += 1
+        logging.warning(f"[{self.ring.name.upper()}] {self.name} chunk {seq} overwritten while in use")
+        return False
@@ -0,0 +1,352 @@
+import os
+import json
+import time
+import wave
+import struct
+import logging
+import threading
+
+INDEX_FILE      = 'index.json'
+TIMELINE_SUFFIX = '.timeline'   # the recorder's {session}.timeline, kept alongside
+
+
+class SegmentWriter:
+    """Local recording as a series of bounded WAV segments.
+
+    Each session is written as `{session}_{index:04d}.wav`, and a new segment
+    is started once the current one reaches `max_seconds` of audio or
+    `max_bytes` of PCM, splitting the chunk at the exact frame. A segment's
+    header is finalised when it rotates, so a power cut can only leave the
+    open segment with a stale header, and that is patched from the file size
+    on the next start.
+
+    `index.json` lists every segment with its session, first sample, frame
+    count and the upload seq that covers it. covered_by() stamps each closed
+    segment with the first spool seq of its own session whose audio reaches
+    its last sample, or with the session's final seq; once the spool's acked
+    watermark passes it the segment is fully uploaded, and prune(acked)
+    deletes uploaded segments, oldest first, while the directory is over
+    `quota_bytes`. Segments still waiting for the server are never pruned,
+    nor are those a crash left open (their session's tail may never have
+    been spooled, so nothing stamps them) or those holding audio whose
+    upload was given up on (undelivered(), from the spool's evictions):
+    either way the segment may be the only copy. The disk writer and the
+    uploader may call in from different threads.
+
+    The recorder keeps each session's `{session}.timeline` in the same
+    directory. Timelines count toward the quota and one is deleted with its
+    session's last segment (a session with no segments at all loses its
+    timeline only while the directory is over quota), but never while its
+    session is the current one.
+
+    skip() leaves silence out of the recording. A pause of up to
+    `min_gap_seconds` is held in memory and written after all if speech
+    resumes, so ordinary pauses do not rotate the segment; a longer one
+    closes it and the next segment starts at the frame after the silence, so
+    the gaps between segments' sample ranges are exactly the silence skipped.
+    """
+
+    def __init__(self, directory, sample_rate, channels, sampwidth=2,
+                 max_seconds=300, max_bytes=None, quota_bytes=None, min_gap_seconds=5,
+                 name='segments'):
+        self.directory   = directory
+        self.sample_rate = sample_rate
+        self.channels    = channels
+        self.sampwidth   = sampwidth
+        self.frame_bytes = sampwidth * channels
+        self.quota_bytes = quota_bytes
+        self.name        = name
+
+        limits = []
+        if max_seconds:
+            limits.append(int(max_seconds * sample_rate))
+        if max_bytes:
+            limits.append(max_bytes // self.frame_bytes)
+        self.max_frames = min(limits) if limits else None
+        self.min_gap    = int(min_gap_seconds * sample_rate)
+
+        self._wf      = None
+        self._current = None
+        self._session = None
+        self._index   = 0      # segments opened this session
+        self._sample  = 0      # frames written this session
+        self.skipped  = 0      # frames of silence skipped this session
+        self._held    = bytearray()   # a pause that may yet be kept
+        self._held_frames = 0
+        self.pruned   = 0
+        self._lost    = []     # (session, first, end) sample ranges not delivered
+        self._lock    = threading.RLock()
+
+        os.makedirs(directory, exist_ok=True)
+        self.segments = self._load_index()
+        self._recover()
+
+    # === WRITING ===
+    def start(self, session):
+        with self._lock:
+            self.stop()
+            self._session = session
+            self._lost    = []
+            self._index   = 0
+            self._sample  = 0
+            self.skipped  = 0
+            self._held.clear()
+            self._held_frames = 0
+
+    def write(self, pcm):
+        """Append PCM frames to the session. Returns how many segments it closed."""
+        with self._lock:
+            closed = 0
+            if self._held:
+                # the pause was short: keep it in the segment after all
+                held = bytes(self._held)
+                self._held.clear()
+                self._held_frames = 0
+                closed += self._write(held)
+            return closed + self._write(pcm)
+
+    def _write(self, pcm):
+        closed = 0
+        view   = memoryview(pcm)
+        while view:
+            if self._wf is None:
+                self._open()
+            frames = len(view) // self.frame_bytes
+            if self.max_frames:
+                frames = min(frames, self.max_frames - self._current['frames'])
+            data = view[:frames * self.frame_bytes]
+            self._wf.writeframes(data)
+            self._current['frames'] += frames
+            self._sample += frames
+            view = view[len(data):]
+            if self.max_frames and self._current['frames'] >= self.max_frames:
+                self._close()
+                closed += 1
+            if not frames:
+                break          # trailing partial frame
+        return closed
+
+    def skip(self, frames, pcm=None):
+        """Leave `frames` of silence (`pcm`, if given) out, unless speech
+        resumes within min_gap_seconds. Returns how many segments it closed."""
+        with self._lock:
+            if (self._wf is not None and pcm is not None
+                    and self._held_frames + frames <= self.min_gap):
+                self._held += pcm
+                self._held_frames += frames
+                return 0
+            closed = 0
+            if self._wf is not None:
+                self._close()
+                closed = 1
+            self._drop_held()
+            self._sample += frames
+            self.skipped += frames
+            return closed
+
+    def _drop_held(self):
+        self._sample += self._held_frames
+        self.skipped += self._held_frames
+        self._held.clear()
+        self._held_frames = 0
+
+    def stop(self):
+        """Finalise the open segment, if any; a pause still held is dropped."""
+        with self._lock:
+            self._drop_held()
+            if self._wf is not None:
+                self._close()
+
+    def covered_by(self, seq, session, samples, final=False):
+        """Record that upload `seq` carries `session` up to frame `samples`.
+
+        The `final` seq of a session covers all of its closed segments.
+        """
+        changed = False
+        with self._lock:
+            for seg in self.segments:
+                if not seg['closed'] or seg['upload_seq'] is not None or seg['session'] != session:
+                    continue
+                if seg.get('recovered'):
+                    continue
+                if not final and seg['start_sample'] + seg['frames'] > samples:
+                    continue
+                seg['upload_seq'] = seq
+                changed = True
+            if changed:
+                self._save_index()
+
+    def undelivered(self, session, start_sample, frames):
+        """Keep the segments holding `session`'s frames from `start_sample` on
+        disk: the server will never get them."""
+        end = start_sample + frames
+        with self._lock:
+            self._lost.append((session, start_sample, end))
+            changed = False
+            for seg in self.segments:
+                if self._overlaps(seg, session, start_sample, end) and not seg.get('undelivered'):
+                    seg['undelivered'] = True
+                    changed = True
+            if changed:
+                self._save_index()
+
+    @staticmethod
+    def _overlaps(seg, session, start, end):
+        seg_end = seg['start_sample'] + seg['frames'] if seg['closed'] else float('inf')
+        return seg['session'] == session and seg['start_sample'] < end and start < seg_end
+
+    def prune(self, acked):
+        """Delete uploaded segments, oldest first, while over the disk quota."""
+        if not self.quota_bytes:
+            return
+        with self._lock:
+            self._prune(acked)
+
+    def _prune(self, acked):
+        timelines = self._timelines()
+        total = sum(seg['bytes'] for seg in self.segments) + sum(timelines.values())
+        left  = {}      # segments still on disk per session
+        for seg in self.segments:
+            left[seg['session']] = left.get(seg['session'], 0) + 1
+        keep  = []
+        for seg in self.segments:
+            uploaded = (seg['upload_seq'] is not None and seg['upload_seq'] <= acked
+                        and not seg.get('undelivered'))
+            if total > self.quota_bytes and uploaded:
+                try:
+                    os.remove(os.path.join(self.directory, seg['file']))
+                except FileNotFoundError:
+                    pass
+                total -= seg['bytes']
+                self.pruned += 1
+                logging.info(f"[{self.name.upper()}] Pruned uploaded segment {seg['file']}")
+                left[seg['session']] -= 1
+                if not left[seg['session']] and seg['session'] != self._session:
+                    total -= self._remove_timeline(seg['session'], timelines)
+                continue
+            keep.append(seg)
+        if len(keep) != len(self.segments):
+            self.segments = keep
+            self._save_index()
+        # sessions with no segments at all, e.g. ones that were all silence
+        for session in list(timelines):
+            if total <= self.quota_bytes:
+                break
+            if session not in left and session != self._session:
+                total -= self._remove_timeline(session, timelines)
+        if total > self.quota_bytes:
+            logging.warning(f"[{self.name.upper()}] {total:,} bytes on disk, over quota, "
+                            f"waiting for uploads")
+
+    def _remove_timeline(self, session, timelines):
+        """Delete `session`'s timeline; returns the bytes freed."""
+        size = timelines.pop(session, 0)
+        if size:
+            try:
+                os.remove(os.path.join(self.directory, session + TIMELINE_SUFFIX))
+            except FileNotFoundError:
+                pass
+            logging.info(f"[{self.name.upper()}] Pruned timeline of session {session}")
+        return size
+
+    def _timelines(self):
+        """{session: bytes} of the timeline files in the directory."""
+        sizes = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(TIMELINE_SUFFIX) and entry.is_file():
+                    try:
+                        sizes[entry.name[:-len(TIMELINE_SUFFIX)]] = entry.stat().st_size
+                    except FileNotFoundError:
+                        pass
+        return sizes
+
+    def stats(self):
+        with self._lock:
+            return {
+                'segments':  len(self.segments),
+                'bytes':     sum(seg['bytes'] for seg in self.segments) + sum(self._timelines().values()),
+                'uploading': sum(1 for seg in self.segments if seg['upload_seq'] is None),
+                'undelivered': sum(1 for seg in self.segments if seg.get('undelivered')),
+                'recovered': sum(1 for seg in self.segments if seg.get('recovered')),
+                'pruned':    self.pruned,
+                'skipped':   self.skipped,
+            }
+
+    # === SEGMENTS ===
+    def _open(self):
+        self._index += 1
+        index = self._index
+        fname = f"{self._session}_{index:04d}.wav"
+        self._wf = wave.open(os.path.join(self.directory, fname), 'wb')
+        self._wf.setnchannels(self.channels)
+        self._wf.setsampwidth(self.sampwidth)
+        self._wf.setframerate(self.sample_rate)
+        self._current = {
+            'file':         fname,
+            'session':      self._session,
+            'index':        index,
+            'start_sample': self._sample,
+            'frames':       0,
+            'bytes':        0,
+            'started':      time.time(),
+            'closed':       False,
+            'upload_seq':   None,
+        }
+        # the spool may give up on audio before the disk writer gets to it
+        if any(self._overlaps(self._current, *lost) for lost in self._lost):
+            self._current['undelivered'] = True
+        self.segments.append(self._current)
+        self._save_index()
+
+    def _close(self):
+        self._wf.close()
+        self._current['bytes']  = 44 + self._current['frames'] * self.frame_bytes
+        self._current['closed'] = True
+        self._wf      = None
+        self._current = None
+        self._save_index()
+
+    def _recover(self):
+        """Patch the header of a segment left open by a crash and close it."""
+        changed = False
+        for seg in self.segments:
+            if seg['closed']:
+                continue
+            path = os.path.join(self.directory, seg['file'])
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = 0
+            changed = True
+            if size <= 44:
+                # nothing captured before the crash
+                if size:
+                    os.remove(path)
+                seg.update(bytes=0, closed=True)
+                continue
+            frames = max(0, size - 44) // self.frame_bytes
+            with open(path, 'r+b') as f:
+                f.seek(4)
+                f.write(struct.pack('<I', 36 + frames * self.frame_bytes))
+                f.seek(40)
+                f.write(struct.pack('<I', frames * self.frame_bytes))
+            seg.update(frames=frames, bytes=size, closed=True, recovered=True)
+            logging.info(f"[{self.name.upper()}] Recovered {seg['file']} ({frames} frames)")
+        if changed:
+            self.segments = [seg for seg in self.segments if seg['bytes']]
+            self._save_index()
+
+    # === INDEX ===
+    def _load_index(self):
+        try:
+            with open(os.path.join(self.directory, INDEX_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def _save_index(self):
+        path = os.path.join(self.directory, INDEX_FILE)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.segments, f, indent=1)
+        os.replace(path + '.tmp', path)
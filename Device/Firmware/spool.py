@@ -0,0 +1,406 @@
+import os
+import json
+import time
+import threading
+import logging
+
+CHUNK_EXT  = '.chunk'
+ACKED_FILE = 'acked'
+
+
+class ChunkSpool:
+    """Crash-safe on-disk queue of chunks awaiting upload.
+
+    Every chunk is written once as `{seq:010d}.chunk` (a JSON metadata line
+    followed by the raw bytes) and fsynced before append() returns. A sender
+    thread hands chunks to `send(data, meta, done)` in sequence order, at most
+    `window` at a time, and `send` must eventually call `done(ok)`. Delivered
+    chunks are deleted; failed ones are retried with exponential backoff.
+
+    `acked` holds the highest sequence number below which everything has been
+    delivered. On restart, leftover files at or below it are reclaimed and the
+    rest are resent, so a reboot or a dropped link resumes where it stopped.
+
+    With `batch_max` > 1 the sender coalesces consecutive chunks that share a
+    `batch_key(meta)` into one send: `data` is their bytes back to back and
+    `meta` is `{'batch': [meta, ...]}`, each entry carrying its `length`. A
+    healthy link still gets chunks one at a time as they arrive; a backlog is
+    drained in batches straight away, and while the link is slow (the last
+    send failed or took longer than `slow_after` seconds) a lone chunk is held
+    for up to `batch_age` seconds so later ones can share its request.
+
+    With `loop` the sender is not a thread but callbacks on that asyncio
+    loop, re-armed with call_later() for backoff and batching deadlines;
+    `send` is then called on the loop and must not block.
+
+    Chunks evicted over `max_bytes` never reach the server, yet `acked`
+    moves past them. `on_evict(meta)` is called with each one's metadata (or
+    None if it could not be read) so a local copy of that audio can be kept.
+    """
+
+    def __init__(self, directory, send, window=1, max_bytes=None,
+                 backoff_base=1.0, backoff_max=60.0, fsync=True, name='spool',
+                 batch_max=1, batch_age=0.0, slow_after=None, batch_key=None,
+                 on_evict=None, loop=None):
+        self.directory    = directory
+        self.send         = send
+        self.window       = window
+        self.max_bytes    = max_bytes
+        self.backoff_base = backoff_base
+        self.backoff_max  = backoff_max
+        self.fsync        = fsync
+        self.name         = name
+        self.batch_max    = batch_max
+        self.batch_age    = batch_age
+        self.slow_after   = slow_after
+        self.batch_key    = batch_key or (lambda meta: meta.get('session'))
+        self.on_evict     = on_evict
+        self._loop        = loop
+        self._timer       = None   # loop mode: handle of the next deadline
+
+        self._cond      = threading.Condition()
+        self._stop      = False
+        self._pending   = {}     # seq -> size in bytes, not yet delivered
+        self._in_flight = set()
+        self._writing   = set()  # seqs handed out by append() but not on disk yet
+        self._attempts  = {}     # seq -> failed attempts so far
+        self._retry_at  = {}     # seq -> monotonic time of the next attempt
+        self._queued_at = {}     # seq -> monotonic time it became pending
+        self._keys      = {}     # seq -> batch_key(meta)
+        self._sends     = 0      # send() calls awaiting done()
+        self._hold      = None   # monotonic time a held-back batch must go out
+        self._ok        = True   # outcome of the last send
+        self._rtt       = None   # smoothed seconds per send
+
+        self.batches   = 0
+
+        self.delivered = 0
+        self.retries   = 0
+        self.evicted   = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._acked    = self._read_acked()
+        self._next_seq = self._recover() + 1
+
+        if loop is not None:
+            self._thread = None
+            loop.call_soon_threadsafe(self._pump)
+        else:
+            self._thread = threading.Thread(target=self._sender, name=f"{name}-sender", daemon=True)
+            self._thread.start()
+
+    # === PRODUCER SIDE ===
+    def append(self, data, meta=None):
+        """Write one chunk durably and queue it for delivery. Returns its seq."""
+        with self._cond:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._writing.add(seq)
+
+        meta = dict(meta or {}, seq=seq)
+        path = self._path(seq)
+        tmp  = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(json.dumps(meta).encode() + b'\n')
+            f.write(data)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+        with self._cond:
+            self._writing.discard(seq)
+            self._pending[seq]   = len(data)
+            self._queued_at[seq] = time.monotonic()
+            self._keys[seq]      = self.batch_key(meta)
+            evicted = self._enforce_quota()
+            self._wake()
+        if self.on_evict:
+            for lost in evicted:
+                self.on_evict(lost)
+        return seq
+
+    def stats(self):
+        with self._cond:
+            return {
+                'pending':       len(self._pending),
+                'pending_bytes': sum(self._pending.values()),
+                'in_flight':     len(self._in_flight),
+                'batches':       self.batches,
+                'rtt_ms':        round(self._rtt * 1000) if self._rtt is not None else None,
+                'acked':         self._acked,
+                'next_seq':      self._next_seq,
+                'delivered':     self.delivered,
+                'retries':       self.retries,
+                'evicted':       self.evicted,
+            }
+
+    def close(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        elif self._timer is not None:
+            self._loop.call_soon_threadsafe(self._timer.cancel)
+
+    # === SENDER ===
+    def _sender(self):
+        while True:
+            with self._cond:
+                seqs = self._next_ready()
+                while not seqs and not self._stop:
+                    self._cond.wait(timeout=self._wait_time())
+                    seqs = self._next_ready()
+                if self._stop:
+                    return
+                self._claim(seqs)
+            self._dispatch(seqs)
+
+    def _pump(self):
+        """Loop mode: send whatever is ready, then wait for the next deadline."""
+        while True:
+            with self._cond:
+                if self._stop:
+                    return
+                seqs = self._next_ready()
+                if not seqs:
+                    if self._timer is not None:
+                        self._timer.cancel()
+                    wait = self._wait_time()
+                    self._timer = None if wait is None else self._loop.call_later(wait, self._pump)
+                    return
+                self._claim(seqs)
+            self._dispatch(seqs)
+
+    def _wake(self):
+        """Tell the sender something changed. Called holding the lock."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._pump)
+        else:
+            self._cond.notify()
+
+    def _claim(self, seqs):
+        self._in_flight.update(seqs)
+        self._sends += 1
+        for seq in seqs:
+            self._retry_at.pop(seq, None)
+
+    def _dispatch(self, seqs):
+        chunks = []
+        for seq in seqs:
+            try:
+                chunks.append((seq,) + self._load(seq))
+            except (OSError, ValueError) as e:
+                logging.error(f"[{self.name.upper()}] Unreadable chunk {seq}: {e}")
+                self._finish(seq, delivered=True)   # nothing to resend
+        if not chunks:
+            with self._cond:
+                self._sends -= 1
+                self._wake()
+            return
+
+        sent = [seq for seq, _, _ in chunks]
+        done = lambda ok, sent=sent, start=time.monotonic(): self._on_done(sent, ok, start)
+        if len(chunks) == 1:
+            _, data, meta = chunks[0]
+            self.send(data, meta, done)
+        else:
+            with self._cond:
+                self.batches += 1
+            data = b''.join(data for _, data, _ in chunks)
+            self.send(data, {'batch': [dict(meta, length=len(data)) for _, data, meta in chunks]}, done)
+
+    def _next_ready(self):
+        """Pending seqs that may go out together now, honouring window, backoff and batching."""
+        self._hold = None
+        if self._sends >= self.window:
+            return None
+        now   = time.monotonic()
+        batch = []
+        for seq in sorted(self._pending):
+            if seq in self._in_flight:
+                continue
+            if self._retry_at.get(seq, 0) > now:
+                if batch or self.window == 1 or seq == min(self._pending):
+                    # keep order: nothing overtakes a chunk that is backing off
+                    break
+                continue
+            if batch and self._keys.get(seq) != self._keys.get(batch[0]):
+                break
+            batch.append(seq)
+            if len(batch) >= self.batch_max:
+                break
+        if batch and len(batch) < self.batch_max and self._slow():
+            hold = self._queued_at.get(batch[0], now) + self.batch_age
+            if hold > now:
+                # slow link: wait a little so more chunks can share the request
+                self._hold = hold
+                return None
+        return batch
+
+    def _slow(self):
+        if not self._ok:
+            return True
+        return bool(self.slow_after) and self._rtt is not None and self._rtt > self.slow_after
+
+    def _wait_time(self):
+        deadlines = list(self._retry_at.values())
+        if self._hold is not None:
+            deadlines.append(self._hold)
+        if not deadlines:
+            return None
+        return max(0.0, min(deadlines) - time.monotonic())
+
+    def _on_done(self, seqs, ok, start):
+        elapsed = time.monotonic() - start
+        with self._cond:
+            self._sends -= 1
+            self._ok     = ok
+            if ok:
+                self._rtt = elapsed if self._rtt is None else 0.8 * self._rtt + 0.2 * elapsed
+            self._wake()
+        if ok:
+            for seq in seqs:
+                self._finish(seq, delivered=True)
+            return
+        failed = []                      # (seq, attempts, delay)
+        with self._cond:
+            for seq in seqs:
+                self._in_flight.discard(seq)
+                if seq not in self._pending:
+                    continue
+                attempts = self._attempts.get(seq, 0) + 1
+                self._attempts[seq] = attempts
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+                self._retry_at[seq] = time.monotonic() + delay
+                self.retries += 1
+                failed.append((seq, attempts, delay))
+            self._wake()
+        if not failed:
+            return                       # evicted while in flight
+        if len(failed) == 1:
+            seq, attempts, delay = failed[0]
+            logging.warning(f"[{self.name.upper()}] Chunk {seq} failed (attempt {attempts}), retrying in {delay:.0f}s")
+            return
+        delays = [delay for _, _, delay in failed]
+        logging.warning(f"[{self.name.upper()}] Chunks {failed[0][0]}-{failed[-1][0]} failed "
+                        f"({self._describe_attempts(failed)}), retrying in "
+                        f"{min(delays):.0f}-{max(delays):.0f}s")
+
+    @staticmethod
+    def _describe_attempts(failed):
+        """'attempt 3 for 4-6, attempt 1 for 7': runs of seqs sharing a count."""
+        runs = []                        # [first, last, attempts]
+        for seq, attempts, _ in failed:
+            if runs and runs[-1][2] == attempts and runs[-1][1] == seq - 1:
+                runs[-1][1] = seq
+            else:
+                runs.append([seq, seq, attempts])
+        return ', '.join(f"attempt {attempts} for {first}" + (f"-{last}" if last != first else '')
+                         for first, last, attempts in runs)
+
+    def _finish(self, seq, delivered):
+        try:
+            os.remove(self._path(seq))
+        except FileNotFoundError:
+            pass
+        with self._cond:
+            self._in_flight.discard(seq)
+            self._pending.pop(seq, None)
+            self._attempts.pop(seq, None)
+            self._retry_at.pop(seq, None)
+            self._queued_at.pop(seq, None)
+            self._keys.pop(seq, None)
+            if delivered:
+                self.delivered += 1
+            self._advance_acked()
+            self._wake()
+
+    # === DISK STATE ===
+    def _path(self, seq):
+        return os.path.join(self.directory, f"{seq:010d}{CHUNK_EXT}")
+
+    def _load(self, seq):
+        with open(self._path(seq), 'rb') as f:
+            header, _, data = f.read().partition(b'\n')
+        return data, json.loads(header)
+
+    def _read_acked(self):
+        try:
+            with open(os.path.join(self.directory, ACKED_FILE)) as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _advance_acked(self):
+        """Move the watermark past every delivered seq and persist it."""
+        outstanding = self._pending.keys() | self._writing
+        low = min(outstanding) - 1 if outstanding else self._next_seq - 1
+        if low <= self._acked:
+            return
+        self._acked = low
+        path = os.path.join(self.directory, ACKED_FILE)
+        with open(path + '.tmp', 'w') as f:
+            f.write(str(low))
+        os.replace(path + '.tmp', path)
+
+    def _recover(self):
+        """Load undelivered chunks from disk. Returns the highest seq seen."""
+        last = self._acked
+        for fname in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, fname)
+            if fname.endswith('.tmp'):
+                os.remove(path)          # interrupted write, never acknowledged to the caller
+                continue
+            if not fname.endswith(CHUNK_EXT):
+                continue
+            seq = int(fname[:-len(CHUNK_EXT)])
+            last = max(last, seq)
+            if seq <= self._acked:
+                os.remove(path)          # delivered before the crash, not yet reclaimed
+                continue
+            self._pending[seq]   = os.path.getsize(path)
+            self._queued_at[seq] = time.monotonic()
+            try:
+                with open(path, 'rb') as f:
+                    self._keys[seq] = self.batch_key(json.loads(f.readline()))
+            except (OSError, ValueError):
+                self._keys[seq] = None   # the sender reports it when it gets there
+        if self._pending:
+            logging.info(f"[{self.name.upper()}] Resuming {len(self._pending)} undelivered chunks")
+        return last
+
+    def _enforce_quota(self):
+        """Evict the oldest undelivered chunks once the spool exceeds max_bytes.
+
+        Returns the evicted chunks' metadata, for on_evict.
+        """
+        evicted = []
+        if not self.max_bytes:
+            return evicted
+        total = sum(self._pending.values())
+        for seq in sorted(self._pending):
+            if total <= self.max_bytes:
+                break
+            if seq in self._in_flight:
+                continue
+            total -= self._pending.pop(seq)
+            self._attempts.pop(seq, None)
+            self._retry_at.pop(seq, None)
+            self._queued_at.pop(seq, None)
+            self._keys.pop(seq, None)
+            if self.on_evict:
+                try:
+                    with open(self._path(seq), 'rb') as f:
+                        evicted.append(json.loads(f.readline()))
+                except (OSError, ValueError):
+                    evicted.append(None)
+            try:
+                os.remove(self._path(seq))
+            except FileNotFoundError:
+                pass
+            self.evicted += 1
+            logging.warning(f"[{self.name.upper()}] Spool over quota, evicted chunk {seq}")
+        self._advance_acked()
+        return evicted
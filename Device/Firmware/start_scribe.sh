@@ -4,7 +4,7 @@
 cd ~
 
 sudo apt-get update
-sudo apt-get install -y fortune python3-pip
+sudo apt-get install -y fortune python3-pip opus-tools
 
 
 fortune 
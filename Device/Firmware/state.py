@@ -0,0 +1,197 @@
+import time
+import uuid
+import threading
+from math import log10
+from collections import namedtuple
+
+from dsp import FLOOR_DBFS
+
+# Everything an uploader needs to know about one chunk, fixed when the chunk
+# is captured. Spooled as a dict (ChunkMeta._asdict()).
+# A silent chunk has no payload: its frames are silence the VAD kept out of
+# the stream. The levels cover the chunk's frames (see dsp.measure).
+ChunkMeta = namedtuple('ChunkMeta', 'session chunk timestamp mono_us codec rate channels '
+                                    'byte_offset sample_offset frames final silent '
+                                    'rms_dbfs peak_dbfs clipped')
+
+
+class Session:
+    """One recording, from the button press that starts it to its last chunk.
+
+    Owns the session's stream position. Only the thread that turns audio into
+    chunks calls chunk(); everything else gets the ChunkMeta it returns, which
+    never changes afterwards.
+    """
+
+    def __init__(self, rate, channels):
+        self.id       = uuid.uuid4().hex[:8]
+        self.codec    = None      # set by RecorderState.begin()
+        self.rate     = rate
+        self.channels = channels
+        self.started  = time.time()
+
+        self._lock         = threading.Lock()
+        self._stopping     = threading.Event()
+        self._chunks       = 0
+        self._bytes        = 0     # where the next chunk goes in the server's stream file
+        self._frames       = 0     # frames captured so far
+        self._chunk_start  = 0     # first frame not yet carried by a chunk
+        # level of the frames since _chunk_start: energy (frames x mean
+        # square), loudest peak and samples at full scale
+        self._energy       = 0.0
+        self._peak         = FLOOR_DBFS
+        self._clipped      = 0
+        self.silent_frames = 0     # frames sent as silence markers
+        self.clipped       = 0     # samples at full scale this session
+        self.clipper       = None  # the stream's HighlightClipper while it runs
+
+    @property
+    def running(self):
+        return not self._stopping.is_set()
+
+    @property
+    def frames(self):
+        return self._frames
+
+    @property
+    def bytes(self):
+        """Payload bytes handed out so far."""
+        return self._bytes
+
+    def stop(self):
+        self._stopping.set()
+
+    def captured(self, frames, level=None):
+        """Count frames captured, whether or not a chunk carries them yet,
+        and their dsp.Level if measured."""
+        with self._lock:
+            self._frames += frames
+            if level:
+                self._energy  += frames * 10 ** (level.rms_dbfs / 10)
+                self._peak     = max(self._peak, level.peak_dbfs)
+                self._clipped += level.clipped
+
+    def chunk(self, length, mono_us, wall_us, final=False, silent=False):
+        """Metadata for the next chunk: `length` bytes carrying every frame
+        captured since the previous chunk, which finished capturing at
+        `mono_us` / `wall_us`. A `silent` chunk carries them as silence."""
+        with self._lock:
+            self._chunks += 1
+            frames = self._frames - self._chunk_start
+            rms    = 10 * log10(self._energy / frames) if self._energy and frames else FLOOR_DBFS
+            meta = ChunkMeta(
+                session=self.id,
+                chunk=self._chunks,
+                timestamp=wall_us // 1000,
+                mono_us=mono_us,
+                codec=self.codec,
+                rate=self.rate,
+                channels=self.channels,
+                byte_offset=self._bytes,
+                sample_offset=self._chunk_start,
+                frames=frames,
+                final=final,
+                silent=silent,
+                rms_dbfs=round(max(rms, FLOOR_DBFS), 2),
+                peak_dbfs=round(self._peak, 2),
+                clipped=self._clipped,
+            )
+            if silent:
+                self.silent_frames += frames
+            self.clipped      += self._clipped
+            self._bytes       += length
+            self._chunk_start  = self._frames
+            self._energy       = 0.0
+            self._peak         = FLOOR_DBFS
+            self._clipped      = 0
+        return meta
+
+
+class RecorderState:
+    """The recorder's shared state: which session is recording, if any.
+
+    Button callbacks, the streaming thread and the upload workers all go
+    through this object instead of module globals. toggle() is the one place
+    a session is started or stopped; begin()/end() bracket the streaming
+    thread's use of the capture hardware, so a new session cannot start
+    capturing until the previous one has drained.
+    """
+
+    def __init__(self, rate, channels, debounce=2.0):
+        self.rate     = rate
+        self.channels = channels
+        self.debounce = debounce
+
+        self._cond     = threading.Condition()
+        self._current  = None       # session the buttons act on
+        self._active   = None       # session whose stream is still running
+        self._last     = 0          # monotonic time of the last accepted toggle
+        self._level    = {'rms_dbfs': None, 'peak_dbfs': None, 'clipped': None}
+
+    @property
+    def session(self):
+        """The current Session, or None while idle."""
+        return self._current
+
+    @property
+    def recording(self):
+        session = self._current
+        return session is not None and session.running
+
+    def start(self):
+        """Start a new session and return it. Any running session is stopped."""
+        with self._cond:
+            if self._current:
+                self._current.stop()
+                self._cond.notify_all()
+            self._current = Session(self.rate, self.channels)
+            return self._current
+
+    def toggle(self):
+        """Upload button: stop the running session or start a new one.
+
+        Returns the Session started, False when a session was stopped, or
+        None when the press came within `debounce` seconds of the last one.
+        """
+        now = time.monotonic()
+        with self._cond:
+            if now - self._last < self.debounce:
+                return None
+            self._last = now
+            if self.recording:
+                self._current.stop()
+                self._current = None
+                self._cond.notify_all()
+                return False
+            return self.start()
+
+    def begin(self, session, codec, timeout=None):
+        """Claim the capture hardware for `session`, recording with `codec`,
+        once the previous session's stream has finished. False if `session`
+        was stopped meanwhile."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._active is None or not session.running, timeout)
+            if not session.running or self._active is not None:
+                return False
+            session.codec = codec
+            self._active  = session
+            return True
+
+    def end(self, session):
+        """The stream for `session` has stopped and flushed its last chunk."""
+        with self._cond:
+            session.stop()
+            session.clipper = None
+            if self._active is session:
+                self._active = None
+            if self._current is session:
+                self._current = None
+            self._cond.notify_all()
+
+    def set_level(self, level):
+        self._level = level._asdict()
+
+    @property
+    def level(self):
+        """Input level of the latest chunk."""
+        return self._level
@@ -0,0 +1,229 @@
+"""Per-session timeline index: where every uploaded chunk sits in time.
+
+One fixed-size record per chunk, stored at (seq - 1) * RECORD.size, so the
+device appends in order and upload.php can write records as chunks arrive
+in any order. A record of zeros is a chunk the server never received.
+
+Silence the device's VAD kept out of the stream is recorded as chunks with
+frames but no payload (the next chunk starts at the same byte offset, or
+the last one at the end of the stream), so the sample offsets still add up
+to the session's exact duration.
+
+    python3 timeline.py stream.timeline                 # summary and gaps
+    python3 timeline.py stream.timeline --at 2026-10-18T14:03:00
+    python3 timeline.py stream.timeline --sample 480000
+"""
+import os
+import sys
+import struct
+import bisect
+import argparse
+import datetime
+from collections import namedtuple
+
+#   offset size field
+#        0    4 seq            chunk number within the session, from 1
+#        4    4 frames         frames of audio captured for the chunk
+#        8    8 sample offset  frames captured before the chunk
+#       16    8 byte offset    where the chunk's payload goes in the stream
+#       24    8 capture mono   monotonic clock, microseconds
+#       32    8 capture wall   unix epoch, microseconds
+#       40    2 rms            hundredths of a dBFS
+#       42    2 peak           hundredths of a dBFS
+#       44    4 clipped        samples at full scale
+RECORD = struct.Struct('<IIQQqqhhI')
+
+Entry = namedtuple('Entry', 'seq frames sample_offset byte_offset mono_us wall_us '
+                            'rms_dbfs peak_dbfs clipped')
+
+
+def _centi(db):
+    return max(-32768, min(32767, round(db * 100)))
+
+
+class TimelineWriter:
+    """Appends records for one session, in seq order, on the device."""
+
+    def __init__(self, path):
+        self.path = path
+        self._f   = open(path, 'ab')
+
+    def append(self, seq, frames, sample_offset, byte_offset, mono_us, wall_us,
+               rms_dbfs=0.0, peak_dbfs=0.0, clipped=0):
+        self._f.write(RECORD.pack(seq, frames, sample_offset, byte_offset, mono_us, wall_us,
+                                  _centi(rms_dbfs), _centi(peak_dbfs), clipped))
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+
+class Timeline:
+    """Read side: O(log n) seeks by time or sample, and exact gap detection."""
+
+    def __init__(self, data):
+        self._data = data
+        self._n    = len(data) // RECORD.size
+        # seqs the server has, in order; missing ones are all-zero records
+        self._present = [i for i in range(self._n) if self._raw(i)[0]]
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls(f.read())
+
+    def _raw(self, i):
+        return RECORD.unpack_from(self._data, i * RECORD.size)
+
+    def _entry(self, i):
+        raw = self._raw(i)
+        return Entry(*raw[:6], raw[6] / 100, raw[7] / 100, raw[8])
+
+    def __len__(self):
+        return len(self._present)
+
+    def __getitem__(self, k):
+        return self._entry(self._present[k])
+
+    def entry(self, seq):
+        """Record for chunk `seq`, or None if it never arrived."""
+        if not 1 <= seq <= self._n or not self._raw(seq - 1)[0]:
+            return None
+        return self._entry(seq - 1)
+
+    def _find(self, value, field):
+        """Index of the last entry whose `field` is <= value (-1 if none)."""
+        key = lambda k: getattr(self[k], field)
+        return bisect.bisect_right(range(len(self)), value, key=key) - 1
+
+    def at_sample(self, sample):
+        """Entry holding session frame `sample`, or None if that audio is missing."""
+        k = self._find(sample, 'sample_offset')
+        if k < 0:
+            return None
+        e = self[k]
+        return e if sample < e.sample_offset + e.frames else None
+
+    def sample_at(self, wall_us, clock='wall_us'):
+        """Session frame captured at `wall_us` (or a monotonic time with clock='mono_us').
+
+        Interpolates inside the chunk using its own span of capture time, so
+        clock drift between chunks does not accumulate. Returns None before
+        the first chunk.
+        """
+        k = self._find(wall_us, clock)
+        if k < 0:
+            return None
+        e   = self[k]
+        end = getattr(self[k + 1], clock) if k + 1 < len(self) else None
+        # chunk times are stamped when the chunk finished capturing
+        if end is None or not e.frames:
+            return e.sample_offset + e.frames
+        start = getattr(e, clock)
+        frac  = min(1.0, (wall_us - start) / max(1, end - start))
+        return e.sample_offset + e.frames + int(frac * self[k + 1].frames)
+
+    def silences(self, data_end=None):
+        """(first frame, frames) of each silent span, adjacent markers merged.
+
+        A chunk is silent when it has frames but no bytes. Its length is
+        where the next chunk starts or, for the last chunk, `data_end` (the
+        stream's payload size, as in upload.php's audioSpans()). A chunk
+        whose length is not known yet is left out.
+        """
+        spans = []
+        for k in range(len(self)):
+            e = self[k]
+            if k + 1 < len(self):
+                nxt = self[k + 1]
+                if nxt.seq != e.seq + 1:
+                    continue
+                length = nxt.byte_offset - e.byte_offset
+            elif data_end is not None:
+                length = data_end - e.byte_offset
+            else:
+                continue
+            if not e.frames or length > 0:
+                continue
+            if spans and spans[-1][0] + spans[-1][1] == e.sample_offset:
+                spans[-1] = (spans[-1][0], spans[-1][1] + e.frames)
+            else:
+                spans.append((e.sample_offset, e.frames))
+        return spans
+
+    def levels(self):
+        """Loudest peak (dBFS) and total clipped samples over the session."""
+        entries = [self[k] for k in range(len(self))]
+        return (max((e.peak_dbfs for e in entries if e.frames), default=None),
+                sum(e.clipped for e in entries))
+
+    def gaps(self):
+        """(first missing seq, last missing seq, first missing frame, frames) per gap.
+
+        Found from both missing records and breaks in the sample offsets, so a
+        dropped chunk can never silently shift the audio after it.
+        """
+        found = []
+        prev  = None
+        for k in range(len(self)):
+            e = self[k]
+            expected_seq    = prev.seq + 1 if prev else 1
+            expected_sample = prev.sample_offset + prev.frames if prev else 0
+            if e.seq != expected_seq or e.sample_offset != expected_sample:
+                found.append((expected_seq, e.seq - 1, expected_sample,
+                              e.sample_offset - expected_sample))
+            prev = e
+        return found
+
+
+def _stream_data_end(path):
+    """Payload size of the stream file next to a server-side stream.timeline."""
+    folder = os.path.dirname(os.path.abspath(path))
+    for name, header in (('stream.wav', 44), ('stream.opus', 0)):
+        stream = os.path.join(folder, name)
+        if os.path.isfile(stream):
+            return os.path.getsize(stream) - header
+    return None
+
+
+def _parse_time(text):
+    return int(datetime.datetime.fromisoformat(text).timestamp() * 1e6)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path')
+    parser.add_argument('--at', help='local wall-clock time (ISO 8601) to look up')
+    parser.add_argument('--sample', type=int, help='session frame to look up')
+    args = parser.parse_args()
+
+    tl = Timeline.load(args.path)
+    if not len(tl):
+        print("empty timeline")
+        return 1
+    first, last = tl[0], tl[len(tl) - 1]
+    print(f"{os.path.basename(args.path)}: {len(tl)} chunks, seq {first.seq}-{last.seq}, "
+          f"{last.sample_offset + last.frames} frames, "
+          f"{datetime.datetime.fromtimestamp(first.wall_us / 1e6)} -> "
+          f"{datetime.datetime.fromtimestamp(last.wall_us / 1e6)}")
+    peak, clipped = tl.levels()
+    if peak is not None:
+        print(f"  peak {peak:.1f} dBFS, {clipped} samples clipped")
+    silent = sum(frames for _, frames in tl.silences(_stream_data_end(args.path)))
+    if silent:
+        total = last.sample_offset + last.frames
+        print(f"  silence: {silent} frames ({100 * silent / total:.0f}%) sent as markers")
+    for seq_a, seq_b, sample, frames in tl.gaps():
+        print(f"  gap: seq {seq_a}-{seq_b}, {frames} frames missing from frame {sample}")
+    if args.at:
+        sample = tl.sample_at(_parse_time(args.at))
+        print(f"{args.at} -> frame {sample}")
+        args.sample = args.sample if args.sample is not None else sample
+    if args.sample is not None:
+        e = tl.at_sample(args.sample)
+        print(f"frame {args.sample} -> " + (f"chunk {e.seq}, stream byte {e.byte_offset}" if e else "missing"))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
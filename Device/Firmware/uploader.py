@@ -0,0 +1,390 @@
+import os
+import json
+import time
+import queue
+import threading
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# Backpressure policies for a full upload queue
+BLOCK       = 'block'        # capture waits until a worker frees a slot
+DROP_OLDEST = 'drop_oldest'  # discard the oldest queued chunk to make room
+SPILL       = 'spill'        # write the chunk to disk, send it once the queue drains
+
+POLICIES = (BLOCK, DROP_OLDEST, SPILL)
+
+# Wire encodings for /api/audio/upload
+JSON_INTS = 'json'       # legacy: chunk as a JSON array of byte values
+OCTET     = 'octet'      # raw body, metadata in X-* headers
+MULTIPART = 'multipart'  # one file part plus form fields
+
+ENCODINGS = (JSON_INTS, OCTET, MULTIPART)
+
+
+def _header_name(field):
+    # chunkId -> X-Chunk-Id
+    words, word = [], ''
+    for ch in field:
+        if ch.isupper() and word:
+            words.append(word)
+            word = ''
+        word += ch
+    words.append(word)
+    return 'X-' + '-'.join(w.capitalize() for w in words)
+
+
+def encode_chunk(encoding, chunk_bytes, fields):
+    """Return the requests.post() keyword arguments that send one chunk.
+
+    `fields` holds the chunk metadata (userId, timestamp, chunkId, sessionId).
+    """
+    if encoding == JSON_INTS:
+        payload = dict(fields, audioData=list(chunk_bytes))
+        return {'json': payload}
+    if encoding == OCTET:
+        headers = {_header_name(k): str(v) for k, v in fields.items()}
+        headers['Content-Type'] = 'application/octet-stream'
+        return {'data': chunk_bytes, 'headers': headers}
+    if encoding == MULTIPART:
+        files = {'audioData': ('chunk.raw', chunk_bytes, 'application/octet-stream')}
+        return {'files': files, 'data': {k: str(v) for k, v in fields.items()}}
+    raise ValueError(f"Unknown upload encoding: {encoding}")
+
+
+class UploadPool:
+    """Fixed number of upload workers fed by a bounded queue.
+
+    `handler(data, meta)` is called on a worker thread for each submitted
+    chunk. It should do its own logging and return True on success; a falsy
+    result or an exception counts as a failure.
+
+    Items submitted with priority=True skip the bounded queue and its policy
+    and go to `priority_workers` threads of their own, so they never wait
+    behind the bulk stream however deep its backlog.
+    """
+
+    def __init__(self, handler, workers=2, max_queue=30, policy=DROP_OLDEST,
+                 spill_dir=None, priority_workers=1, name='upload'):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+        if policy == SPILL and not spill_dir:
+            raise ValueError("spill policy needs a spill_dir")
+
+        self.handler   = handler
+        self.policy    = policy
+        self.spill_dir = spill_dir
+        self.name      = name
+        self._queue    = queue.Queue(maxsize=max_queue)
+        self._priority = queue.Queue()
+        self._lock     = threading.Lock()
+        self._stop     = threading.Event()
+        self._spill_seq = 0
+
+        self.in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed    = 0
+        self.dropped   = 0
+        self.spilled   = 0
+
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            self._spill_seq = self._last_spill_seq()
+
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"{name}-{i}", daemon=True)
+            for i in range(workers)
+        ] + [
+            threading.Thread(target=self._worker, args=(self._priority,),
+                             name=f"{name}-priority-{i}", daemon=True)
+            for i in range(priority_workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    # === PRODUCER SIDE ===
+    def submit(self, data, meta=None, callback=None, priority=False):
+        """Queue one chunk. Returns False if it was dropped.
+
+        `callback(ok)` runs on the worker once the handler finishes, or with
+        False if the chunk is dropped. It is not kept for spilled chunks.
+        """
+        item = (data, meta or {}, callback)
+        with self._lock:
+            self.submitted += 1
+
+        if priority:
+            self._priority.put(item)
+            return True
+
+        if self.policy == BLOCK:
+            self._queue.put(item)
+            return True
+
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            pass
+
+        if self.policy == SPILL:
+            self._spill(item)
+            return True
+
+        # DROP_OLDEST: make room by discarding the head of the queue
+        with self._lock:
+            try:
+                oldest = self._queue.get_nowait()
+                self._queue.task_done()
+                self.dropped += 1
+            except queue.Empty:
+                oldest = None
+            try:
+                self._queue.put_nowait(item)
+                queued = True
+            except queue.Full:
+                self.dropped += 1
+                queued = False
+        if oldest and oldest[2]:
+            oldest[2](False)
+        if not queued and callback:
+            callback(False)
+        return queued
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'priority':    self._priority.qsize(),
+                'in_flight':   self.in_flight,
+                'submitted':   self.submitted,
+                'completed':   self.completed,
+                'failed':      self.failed,
+                'dropped':     self.dropped,
+                'spilled':     self.spilled,
+                'spill_depth': len(self._spill_files()) if self.spill_dir else 0,
+            }
+
+    def close(self, timeout=10):
+        """Let queued chunks finish (up to `timeout`) and stop the workers."""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self._lock:
+                idle = self._queue.empty() and self._priority.empty() and self.in_flight == 0
+            if idle:
+                break
+            time.sleep(0.1)
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout=max(0, deadline - time.time()))
+
+    # === WORKERS ===
+    def _worker(self, source=None):
+        source = source or self._queue
+        while not self._stop.is_set():
+            try:
+                data, meta, callback = source.get(timeout=0.5)
+            except queue.Empty:
+                if source is self._queue:
+                    self._unspill()
+                continue
+
+            with self._lock:
+                self.in_flight += 1
+            try:
+                ok = bool(self.handler(data, meta))
+            except Exception as e:
+                logging.error(f"[{self.name.upper()}][EXCEPTION] {e}")
+                ok = False
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+                    if ok:
+                        self.completed += 1
+                    else:
+                        self.failed += 1
+                source.task_done()
+            if callback:
+                try:
+                    callback(ok)
+                except Exception as e:
+                    logging.error(f"[{self.name.upper()}][CALLBACK] {e}")
+
+    # === SPILL TO DISK ===
+    def _spill_files(self):
+        return sorted(f for f in os.listdir(self.spill_dir) if f.endswith('.chunk'))
+
+    def _last_spill_seq(self):
+        files = self._spill_files()
+        return int(files[-1].split('.')[0]) if files else 0
+
+    def _spill(self, item):
+        data, meta, _ = item
+        with self._lock:
+            self._spill_seq += 1
+            seq = self._spill_seq
+            self.spilled += 1
+        path = os.path.join(self.spill_dir, f"{seq:010d}.chunk")
+        tmp  = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(json.dumps(meta).encode() + b'\n')
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _unspill(self):
+        """Move spilled chunks back into the queue, oldest first, while there is room."""
+        if not self.spill_dir:
+            return
+        with self._lock:
+            for fname in self._spill_files():
+                if self._queue.full():
+                    break
+                path = os.path.join(self.spill_dir, fname)
+                try:
+                    with open(path, 'rb') as f:
+                        header, _, data = f.read().partition(b'\n')
+                    meta = json.loads(header or b'{}')
+                    os.remove(path)
+                except (OSError, ValueError) as e:
+                    logging.error(f"[{self.name.upper()}][SPILL] Could not read {fname}: {e}")
+                    continue
+                self._queue.put_nowait((data, meta, None))
+
+
+# === PERSISTENT HTTP CLIENT ===
+# Per-thread timing of the request in progress. Each upload worker runs its
+# request start to finish on one thread, so the pooled connections can
+# report connect/TLS times here without any locking.
+_timing = threading.local()
+
+
+def _mark(phase, seconds):
+    if getattr(_timing, 'current', None) is not None:
+        _timing.current[phase] = _timing.current.get(phase, 0.0) + seconds
+
+
+class _TimedConnectionMixin:
+    def _new_conn(self):
+        start = time.monotonic()
+        sock = super()._new_conn()
+        _mark('connect', time.monotonic() - start)
+        return sock
+
+    def getresponse(self, *args, **kwargs):
+        resp = super().getresponse(*args, **kwargs)
+        if getattr(_timing, 'current', None) is not None:
+            _timing.current.setdefault('ttfb_at', time.monotonic())
+        return resp
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    def connect(self):
+        current = getattr(_timing, 'current', None)
+        tcp_before = current.get('connect', 0.0) if current is not None else 0.0
+        start = time.monotonic()
+        super().connect()
+        if current is not None:
+            # connect() is the TCP handshake (timed in _new_conn) plus TLS
+            tcp = current.get('connect', 0.0) - tcp_before
+            _mark('tls', time.monotonic() - start - tcp)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http':  _TimedHTTPConnectionPool,
+            'https': _TimedHTTPSConnectionPool,
+        }
+
+
+class UploadClient:
+    """Keep-alive HTTP client shared by all upload workers.
+
+    One requests.Session with a connection pool sized to the worker count,
+    so each worker reuses an open TCP/TLS connection instead of paying for a
+    new handshake on every chunk. After each post() the response carries a
+    `timing` dict with curl-style phases in seconds:
+
+        connect  TCP handshake (0 when a pooled connection was reused)
+        tls      TLS handshake (0 when reused or plain HTTP)
+        ttfb     request start until the response headers arrived
+        total    request start until the body was read
+    """
+
+    PHASES = ('connect', 'tls', 'ttfb', 'total')
+
+    def __init__(self, pool_size=2, timeout=10, headers=None):
+        self.timeout = timeout
+        self.session = requests.Session()
+        if headers:
+            self.session.headers.update(headers)
+        adapter = _TimedAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._lock    = threading.Lock()
+        self.requests = 0
+        self.reused   = 0
+        self._sum     = dict.fromkeys(self.PHASES, 0.0)
+        self._max     = dict.fromkeys(self.PHASES, 0.0)
+        self.last     = None
+
+    def post(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        _timing.current = {}
+        start = time.monotonic()
+        try:
+            resp = self.session.post(url, **kwargs)
+            end = time.monotonic()
+            phases = _timing.current
+        finally:
+            _timing.current = None
+
+        timing = {
+            'connect': phases.get('connect', 0.0),
+            'tls':     phases.get('tls', 0.0),
+            'ttfb':    phases.get('ttfb_at', end) - start,
+            'total':   end - start,
+        }
+        resp.timing = timing
+        self._record(timing, reused='connect' not in phases)
+        return resp
+
+    def _record(self, timing, reused):
+        with self._lock:
+            self.requests += 1
+            self.reused   += reused
+            for phase in self.PHASES:
+                self._sum[phase] += timing[phase]
+                self._max[phase] = max(self._max[phase], timing[phase])
+            self.last = timing
+
+    def stats(self):
+        """Request count, connection reuse and mean/max milliseconds per phase."""
+        with self._lock:
+            n = self.requests or 1
+            out = {'requests': self.requests, 'reused': self.reused}
+            for phase in self.PHASES:
+                out[f'{phase}_avg_ms'] = round(self._sum[phase] / n * 1000, 1)
+                out[f'{phase}_max_ms'] = round(self._max[phase] * 1000, 1)
+            return out
+
+    def close(self):
+        self.session.close()
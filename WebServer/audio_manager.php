@@ -1,7 +1,8 @@
 <?php
+require __DIR__ . '/transcribe.php';
+
 // Configuration
 $uploadDir = 'uploads/';
-$allowedAudioTypes = ['mp3', 'wav', 'mp4', 'm4a', 'flac', 'ogg'];
 
 // Handle AJAX requests
 if ($_SERVER['REQUEST_METHOD'] === 'POST') {
@@ -14,7 +15,29 @@ if ($_SERVER['REQUEST_METHOD'] === 'POST') {
                 $newName = $_POST['newName'];
                 
                 if (is_dir($uploadDir . $oldName) && !empty($newName)) {
+                    if (file_exists($uploadDir . $newName)) {
+                        echo json_encode(['success' => false, 'error' => 'A folder with that name already exists']);
+                        break;
+                    }
+                    // the catalog row moves first, in a transaction that only
+                    // commits once the folder itself has been renamed
+                    $catalog = catalogDb();
+                    $catalog->beginTransaction();
+                    try {
+                        catalogRename($oldName, $newName);
+                    } catch (PDOException $e) {
+                        $catalog->rollBack();
+                        echo json_encode(['success' => false, 'error' => 'A session with that name is already catalogued']);
+                        break;
+                    }
                     $success = rename($uploadDir . $oldName, $uploadDir . $newName);
+                    if ($success) {
+                        $catalog->commit();
+                        // the session's jobs follow it too
+                        jobsDb()->prepare('UPDATE jobs SET folder = ? WHERE folder = ?')->execute([$newName, $oldName]);
+                    } else {
+                        $catalog->rollBack();
+                    }
                     echo json_encode(['success' => $success]);
                 } else {
                     echo json_encode(['success' => false, 'error' => 'Invalid folder name']);
@@ -22,204 +45,97 @@ if ($_SERVER['REQUEST_METHOD'] === 'POST') {
                 break;
                 
             case 'transcribe':
+                // queued for transcribe_worker.php; the page polls job_status
                 $folderName = $_POST['folderName'];
                 $audioFile = $_POST['audioFile'];
                 $audioPath = $uploadDir . $folderName . '/' . $audioFile;
                 
                 if (file_exists($audioPath)) {
-                    $transcription = transcribeAudio($audioPath);
-                    
-                    // Save transcription to file
-                    $transcriptFile = saveTranscription($folderName, $audioFile, $transcription);
-                    
-                    echo json_encode([
-                        'success' => true, 
-                        'transcription' => $transcription,
-                        'saved_file' => $transcriptFile
-                    ]);
+                    echo json_encode(['success' => true] + jobResponse(enqueueJob($folderName, $audioFile)));
                 } else {
                     echo json_encode(['success' => false, 'error' => 'Audio file not found']);
                 }
                 break;
+                
+            case 'job_status':
+                $job = getJob((int)$_POST['jobId']);
+                if ($job) {
+                    echo json_encode(['success' => true] + jobResponse($job));
+                } else {
+                    echo json_encode(['success' => false, 'error' => 'Unknown job']);
+                }
+                break;
+                
+            case 'transcribe_highlights':
+                // each highlight window is its own job, so the worker runs them in parallel
+                $folderName = $_POST['folderName'];
+                $waiting = enqueueHighlights($folderName);
+                if ($waiting === null) {
+                    echo json_encode(['success' => false, 'error' => 'Session has no stream to cut highlights from']);
+                } else {
+                    echo json_encode(['success' => true, 'waiting' => $waiting,
+                                      'highlights' => highlightIndex($folderName)]);
+                }
+                break;
+                
+            case 'highlights_status':
+                echo json_encode(['success' => true, 'highlights' => highlightIndex($_POST['folderName'])]);
+                break;
         }
     }
     exit;
 }
 
-// Function to transcribe audio using AssemblyAI (free tier)
-function transcribeAudio($audioPath) {
-    // You'll need to replace 'YOUR_ASSEMBLYAI_API_KEY' with your actual AssemblyAI API key
-    // Sign up at https://www.assemblyai.com/ for free API key
-    $apiKey = '8b58645e0193407f87c396346e54c919';
-    
-    // Step 1: Upload the audio file
-    $uploadUrl = uploadAudioFile($audioPath, $apiKey);
-    if (!$uploadUrl) {
-        return 'Failed to upload audio file';
-    }
-    
-    // Step 2: Submit for transcription
-    $transcriptId = submitTranscription($uploadUrl, $apiKey);
-    if (!$transcriptId) {
-        return 'Failed to submit for transcription';
-    }
-    
-    // Step 3: Poll for completion (simplified - in production you'd want better polling)
-    $maxAttempts = 30; // 30 seconds max wait
-    for ($i = 0; $i < $maxAttempts; $i++) {
-        sleep(1);
-        $result = getTranscriptionResult($transcriptId, $apiKey);
-        if ($result['status'] === 'completed') {
-            return $result['text'];
-        } elseif ($result['status'] === 'error') {
-            return 'Transcription error: ' . $result['error'];
-        }
-    }
-    
-    return 'Transcription timed out - please try again';
+// What the page needs to know about a transcription job
+function jobResponse($job) {
+    return [
+        'job_id' => (int)$job['id'],
+        'status' => $job['status'],
+        'transcription' => $job['text'],
+        'error' => $job['error'],
+        'saved_file' => $job['status'] === 'done' ? 'transcript.txt' : null
+    ];
 }
 
-function uploadAudioFile($audioPath, $apiKey) {
-    $curl = curl_init();
-    
-    curl_setopt_array($curl, [
-        CURLOPT_URL => "https://api.assemblyai.com/v2/upload",
-        CURLOPT_RETURNTRANSFER => true,
-        CURLOPT_POST => true,
-        CURLOPT_HTTPHEADER => [
-            "Authorization: " . $apiKey,
-            "Content-Type: application/octet-stream"
-        ],
-        CURLOPT_POSTFIELDS => file_get_contents($audioPath)
-    ]);
-    
-    $response = curl_exec($curl);
-    $httpCode = curl_getinfo($curl, CURLINFO_HTTP_CODE);
-    curl_close($curl);
-    
-    if ($httpCode === 200) {
-        $data = json_decode($response, true);
-        return $data['upload_url'] ?? null;
-    }
-    
-    return null;
-}
+// Sessions per page
+define('PER_PAGE', 24);
 
-function submitTranscription($audioUrl, $apiKey) {
-    $curl = curl_init();
-    
-    curl_setopt_array($curl, [
-        CURLOPT_URL => "https://api.assemblyai.com/v2/transcript",
-        CURLOPT_RETURNTRANSFER => true,
-        CURLOPT_POST => true,
-        CURLOPT_HTTPHEADER => [
-            "Authorization: " . $apiKey,
-            "Content-Type: application/json"
+// One catalog row as the page shows it
+function folderView($row) {
+    return [
+        'name' => $row['folder'],
+        'audioFiles' => $row['audio_files'],
+        'csvFiles' => $row['csv_files'],
+        'transcriptFiles' => $row['transcript'] !== 'none' ? ['transcript.txt'] : [],
+        'transcript' => $row['transcript'],
+        'flag' => $row['flag'],
+        'hasHighlights' => in_array('highlights.csv', $row['csv_files']),
+        'stats' => [
+            gmdate('H:i:s', (int)$row['duration_sec']),
+            number_format($row['bytes'] / 1048576, 1) . ' MB',
+            $row['chunks'] . ' chunks',
+            $row['highlights'] . ' highlights',
         ],
-        CURLOPT_POSTFIELDS => json_encode([
-            'audio_url' => $audioUrl
-        ])
-    ]);
-    
-    $response = curl_exec($curl);
-    $httpCode = curl_getinfo($curl, CURLINFO_HTTP_CODE);
-    curl_close($curl);
-    
-    if ($httpCode === 200) {
-        $data = json_decode($response, true);
-        return $data['id'] ?? null;
-    }
-    
-    return null;
+        'updated' => $row['updated_at'] ? date('Y-m-d H:i', $row['updated_at']) : '',
+    ];
 }
 
-function getTranscriptionResult($transcriptId, $apiKey) {
-    $curl = curl_init();
-    
-    curl_setopt_array($curl, [
-        CURLOPT_URL => "https://api.assemblyai.com/v2/transcript/" . $transcriptId,
-        CURLOPT_RETURNTRANSFER => true,
-        CURLOPT_HTTPHEADER => [
-            "Authorization: " . $apiKey
-        ]
-    ]);
-    
-    $response = curl_exec($curl);
-    $httpCode = curl_getinfo($curl, CURLINFO_HTTP_CODE);
-    curl_close($curl);
-    
-    if ($httpCode === 200) {
-        $data = json_decode($response, true);
-        return [
-            'status' => $data['status'],
-            'text' => $data['text'] ?? '',
-            'error' => $data['error'] ?? ''
-        ];
-    }
-    
-    return ['status' => 'error', 'error' => 'API request failed'];
+// Listing and paging come from the session catalog (catalog.php), which
+// upload.php keeps current; an empty catalog is filled from the folders once
+if (catalogCount() === 0) {
+    catalogRebuild();
 }
+$sort  = isset(CATALOG_SORTS[$_GET['sort'] ?? '']) ? $_GET['sort'] : 'updated_at';
+$order = in_array($_GET['order'] ?? '', ['asc', 'desc']) ? $_GET['order'] : CATALOG_SORTS[$sort];
+$pages = max(1, (int)ceil(catalogCount() / PER_PAGE));
+$page  = min($pages, max(1, (int)($_GET['page'] ?? 1)));
+$folders = array_map('folderView', catalogPage($page, PER_PAGE, $sort, $order));
 
-// Function to save transcription to file
-function saveTranscription($folderName, $audioFile, $transcription) {
-    global $uploadDir;
-    
-    // Simple filename - just "transcript.txt"
-    $transcriptFile = 'transcript.txt';
-    $transcriptPath = $uploadDir . $folderName . '/' . $transcriptFile;
-    
-    // Create content with metadata
-    $content = "Transcription of: " . $audioFile . "\n";
-    $content .= "Generated on: " . date('Y-m-d H:i:s') . "\n";
-    $content .= "=" . str_repeat("=", 50) . "\n\n";
-    $content .= $transcription;
-    
-    // Save to file
-    if (file_put_contents($transcriptPath, $content) !== false) {
-        return $transcriptFile;
-    }
-    
-    return false;
+// Link to this listing with some of the parameters changed
+function pageUrl($changes) {
+    global $sort, $order, $page;
+    return '?' . htmlspecialchars(http_build_query($changes + ['sort' => $sort, 'order' => $order, 'page' => $page]));
 }
-
-// Get folders and their contents
-function getFolders($dir) {
-    $folders = [];
-    if (is_dir($dir)) {
-        $items = scandir($dir);
-        foreach ($items as $item) {
-            if ($item !== '.' && $item !== '..' && is_dir($dir . $item)) {
-                $folderContents = scandir($dir . $item);
-                $audioFiles = [];
-                $csvFiles = [];
-                $transcriptFiles = [];
-                
-                foreach ($folderContents as $file) {
-                    if ($file !== '.' && $file !== '..') {
-                        $ext = strtolower(pathinfo($file, PATHINFO_EXTENSION));
-                        if (in_array($ext, $GLOBALS['allowedAudioTypes'])) {
-                            $audioFiles[] = $file;
-                        } elseif ($ext === 'csv') {
-                            $csvFiles[] = $file;
-                        } elseif ($ext === 'txt' && $file === 'transcript.txt') {
-                            $transcriptFiles[] = $file;
-                        }
-                    }
-                }
-                
-                $folders[] = [
-                    'name' => $item,
-                    'audioFiles' => $audioFiles,
-                    'csvFiles' => $csvFiles,
-                    'transcriptFiles' => $transcriptFiles
-                ];
-            }
-        }
-    }
-    return $folders;
-}
-
-$folders = getFolders($uploadDir);
 ?>
 
 <!DOCTYPE html>
@@ -383,6 +299,20 @@ $folders = getFolders($uploadDir);
             font-size: 14px;
             margin-top: 5px;
         }
+        
+        .listing-controls {
+            display: flex;
+            justify-content: space-between;
+            align-items: center;
+            margin-bottom: 20px;
+            font-size: 14px;
+        }
+        
+        .folder-stats {
+            color: #555;
+            font-size: 13px;
+            margin: 0 0 15px 0;
+        }
     </style>
 </head>
 <body>
@@ -392,6 +322,29 @@ $folders = getFolders($uploadDir);
         <?php if (empty($folders)): ?>
             <p class="no-files">No folders found in the uploads directory.</p>
         <?php else: ?>
+            <form class="listing-controls" method="get">
+                <label>
+                    Sort by
+                    <select name="sort" onchange="this.form.order.value = ''; this.form.submit()">
+                        <?php foreach (['updated_at' => 'Last upload', 'created_at' => 'Started', 'folder' => 'Name',
+                                        'duration_sec' => 'Duration', 'bytes' => 'Size', 'chunks' => 'Chunks',
+                                        'highlights' => 'Highlights'] as $column => $label): ?>
+                            <option value="<?php echo $column; ?>"<?php echo $column === $sort ? ' selected' : ''; ?>><?php echo $label; ?></option>
+                        <?php endforeach; ?>
+                    </select>
+                    <input type="hidden" name="order" value="<?php echo $order; ?>">
+                    <a href="<?php echo pageUrl(['order' => $order === 'asc' ? 'desc' : 'asc', 'page' => 1]); ?>"><?php echo $order === 'asc' ? '▲' : '▼'; ?></a>
+                </label>
+                <span>
+                    <?php if ($page > 1): ?>
+                        <a href="<?php echo pageUrl(['page' => $page - 1]); ?>">&laquo; Previous</a>
+                    <?php endif; ?>
+                    Page <?php echo $page; ?> of <?php echo $pages; ?>
+                    <?php if ($page < $pages): ?>
+                        <a href="<?php echo pageUrl(['page' => $page + 1]); ?>">Next &raquo;</a>
+                    <?php endif; ?>
+                </span>
+            </form>
             <div class="folder-grid">
                 <?php foreach ($folders as $folder): ?>
                     <div class="folder-card">
@@ -399,6 +352,14 @@ $folders = getFolders($uploadDir);
                             <input type="text" class="folder-name" value="<?php echo htmlspecialchars($folder['name']); ?>" data-original="<?php echo htmlspecialchars($folder['name']); ?>">
                             <button class="rename-btn" onclick="renameFolder(this)">Rename</button>
                         </div>
+                        <p class="folder-stats">
+                            <?php echo htmlspecialchars(implode(' · ', $folder['stats'])); ?>
+                            <?php if ($folder['transcript'] === 'partial'): ?> · transcript in progress<?php endif; ?>
+                            <?php if ($folder['updated']): ?><br>Last upload <?php echo $folder['updated']; ?><?php endif; ?>
+                        </p>
+                        <?php if ($folder['flag']): ?>
+                            <p class="error">Check this recording: <?php echo htmlspecialchars($folder['flag']); ?></p>
+                        <?php endif; ?>
                         
                         <div class="file-section">
                             <h4>Audio Files</h4>
@@ -438,6 +399,16 @@ $folders = getFolders($uploadDir);
                             <?php endif; ?>
                         </div>
                         
+                        <?php if ($folder['hasHighlights']): ?>
+                            <div class="file-section">
+                                <h4>Highlights</h4>
+                                <button class="transcribe-btn" onclick="transcribeHighlights('<?php echo $folder['name']; ?>', this)">
+                                    Transcribe highlights
+                                </button>
+                                <div class="transcription-result" style="display: none;"></div>
+                            </div>
+                        <?php endif; ?>
+                        
                         <div class="file-section">
                             <h4>CSV Files</h4>
                             <?php if (!empty($folder['csvFiles'])): ?>
@@ -539,13 +510,30 @@ $folders = getFolders($uploadDir);
             formData.append('folderName', folderName);
             formData.append('audioFile', audioFile);
             
-            fetch(window.location.href, {
+            const post = (formData) => fetch(window.location.href, {
                 method: 'POST',
                 body: formData
-            })
-            .then(response => response.json())
+            }).then(response => response.json());
+            
+            // the job runs in transcribe_worker.php; ask how it is doing
+            // until it finishes
+            const poll = (data) => {
+                if (data.success && (data.status === 'queued' || data.status === 'running')) {
+                    loading.textContent = data.status === 'queued' ? 'Queued...' : 'Transcribing...';
+                    const status = new FormData();
+                    status.append('action', 'job_status');
+                    status.append('jobId', data.job_id);
+                    return new Promise(resolve => setTimeout(resolve, 2000))
+                        .then(() => post(status))
+                        .then(poll);
+                }
+                return data;
+            };
+            
+            post(formData)
+            .then(poll)
             .then(data => {
-                if (data.success) {
+                if (data.success && data.status === 'done') {
                     result.textContent = data.transcription;
                     result.style.display = 'block';
                     
@@ -575,6 +563,64 @@ $folders = getFolders($uploadDir);
             });
         }
         
+        // Queues every highlight of the session and lists their transcripts
+        // as the worker finishes them
+        function transcribeHighlights(folderName, button) {
+            const result = button.nextElementSibling;
+            button.disabled = true;
+            button.textContent = 'Transcribing...';
+            
+            const post = (action) => {
+                const formData = new FormData();
+                formData.append('action', action);
+                formData.append('folderName', folderName);
+                return fetch(window.location.href, {
+                    method: 'POST',
+                    body: formData
+                }).then(response => response.json());
+            };
+            
+            const clock = (seconds) => new Date(seconds * 1000).toISOString().substr(11, 8);
+            
+            const show = (data) => {
+                if (!data.success) {
+                    throw new Error(data.error || 'Unknown error');
+                }
+                result.textContent = '';
+                data.highlights.forEach(h => {
+                    const line = document.createElement('div');
+                    const text = h.status === 'done' ? h.text
+                               : h.status === 'error' ? 'failed: ' + h.error
+                               : '(' + h.status + ')';
+                    line.textContent = '#' + h.event + ' [' + clock(h.start) + '-' + clock(h.end) + '] ' + text;
+                    result.appendChild(line);
+                });
+                if (data.waiting) {
+                    const line = document.createElement('div');
+                    line.textContent = data.waiting + ' highlight(s) waiting for their audio to arrive';
+                    result.appendChild(line);
+                }
+                result.style.display = 'block';
+                if (data.highlights.some(h => h.status === 'queued' || h.status === 'running')) {
+                    return new Promise(resolve => setTimeout(resolve, 2000))
+                        .then(() => post('highlights_status'))
+                        .then(show);
+                }
+            };
+            
+            post('transcribe_highlights')
+            .then(show)
+            .catch(error => {
+                result.textContent = 'Error: ' + error.message;
+                result.style.display = 'block';
+                result.style.borderLeftColor = '#dc3545';
+            })
+            .finally(() => {
+                button.disabled = false;
+                button.textContent = 'Transcribe highlights';
+            });
+        }
+        
         function showMessage(element, message, type) {
             const messageDiv = document.createElement('div');
             messageDiv.className = type;
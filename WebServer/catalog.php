@@ -0,0 +1,197 @@
+<?php
+// Session catalog: one row per uploads/ folder with what the manager lists
+// (duration, size, chunks, highlights, transcript status, files), kept up
+// to date by upload.php as chunks arrive and by the transcription worker,
+// so a page load is one indexed query instead of a scandir of every folder.
+//
+//     php catalog.php rebuild      # (re)scan every folder, e.g. after
+//                                  # deleting or copying folders by hand
+
+require_once __DIR__ . '/db.php';
+
+define('CATALOG_DB',   __DIR__ . '/uploads/catalog.sqlite');
+define('CATALOG_ROOT', __DIR__ . '/uploads/');
+define('CATALOG_AUDIO_TYPES', ['mp3', 'wav', 'mp4', 'm4a', 'flac', 'ogg', 'opus']);
+
+// columns the manager may sort by, and the default order of each
+define('CATALOG_SORTS', [
+    'updated_at'   => 'desc',
+    'created_at'   => 'desc',
+    'folder'       => 'asc',
+    'duration_sec' => 'desc',
+    'bytes'        => 'desc',
+    'chunks'       => 'desc',
+    'highlights'   => 'desc',
+]);
+
+$catalogMigrations = [
+    "CREATE TABLE sessions (
+        folder       TEXT PRIMARY KEY,
+        device       TEXT,
+        session      TEXT,
+        created_at   INTEGER NOT NULL,
+        updated_at   INTEGER NOT NULL DEFAULT 0,     -- last upload
+        duration_sec REAL NOT NULL DEFAULT 0,        -- session time, silence included
+        bytes        INTEGER NOT NULL DEFAULT 0,     -- the stream file, or all audio without one
+        chunks       INTEGER NOT NULL DEFAULT 0,
+        highlights   INTEGER NOT NULL DEFAULT 0,
+        transcript   TEXT NOT NULL DEFAULT 'none',   -- none, partial, done
+        final        INTEGER NOT NULL DEFAULT 0,
+        flag         TEXT,
+        audio_files  TEXT NOT NULL DEFAULT '[]',     -- JSON, paths within the folder
+        csv_files    TEXT NOT NULL DEFAULT '[]'
+    )",
+    "CREATE INDEX sessions_updated ON sessions (updated_at)",
+    "CREATE INDEX sessions_created ON sessions (created_at)",
+    "CREATE INDEX sessions_duration ON sessions (duration_sec)",
+    "CREATE INDEX sessions_bytes ON sessions (bytes)",
+    "CREATE INDEX sessions_chunks ON sessions (chunks)",
+    "CREATE INDEX sessions_highlights ON sessions (highlights)",
+];
+
+// Like jobsDb(): one connection per process, closed with catalogDb(true)
+function catalogDb($close = false) {
+    global $catalogMigrations;
+    static $db = null;
+    if ($close) {
+        $db = null;
+        return null;
+    }
+    if ($db === null) {
+        $db = openSqlite(CATALOG_DB, $catalogMigrations);
+    }
+    return $db;
+}
+
+// Sets $fields on $folder's row, creating it if needed. created_at is only
+// used for a new row.
+function catalogUpdate($folder, $fields) {
+    $created = $fields['created_at'] ?? time();
+    unset($fields['created_at']);
+    $cols = array_keys($fields);
+    $sql  = 'INSERT INTO sessions (folder, created_at' . ($cols ? ', ' . implode(', ', $cols) : '') . ')
+             VALUES (?, ?' . str_repeat(', ?', count($cols)) . ')
+             ON CONFLICT (folder) DO ' . ($cols
+                ? 'UPDATE SET ' . implode(', ', array_map(fn($c) => "$c = excluded.$c", $cols))
+                : 'NOTHING');
+    catalogDb()->prepare($sql)->execute([$folder, $created, ...array_values($fields)]);
+}
+
+// Re-reads one folder: its files, and the stream's counters if it has one.
+// Cheap enough for upload.php to run when a session gains a file; $known
+// holds fields the caller knows better than the folder does.
+function catalogScan($folder, $known = []) {
+    $dir = CATALOG_ROOT . $folder . '/';
+    if (!is_dir($dir)) {
+        catalogDb()->prepare('DELETE FROM sessions WHERE folder = ?')->execute([$folder]);
+        return;
+    }
+
+    $audio = [];
+    $csv   = [];
+    $bytes = 0;
+    foreach (scandir($dir) as $file) {
+        $ext = strtolower(pathinfo($file, PATHINFO_EXTENSION));
+        if (in_array($ext, CATALOG_AUDIO_TYPES) && is_file($dir . $file)) {
+            $audio[] = $file;
+            $bytes  += filesize($dir . $file);
+        } elseif ($ext === 'csv') {
+            $csv[] = $file;
+        }
+    }
+    // highlight clips cut on the device
+    if (is_dir($dir . 'highlights')) {
+        foreach (scandir($dir . 'highlights') as $file) {
+            if (strtolower(pathinfo($file, PATHINFO_EXTENSION)) === 'wav') {
+                $audio[] = 'highlights/' . $file;
+            }
+        }
+    }
+
+    $fields = [
+        'created_at'  => filemtime($dir),
+        'updated_at'  => filemtime($dir),
+        'bytes'       => $bytes,
+        'highlights'  => max(0, count(@file($dir . 'highlights.csv', FILE_SKIP_EMPTY_LINES) ?: []) - 1),
+        'transcript'  => 'none',
+        'audio_files' => json_encode($audio),
+        'csv_files'   => json_encode($csv),
+    ];
+    foreach (['stream.wav', 'stream.opus'] as $stream) {
+        if (is_file($dir . $stream)) {
+            $fields['bytes'] = filesize($dir . $stream);
+            $fields['updated_at'] = filemtime($dir . $stream);
+        }
+    }
+    $state = json_decode(@file_get_contents($dir . 'stream.state') ?: 'null', true);
+    if ($state) {
+        $fields['duration_sec'] = ($state['frames'] ?? 0) / $state['format'][1];
+        $fields['chunks']       = $state['received'];
+        $fields['final']        = (int)$state['final'];
+        $fields['flag']         = $state['flag'] ?? null;
+    } elseif (is_file($dir . 'stream.wav')) {
+        // a legacy stream: all it has is the WAV header
+        $fmt = unpack('vchannels/Vrate/x6/vbits', file_get_contents($dir . 'stream.wav', false, null, 22, 14) ?: '');
+        if ($fmt && $fmt['rate'] && $fmt['channels'] && $fmt['bits']) {
+            $fields['duration_sec'] = max(0, $fields['bytes'] - 44) / ($fmt['rate'] * $fmt['channels'] * $fmt['bits'] / 8);
+        }
+    }
+    if (is_file($dir . 'transcript.txt')) {
+        $live = json_decode(@file_get_contents($dir . 'transcript.json') ?: 'null', true);
+        $fields['transcript'] = $live && !$live['complete'] ? 'partial' : 'done';
+    }
+    // upload.php names folders {device}_{session}; without the ids to hand,
+    // guess that the session id has no '_'
+    $cut = strrpos($folder, '_');
+    if ($cut !== false) {
+        $fields['device']  = substr($folder, 0, $cut);
+        $fields['session'] = substr($folder, $cut + 1);
+    }
+    catalogUpdate($folder, array_merge($fields, $known));
+}
+
+// Scans every folder under uploads/ and drops rows for folders that are gone
+function catalogRebuild() {
+    $folders = array_filter(scandir(CATALOG_ROOT), fn($f) => $f[0] !== '.' && is_dir(CATALOG_ROOT . $f));
+    foreach ($folders as $folder) {
+        catalogScan($folder);
+    }
+    $known = catalogDb()->query('SELECT folder FROM sessions')->fetchAll(PDO::FETCH_COLUMN);
+    foreach (array_diff($known, $folders) as $gone) {
+        catalogScan($gone);
+    }
+    return count($folders);
+}
+
+function catalogRename($old, $new) {
+    catalogDb()->prepare('UPDATE sessions SET folder = ? WHERE folder = ?')->execute([$new, $old]);
+}
+
+function catalogCount() {
+    return (int)catalogDb()->query('SELECT COUNT(*) FROM sessions')->fetchColumn();
+}
+
+// One page of sessions, sorted by a CATALOG_SORTS column ('asc'/'desc',
+// or its default order); file lists come back decoded
+function catalogPage($page, $perPage, $sort = 'updated_at', $order = null) {
+    if (!isset(CATALOG_SORTS[$sort])) {
+        $sort = 'updated_at';
+    }
+    $order = in_array($order, ['asc', 'desc']) ? $order : CATALOG_SORTS[$sort];
+    $stmt  = catalogDb()->prepare("SELECT * FROM sessions ORDER BY $sort $order, folder
+                                   LIMIT ? OFFSET ?");
+    $stmt->execute([$perPage, max(0, $page - 1) * $perPage]);
+    $rows = $stmt->fetchAll();
+    foreach ($rows as &$row) {
+        $row['audio_files'] = json_decode($row['audio_files'], true);
+        $row['csv_files']   = json_decode($row['csv_files'], true);
+    }
+    return $rows;
+}
+
+if (PHP_SAPI === 'cli' && realpath($argv[0] ?? '') === __FILE__) {
+    if (($argv[1] ?? '') !== 'rebuild') {
+        exit("usage: php catalog.php rebuild\n");
+    }
+    echo 'Catalogued ' . catalogRebuild() . " folders\n";
+}
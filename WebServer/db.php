@@ -0,0 +1,25 @@
+<?php
+// SQLite connections for the server's small databases (transcription jobs,
+// session catalog).
+
+// Opens $path, creating it if needed, and applies the $migrations not yet
+// run: schema changes in order, with PRAGMA user_version counting those
+// done. WAL lets the manager read while upload.php and the worker write.
+function openSqlite($path, $migrations) {
+    $db = new PDO('sqlite:' . $path, null, null, [
+        PDO::ATTR_ERRMODE            => PDO::ERRMODE_EXCEPTION,
+        PDO::ATTR_DEFAULT_FETCH_MODE => PDO::FETCH_ASSOC,
+        PDO::ATTR_TIMEOUT            => 10,
+    ]);
+    $db->exec('PRAGMA journal_mode = WAL');
+    $db->exec('PRAGMA synchronous = NORMAL');
+
+    $db->exec('BEGIN IMMEDIATE');
+    $version = (int)$db->query('PRAGMA user_version')->fetchColumn();
+    foreach (array_slice($migrations, $version) as $sql) {
+        $db->exec($sql);
+    }
+    $db->exec('PRAGMA user_version = ' . count($migrations));
+    $db->exec('COMMIT');
+    return $db;
+}
@@ -0,0 +1,119 @@
+"""Replay a recording session's worth of enveloped chunks against upload.php.
+
+Start the server first (setup.sh runs `php -S 0.0.0.0:8000`), then:
+
+    python3 WebServer/loadtest.py --url http://localhost:8000/upload.php
+
+By default this sends one hour of 16 kHz mono chunks, one per second of
+audio, as fast as the server accepts them, and reports throughput and
+latency. --batch N sends N envelopes back to back per request, the way the
+device coalesces a backlog. With --uploads-dir it also checks the assembled
+stream.wav and stream.timeline.
+
+--resend posts chunk 1 on its own and then every batch twice, the way the
+device retries after a lost response, and expects 200 both times: the
+server has to skip a duplicate's payload to reach the envelope after it.
+"""
+import os
+import sys
+import time
+import uuid
+import struct
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Device', 'Firmware'))
+import envelope  # noqa: E402
+from timeline import Timeline  # noqa: E402
+
+API_KEY = '@YourPassword123'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:8000/upload.php')
+    parser.add_argument('--seconds', type=int, default=3600, help='audio to replay, one chunk per second')
+    parser.add_argument('--rate', type=int, default=16000)
+    parser.add_argument('--concurrency', type=int, default=2)
+    parser.add_argument('--batch', type=int, default=1, help='chunks per request')
+    parser.add_argument('--multipart', action='store_true', help='send chunks as multipart files instead of raw bodies')
+    parser.add_argument('--resend', action='store_true', help='post every request twice, as a retry would')
+    parser.add_argument('--uploads-dir', help="server's uploads/ directory, to verify the result")
+    args = parser.parse_args()
+
+    session    = 'load' + uuid.uuid4().hex[:6]
+    chunk_size = args.rate * 2
+    pcm        = os.urandom(chunk_size)
+    local      = threading.local()
+    latencies  = []
+    failures   = []
+
+    def send(span):
+        first, last = span
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        body = b''.join(envelope.pack(
+            pcm, seq=seq,
+            byte_offset=(seq - 1) * chunk_size,
+            sample_offset=(seq - 1) * args.rate,
+            capture_us=int(time.time() * 1e6),
+            mono_us=time.monotonic_ns() // 1000,
+            frames=args.rate,
+            sample_rate=args.rate,
+            flags=envelope.FLAG_FINAL if seq == args.seconds else 0,
+        ) for seq in range(first, last))
+        for attempt in range(2 if args.resend else 1):
+            start = time.perf_counter()
+            if args.multipart:
+                resp = local.session.post(args.url, files={'audio_chunk': ('chunk.raw', body)}, data={
+                    'api_key': API_KEY, 'device_id': 'loadtest', 'session_id': session})
+            else:
+                resp = local.session.post(args.url, data=body, headers={
+                    'Content-Type': 'application/octet-stream',
+                    'X-Api-Key': API_KEY, 'X-Device-Id': 'loadtest', 'X-Session-Id': session})
+            latencies.append(time.perf_counter() - start)
+            if resp.status_code != 200:
+                failures.append((first, attempt, resp.status_code, resp.text.strip()))
+
+    print(f"Replaying {args.seconds} chunks of {chunk_size:,} bytes to {args.url} "
+          f"({'multipart' if args.multipart else 'raw body'}, {args.batch} per request, "
+          f"{args.concurrency} at a time{', each sent twice' if args.resend else ''})")
+    # with --resend, chunk 1 goes alone so a single chunk is retried too
+    first = 2 if args.resend else 1
+    spans = [(1, 2)] if args.resend else []
+    spans += [(seq, min(seq + args.batch, args.seconds + 1))
+              for seq in range(first, args.seconds + 1, args.batch)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(send, spans))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    n = len(latencies)
+    print(f"{n} requests, {args.seconds} chunks in {elapsed:.1f} s: {args.seconds / elapsed:.0f} chunks/s, "
+          f"{args.seconds * chunk_size / elapsed / 1e6:.1f} MB/s")
+    print(f"latency p50 {latencies[n // 2] * 1000:.1f} ms  "
+          f"p99 {latencies[int(n * 0.99)] * 1000:.1f} ms  max {latencies[-1] * 1000:.1f} ms")
+    print(f"failures: {len(failures)}")
+    for failure in failures[:10]:
+        print('  ', failure)
+
+    if args.uploads_dir:
+        path = os.path.join(args.uploads_dir, f"loadtest_{session}", 'stream.wav')
+        with open(path, 'rb') as f:
+            header = f.read(44)
+        size     = os.path.getsize(path)
+        expected = 44 + args.seconds * chunk_size
+        data_len = struct.unpack_from('<I', header, 40)[0]
+        print(f"{path}: {size:,} bytes (expected {expected:,}), header data size {data_len:,}")
+        tl = Timeline.load(os.path.join(os.path.dirname(path), 'stream.timeline'))
+        print(f"stream.timeline: {len(tl)} chunks, gaps: {tl.gaps() or 'none'}")
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+<?php
+// Session timeline (stream.timeline), the server side of
+// Device/Firmware/timeline.py: one 48-byte record per chunk at
+// (seq - 1) * TIMELINE_RECORD, all zeros for a chunk not received yet.
+//
+// seq, frames, sample offset, byte offset, capture mono µs, capture wall µs,
+// rms and peak (dBFS x 100), clipped samples
+
+define('TIMELINE_RECORD', 48);
+define('TIMELINE_FORMAT', 'Vseq/Vframes/Psample_offset/Pbyte_offset/Pmono_us/Pwall_us/vrms/vpeak/Vclipped');
+
+// pack()/unpack() have no little-endian signed 16-bit code
+function signed16($v) {
+    return $v >= 0x8000 ? $v - 0x10000 : $v;
+}
+
+function timelineRecord($seq, $env) {
+    return pack('VVPPPPvvV', $seq, $env['frames'], $env['sample_offset'],
+                $env['byte_offset'], $env['mono_us'], $env['capture_us'],
+                (int) round(($env['rms'] ?? 0) * 100) & 0xFFFF,
+                (int) round(($env['peak'] ?? 0) * 100) & 0xFFFF,
+                $env['clipped']);
+}
+
+// The records received so far, in seq order
+function readTimeline($path) {
+    $data    = @file_get_contents($path) ?: '';
+    $entries = [];
+    for ($i = 0; $i + TIMELINE_RECORD <= strlen($data); $i += TIMELINE_RECORD) {
+        $e = unpack(TIMELINE_FORMAT, $data, $i);
+        if ($e['seq']) {
+            $e['rms']  = signed16($e['rms']) / 100;
+            $e['peak'] = signed16($e['peak']) / 100;
+            $entries[] = $e;
+        }
+    }
+    return $entries;
+}
+
+// Where each chunk of audio sits in the stream file and in the session:
+// [stream frame, session frame, frames] per chunk, in order. The two differ
+// by the silence the device kept out of the stream: a chunk with frames but
+// no bytes. A chunk's length is where the next one starts, or $dataEnd (the
+// stream's data size) for the last one, as in timeline.py's silences().
+// Stops at the first chunk whose length is not known yet, the one before a
+// missing chunk, since nothing from there on can be placed in the stream.
+function audioSpans($entries, $dataEnd) {
+    $spans    = [];
+    $streamed = 0;
+    foreach ($entries as $k => $e) {
+        if ($e['seq'] !== $k + 1) {
+            break;
+        }
+        $next = $entries[$k + 1] ?? null;
+        if ($next) {
+            if ($next['seq'] !== $e['seq'] + 1) {
+                break;
+            }
+            $length = $next['byte_offset'] - $e['byte_offset'];
+        } else {
+            $length = $dataEnd - $e['byte_offset'];
+        }
+        if ($e['frames'] && $length > 0) {
+            $spans[]   = [$streamed, $e['sample_offset'], $e['frames']];
+            $streamed += $e['frames'];
+        }
+    }
+    return $spans;
+}
+
+// Index of the last span whose column $col is <= $frame (0 if none)
+function findSpan($spans, $col, $frame) {
+    $lo = 0;
+    $hi = count($spans) - 1;
+    while ($lo < $hi) {
+        $mid = intdiv($lo + $hi + 1, 2);
+        if ($spans[$mid][$col] <= $frame) {
+            $lo = $mid;
+        } else {
+            $hi = $mid - 1;
+        }
+    }
+    return $lo;
+}
+
+// Maps a position in the stream file (seconds of the audio it holds) to
+// seconds since the session started; $dataEnd as for audioSpans()
+function sessionClock($entries, $rate, $dataEnd) {
+    $spans = audioSpans($entries, $dataEnd);
+    return function ($seconds) use ($spans, $rate) {
+        if (!$spans) {
+            return $seconds;
+        }
+        [$stream, $session] = $spans[findSpan($spans, 0, $seconds * $rate)];
+        return ($session + $seconds * $rate - $stream) / $rate;
+    };
+}
+
+// The reverse: seconds since the session started to a position in the
+// stream file. A time inside skipped silence maps to where the stream
+// resumes; one past the end to the end of the stream.
+function streamClock($entries, $rate, $dataEnd) {
+    $spans = audioSpans($entries, $dataEnd);
+    return function ($seconds) use ($spans, $rate) {
+        if (!$spans) {
+            return 0;
+        }
+        $frame = $seconds * $rate;
+        [$stream, $session, $frames] = $spans[findSpan($spans, 1, $frame)];
+        return ($stream + max(0, min($frames, $frame - $session))) / $rate;
+    };
+}
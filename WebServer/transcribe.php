@@ -0,0 +1,714 @@
+<?php
+// Transcription jobs, shared by audio_manager.php (which queues them and
+// reports their status) and transcribe_worker.php (which runs them).
+//
+// Jobs live in a SQLite table so they survive restarts; results are cached
+// by the audio's SHA-1, so a file that was already transcribed is never
+// submitted again, even after its folder is renamed.
+//
+// A job is a whole file (kind 'file', from the manager) or a window of a
+// session's stream, cut out by seeking so the stream is never read in full:
+// kind 'live' windows are queued by upload.php as audio arrives, kind
+// 'highlight' ones by the manager for the highlights a session marked.
+
+require_once __DIR__ . '/db.php';
+require_once __DIR__ . '/timeline.php';
+require_once __DIR__ . '/catalog.php';
+
+define('TRANSCRIBE_DB',  __DIR__ . '/uploads/transcribe.sqlite');
+define('UPLOAD_ROOT',    __DIR__ . '/uploads/');
+
+// AssemblyAI by default; point TRANSCRIBE_API at transcribe_standin.py to
+// work offline
+define('TRANSCRIBE_API', rtrim(getenv('TRANSCRIBE_API') ?: 'https://api.assemblyai.com/v2', '/'));
+define('TRANSCRIBE_KEY', getenv('TRANSCRIBE_KEY') ?: '8b58645e0193407f87c396346e54c919');
+
+define('JOB_POLL_SEC',    3);       // between status checks of a submitted job
+define('JOB_TIMEOUT_SEC', 3 * 3600);
+define('JOB_STALE_SEC',   60);      // a running job not heard from for this long is requeued
+define('JOB_MAX_ATTEMPTS', 3);
+
+// Audio is sent straight from disk, never read into memory. With ffmpeg
+// installed it is first down-converted to 16 kHz mono Opus, which costs the
+// recognizer nothing and is ~100x smaller than the device's 88.2 kHz PCM;
+// TRANSCRIBE_DOWNCONVERT=0 sends the original file.
+define('TRANSCRIBE_DOWNCONVERT', getenv('TRANSCRIBE_DOWNCONVERT') !== '0');
+define('DOWNCONVERT_ARGS', ['-ac', '1', '-ar', '16000', '-c:a', 'libopus', '-b:a', '24k', '-f', 'ogg']);
+define('READ_BLOCK', 1 << 20);
+
+// ————————————————————————————————————————————————————————————————
+// JOB TABLE
+// ————————————————————————————————————————————————————————————————
+
+// Schema changes, applied in order by openSqlite()
+$transcribeMigrations = [
+    "CREATE TABLE jobs (
+        id          INTEGER PRIMARY KEY,
+        folder      TEXT NOT NULL,
+        file        TEXT NOT NULL,
+        file_key    TEXT NOT NULL,          -- size:mtime, to spot a changed file
+        status      TEXT NOT NULL,          -- queued, running, done, error
+        sha1        TEXT,
+        remote_id   TEXT,                   -- backend transcript id once submitted
+        attempts    INTEGER NOT NULL DEFAULT 0,
+        error       TEXT,
+        worker      INTEGER,
+        created_at  INTEGER NOT NULL,
+        updated_at  INTEGER NOT NULL
+    )",
+    "CREATE INDEX jobs_status ON jobs (status, id)",
+    "CREATE INDEX jobs_file ON jobs (folder, file)",
+    "CREATE TABLE results (
+        sha1        TEXT PRIMARY KEY,
+        text        TEXT NOT NULL,
+        created_at  INTEGER NOT NULL
+    )",
+    "ALTER TABLE jobs ADD COLUMN kind TEXT NOT NULL DEFAULT 'file'",
+    "ALTER TABLE jobs ADD COLUMN ref TEXT",              -- live window number or highlight id
+    "ALTER TABLE jobs ADD COLUMN start_sec REAL",        -- window position in the stream
+    "ALTER TABLE jobs ADD COLUMN duration_sec REAL",
+    "CREATE UNIQUE INDEX jobs_window ON jobs (folder, kind, ref) WHERE ref IS NOT NULL",
+    "ALTER TABLE results ADD COLUMN words TEXT",         -- JSON, times in ms from the start of the audio
+];
+
+// The process's connection, opened on first use. jobsDb(true) closes it,
+// which the worker does before forking: SQLite handles must not be shared
+// across processes.
+function jobsDb($close = false) {
+    global $transcribeMigrations;
+    static $db = null;
+    if ($close) {
+        $db = null;
+        return null;
+    }
+    if ($db === null) {
+        $db = openSqlite(TRANSCRIBE_DB, $transcribeMigrations);
+    }
+    return $db;
+}
+
+function fileKey($path) {
+    clearstatcache(true, $path);
+    return filesize($path) . ':' . filemtime($path);
+}
+
+// Queues $file in $folder unless the same unchanged file is already queued,
+// running or done. Returns the job row.
+function enqueueJob($folder, $file) {
+    $db  = jobsDb();
+    $key = fileKey(UPLOAD_ROOT . $folder . '/' . $file);
+
+    $db->exec('BEGIN IMMEDIATE');
+    $find = $db->prepare("SELECT * FROM jobs WHERE kind = 'file' AND folder = ? AND file = ?
+                          AND file_key = ? AND status != 'error' ORDER BY id DESC LIMIT 1");
+    $find->execute([$folder, $file, $key]);
+    $job = $find->fetch();
+    if (!$job) {
+        $now = time();
+        $db->prepare("INSERT INTO jobs (folder, file, file_key, status, created_at, updated_at)
+                      VALUES (?, ?, ?, 'queued', ?, ?)")
+           ->execute([$folder, $file, $key, $now, $now]);
+        $job = getJob($db->lastInsertId());
+    }
+    $db->exec('COMMIT');
+    return $job;
+}
+
+// Queues a window of $file: $durationSec of audio from $startSec. Each
+// ($folder, $kind, $ref) is queued once.
+function enqueueWindow($folder, $file, $kind, $ref, $startSec, $durationSec) {
+    $now = time();
+    jobsDb()->prepare("INSERT OR IGNORE INTO jobs (folder, file, file_key, status, kind, ref,
+                       start_sec, duration_sec, created_at, updated_at)
+                       VALUES (?, ?, '', 'queued', ?, ?, ?, ?, ?, ?)")
+            ->execute([$folder, $file, $kind, (string)$ref, $startSec, $durationSec, $now, $now]);
+}
+
+// Queues every highlight in the session's highlights.csv whose audio the
+// stream already holds. Returns the number still waiting for their audio,
+// or null if the session has no stream. A legacy stream, without
+// stream.state or stream.timeline, has nothing to place highlights with,
+// so none are queued and highlightIndex() reports them unavailable.
+function enqueueHighlights($folder) {
+    $dir    = UPLOAD_ROOT . $folder . '/';
+    $stream = streamFile($dir);
+    if ($stream === null) {
+        return null;
+    }
+    $state    = readStreamState($dir, $entries);
+    if (!hasTimeline($dir, $state)) {
+        return 0;
+    }
+    $rate     = $state['format'][1];
+    $toStream = streamClock($entries, $rate, $state['data_end']);
+
+    // session frames accounted for, audio and silence, up to the first gap
+    $covered = 0;
+    foreach ($entries as $k => $e) {
+        if ($e['seq'] !== $k + 1) {
+            break;
+        }
+        $covered = $e['sample_offset'] + $e['frames'];
+    }
+
+    $waiting = 0;
+    foreach (readHighlights($dir) as $h) {
+        if ($h['end_sample'] > $covered) {
+            $waiting++;     // its post-roll has not arrived yet
+            continue;
+        }
+        $start = $toStream($h['start_sample'] / $rate);
+        $end   = $toStream($h['end_sample'] / $rate);
+        if ($end > $start) {     // not all silence
+            enqueueWindow($folder, $stream, 'highlight', $h['id'], $start, $end - $start);
+        }
+    }
+    return $waiting;
+}
+
+// Whether a session's highlights can be placed in its stream: they are
+// marked in session samples, which only the timeline maps to the stream
+function hasTimeline($dir, $state) {
+    return $state && is_file($dir . 'stream.timeline');
+}
+
+function streamFile($dir) {
+    foreach (['stream.wav', 'stream.opus'] as $name) {
+        if (is_file($dir . $name)) {
+            return $name;
+        }
+    }
+    return null;
+}
+
+// The session's stream.state; with $entries, also its timeline, read under
+// the same lock so the two agree on which chunks are in
+function readStreamState($dir, &$entries = null) {
+    $fp = @fopen($dir . 'stream.state', 'r');
+    if (!$fp) {
+        $entries = [];
+        return null;
+    }
+    flock($fp, LOCK_SH);
+    $state = json_decode(stream_get_contents($fp), true);
+    if (func_num_args() > 1) {
+        $entries = readTimeline($dir . 'stream.timeline');
+    }
+    flock($fp, LOCK_UN);
+    fclose($fp);
+    return $state;
+}
+
+// Rows of highlights.csv as written by upload.php, keyed by id (none for
+// the id-less files older clients uploaded)
+function readHighlights($dir) {
+    $rows = [];
+    $fp   = @fopen($dir . 'highlights.csv', 'r');
+    if (!$fp) {
+        return $rows;
+    }
+    $header = fgetcsv($fp);
+    while ($header && $header[0] === 'id' && ($row = fgetcsv($fp)) !== false) {
+        if (count($row) === count($header)) {
+            $row = array_combine($header, $row);
+            $rows[$row['id']] = $row;
+        }
+    }
+    fclose($fp);
+    return $rows;
+}
+
+// The job row plus its transcript once done, or null
+function getJob($id) {
+    $stmt = jobsDb()->prepare('SELECT jobs.*, results.text, results.words FROM jobs
+                               LEFT JOIN results USING (sha1) WHERE id = ?');
+    $stmt->execute([$id]);
+    return $stmt->fetch() ?: null;
+}
+
+// Atomically takes the oldest queued job, or a running one whose worker has
+// gone quiet. Returns the job row or null.
+function claimJob() {
+    $db  = jobsDb();
+    $now = time();
+    $db->exec('BEGIN IMMEDIATE');
+    $stmt = $db->prepare("SELECT id FROM jobs
+                          WHERE status = 'queued' OR (status = 'running' AND updated_at < ?)
+                          ORDER BY id LIMIT 1");
+    $stmt->execute([$now - JOB_STALE_SEC]);
+    $id = $stmt->fetchColumn();
+    if ($id !== false) {
+        $db->prepare("UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1,
+                      updated_at = ? WHERE id = ?")
+           ->execute([getmypid(), $now, $id]);
+    }
+    $db->exec('COMMIT');
+    return $id === false ? null : getJob($id);
+}
+
+// A callable for long steps (hashing, converting, uploading) to call as
+// they go, so the job does not look stale; it touches the job at most
+// every JOB_POLL_SEC
+function heartbeat($id) {
+    $last = time();
+    return function () use ($id, &$last) {
+        if (time() - $last >= JOB_POLL_SEC) {
+            touchJob($id);
+            $last = time();
+        }
+    };
+}
+
+// Records progress on a running job; also keeps it from looking stale
+function touchJob($id, $fields = []) {
+    $fields['updated_at'] = time();
+    $set = implode(', ', array_map(fn($k) => "$k = ?", array_keys($fields)));
+    jobsDb()->prepare("UPDATE jobs SET $set WHERE id = ?")
+            ->execute([...array_values($fields), $id]);
+}
+
+// ['text' => ..., 'words' => [...]] for audio transcribed before, or null
+function cachedResult($sha1) {
+    $stmt = jobsDb()->prepare('SELECT text, words FROM results WHERE sha1 = ?');
+    $stmt->execute([$sha1]);
+    $result = $stmt->fetch();
+    if (!$result) {
+        return null;
+    }
+    $result['words'] = json_decode($result['words'] ?? '[]', true);
+    return $result;
+}
+
+function finishJob($job, $result) {
+    jobsDb()->prepare('INSERT OR IGNORE INTO results (sha1, text, words, created_at) VALUES (?, ?, ?, ?)')
+            ->execute([$job['sha1'], $result['text'], json_encode($result['words']), time()]);
+    touchJob($job['id'], ['status' => 'done', 'error' => null]);
+}
+
+// Requeues the job for another attempt, or fails it for good
+function failJob($job, $error) {
+    $retry = $job['attempts'] < JOB_MAX_ATTEMPTS;
+    touchJob($job['id'], ['status' => $retry ? 'queued' : 'error', 'error' => $error,
+                          'remote_id' => null]);
+}
+
+// ————————————————————————————————————————————————————————————————
+// RUNNING A JOB
+// ————————————————————————————————————————————————————————————————
+
+// Transcribes one claimed job: from the cache if the audio was done before,
+// otherwise by uploading, submitting and polling the backend. A job that
+// was already submitted (its worker died) resumes polling.
+function runJob($job) {
+    $path = UPLOAD_ROOT . $job['folder'] . '/' . $job['file'];
+    if (!is_file($path)) {
+        failJob(['attempts' => JOB_MAX_ATTEMPTS] + $job, 'Audio file not found');
+        return;
+    }
+    $beat   = heartbeat($job['id']);
+    $window = null;
+    try {
+        if ($job['kind'] !== 'file') {
+            $window = extractWindow($path, $job['start_sec'], $job['duration_sec']);
+            $path   = $window;
+        }
+        if ($job['sha1'] === null) {
+            $job['sha1'] = fileSha1($path, $beat);
+            touchJob($job['id'], ['sha1' => $job['sha1']]);
+        }
+        $result = cachedResult($job['sha1']) ?? transcribeRemote($job, $path, $beat);
+    } catch (RuntimeException $e) {
+        failJob($job, $e->getMessage());
+        updateWindowIndex($job);
+        return;
+    } finally {
+        if ($window !== null) {
+            unlink($window);
+        }
+    }
+
+    if ($job['kind'] === 'file') {
+        saveTranscription($job['folder'], $job['file'], $result['text']);
+    }
+    finishJob($job, $result);
+    updateWindowIndex($job);
+}
+
+// Copies $durationSec of audio from $startSec out of $path into a temporary
+// file and returns its path. A WAV stream is cut by seeking straight to the
+// window's bytes; anything else (the Opus stream) needs ffmpeg, which seeks
+// by granule position.
+function extractWindow($path, $startSec, $durationSec) {
+    $out = tempnam(sys_get_temp_dir(), 'scribe');
+    $in  = fopen($path, 'rb');
+    $head = fread($in, 44);
+    if (substr($head, 0, 4) === 'RIFF' && substr($head, 36, 4) === 'data') {
+        // the 44-byte header upload.php writes: keep the format, patch the sizes
+        $fmt   = unpack('vchannels/Vrate/Vbyte_rate/vblock_align', $head, 22);
+        $start = (int)round($startSec * $fmt['rate']) * $fmt['block_align'];
+        $left  = (int)round($durationSec * $fmt['rate']) * $fmt['block_align'];
+        $fp    = fopen($out, 'wb');
+        fwrite($fp, substr_replace(substr_replace($head, pack('V', $left + 36), 4, 4),
+                                   pack('V', $left), 40, 4));
+        fseek($in, 44 + $start);
+        $copied = stream_copy_to_stream($in, $fp, $left);
+        fclose($fp);
+        fclose($in);
+        if ($copied !== $left) {
+            unlink($out);
+            throw new RuntimeException("Window at {$startSec}s is not in the stream yet");
+        }
+        return $out;
+    }
+    fclose($in);
+
+    $ffmpeg = trim((string)shell_exec('command -v ffmpeg'));
+    if ($ffmpeg === '') {
+        unlink($out);
+        throw new RuntimeException('ffmpeg is needed to cut windows out of ' . basename($path));
+    }
+    $cmd  = array_merge([$ffmpeg, '-nostdin', '-v', 'error', '-y',
+                         '-ss', (string)$startSec, '-t', (string)$durationSec, '-i', $path],
+                        DOWNCONVERT_ARGS, [$out]);
+    $proc = proc_open($cmd, [1 => ['file', '/dev/null', 'w'], 2 => ['pipe', 'w']], $pipes);
+    $err  = stream_get_contents($pipes[2]);
+    fclose($pipes[2]);
+    if (proc_close($proc) !== 0 || !filesize($out)) {
+        unlink($out);
+        throw new RuntimeException("ffmpeg could not cut the window at {$startSec}s: {$err}");
+    }
+    return $out;
+}
+
+// Rebuilds a live session's transcript.txt and transcript.json from the
+// windows done so far. Every finished window calls this, under a lock, so
+// the files always hold one consistent, ordered set of windows; times are
+// seconds since the session started.
+function stitchLiveTranscript($folder) {
+    $dir  = UPLOAD_ROOT . $folder . '/';
+    $lock = fopen($dir . 'transcript.lock', 'c');
+    flock($lock, LOCK_EX);
+
+    $state = readStreamState($dir, $entries);
+    $clock = sessionClock($entries, $state['format'][1], $state['data_end']);
+
+    $segments = [];
+    $lines    = [];
+    $pending  = 0;
+    $failed   = 0;
+    foreach (windowJobs($folder, 'live') as $w) {
+        if ($w['status'] === 'error') {
+            // out of attempts: leave a marker rather than hold up the rest
+            $failed++;
+            $lines[] = '[' . gmdate('H:i:s', (int)$clock($w['start_sec'])) . '] (not transcribed: ' . $w['error'] . ')';
+            continue;
+        }
+        if ($w['status'] !== 'done') {
+            $pending++;
+            continue;
+        }
+        $start = $clock($w['start_sec']);
+        $segments[] = [
+            'window' => (int)$w['ref'],
+            'start'  => round($start, 3),
+            'end'    => round($clock($w['start_sec'] + $w['duration_sec']), 3),
+            'text'   => $w['text'],
+            'words'  => windowWords($w, $clock),
+        ];
+        $lines[] = '[' . gmdate('H:i:s', (int)$start) . '] ' . $w['text'];
+    }
+    $complete = !empty($state['live']['done']) && !$pending;
+
+    $content  = "Live transcription of: " . $folder . "\n";
+    $content .= "Generated on: " . date('Y-m-d H:i:s') . ($complete ? '' : ' (in progress)') . "\n";
+    $content .= "=" . str_repeat("=", 50) . "\n\n";
+    $content .= implode("\n", $lines) . "\n";
+    $json = json_encode(['session' => $folder, 'complete' => $complete, 'pending' => $pending,
+                         'failed' => $failed, 'segments' => $segments],
+                        JSON_PRETTY_PRINT | JSON_UNESCAPED_UNICODE);
+
+    // replaced whole, so a reader never sees half a file
+    file_put_contents($dir . 'transcript.txt.tmp', $content);
+    rename($dir . 'transcript.txt.tmp', $dir . 'transcript.txt');
+    file_put_contents($dir . 'transcript.json.tmp', $json);
+    rename($dir . 'transcript.json.tmp', $dir . 'transcript.json');
+    catalogUpdate($folder, ['transcript' => $complete ? 'done' : 'partial']);
+
+    flock($lock, LOCK_UN);
+    fclose($lock);
+}
+
+// A session's window jobs of one kind with their results, in stream order
+function windowJobs($folder, $kind) {
+    $stmt = jobsDb()->prepare("SELECT jobs.*, results.text, results.words FROM jobs
+                               LEFT JOIN results USING (sha1)
+                               WHERE folder = ? AND kind = ? ORDER BY start_sec");
+    $stmt->execute([$folder, $kind]);
+    return $stmt->fetchAll();
+}
+
+// A window's words with times in seconds since the session started
+function windowWords($w, $clock) {
+    $words = [];
+    foreach (json_decode($w['words'] ?? '[]', true) as $word) {
+        $words[] = [
+            'text'  => $word['text'],
+            'start' => round($clock($w['start_sec'] + $word['start'] / 1000), 3),
+            'end'   => round($clock($w['start_sec'] + $word['end'] / 1000), 3),
+        ];
+    }
+    return $words;
+}
+
+// Per-highlight transcript index: one entry per highlight in highlights.csv,
+// in press order, with its job status and transcript once done. Without
+// stream.state or stream.timeline (a legacy session) every highlight is
+// 'unavailable'.
+function highlightIndex($folder) {
+    $dir   = UPLOAD_ROOT . $folder . '/';
+    $state = readStreamState($dir, $entries);
+    $jobs  = array_column(windowJobs($folder, 'highlight'), null, 'ref');
+    $clock = hasTimeline($dir, $state)
+           ? sessionClock($entries, $state['format'][1], $state['data_end']) : null;
+
+    $index = [];
+    foreach (readHighlights($dir) as $id => $h) {
+        $job  = $clock ? ($jobs[$id] ?? null) : ['status' => 'unavailable',
+                                                 'error'  => 'session has no stream timeline'];
+        $rate = (int)$h['sample_rate'] ?: ($state['format'][1] ?? 1);
+        $index[] = [
+            'id'         => $id,
+            'event'      => (int)$h['event'],
+            'press_time' => $h['press_time'],
+            'press'      => round($h['press_sample'] / $rate, 3),
+            'start'      => round($h['start_sample'] / $rate, 3),
+            'end'        => round($h['end_sample'] / $rate, 3),
+            'status'     => $job['status'] ?? 'not queued',
+            'text'       => $job['text'] ?? null,
+            'error'      => $job['error'] ?? null,
+            'words'      => $job && $job['status'] === 'done' ? windowWords($job, $clock) : [],
+        ];
+    }
+    return $index;
+}
+
+// Writes highlightIndex() to highlights.json; run after each highlight job,
+// under a lock like stitchLiveTranscript()
+function writeHighlightIndex($folder) {
+    $dir  = UPLOAD_ROOT . $folder . '/';
+    $lock = fopen($dir . 'highlights.lock', 'c');
+    flock($lock, LOCK_EX);
+    $json = json_encode(['session' => $folder, 'highlights' => highlightIndex($folder)],
+                        JSON_PRETTY_PRINT | JSON_UNESCAPED_UNICODE);
+    file_put_contents($dir . 'highlights.json.tmp', $json);
+    rename($dir . 'highlights.json.tmp', $dir . 'highlights.json');
+    flock($lock, LOCK_UN);
+    fclose($lock);
+}
+
+// Refreshes whatever is built from a session's windows once one finishes
+function updateWindowIndex($job) {
+    if ($job['kind'] === 'live') {
+        stitchLiveTranscript($job['folder']);
+    } elseif ($job['kind'] === 'highlight') {
+        writeHighlightIndex($job['folder']);
+    }
+}
+
+function fileSha1($path, $beat) {
+    $hash = hash_init('sha1');
+    $fp   = fopen($path, 'rb');
+    while (!feof($fp)) {
+        hash_update($hash, fread($fp, READ_BLOCK));
+        $beat();
+    }
+    fclose($fp);
+    return hash_final($hash);
+}
+
+function transcribeRemote($job, $path, $beat) {
+    $remoteId = $job['remote_id'];
+    if ($remoteId === null) {
+        $uploadUrl = uploadAudioFile($path, $beat);
+        if (!$uploadUrl) {
+            throw new RuntimeException('Failed to upload audio file');
+        }
+        $remoteId = submitTranscription($uploadUrl);
+        if (!$remoteId) {
+            throw new RuntimeException('Failed to submit for transcription');
+        }
+        touchJob($job['id'], ['remote_id' => $remoteId]);
+    }
+
+    $deadline = time() + JOB_TIMEOUT_SEC;
+    while (time() < $deadline) {
+        $result = getTranscriptionResult($remoteId);
+        if ($result['status'] === 'completed') {
+            return ['text' => $result['text'], 'words' => $result['words']];
+        }
+        if ($result['status'] === 'error') {
+            throw new RuntimeException('Transcription error: ' . $result['error']);
+        }
+        touchJob($job['id']);
+        sleep(JOB_POLL_SEC);
+    }
+    throw new RuntimeException('Transcription timed out');
+}
+
+// ————————————————————————————————————————————————————————————————
+// BACKEND (AssemblyAI API)
+// ————————————————————————————————————————————————————————————————
+
+// Converts $audioPath into a temporary file with DOWNCONVERT_ARGS. Returns
+// its path, or null to send the original (disabled, no ffmpeg, or it failed).
+function downconvert($audioPath, $beat) {
+    static $ffmpeg = null;
+    $ffmpeg ??= trim((string)shell_exec('command -v ffmpeg'));
+    if (!TRANSCRIBE_DOWNCONVERT || $ffmpeg === '') {
+        return null;
+    }
+
+    $out  = tempnam(sys_get_temp_dir(), 'scribe');
+    $cmd  = array_merge([$ffmpeg, '-nostdin', '-v', 'error', '-y', '-i', $audioPath],
+                        DOWNCONVERT_ARGS, [$out]);
+    $proc = proc_open($cmd, [1 => ['file', '/dev/null', 'w'], 2 => ['pipe', 'w']], $pipes);
+    $err  = '';
+    while (!feof($pipes[2])) {
+        $read = [$pipes[2]];
+        $none = null;
+        if (stream_select($read, $none, $none, JOB_POLL_SEC)) {
+            $err .= fread($pipes[2], 8192);
+        }
+        $beat();
+    }
+    fclose($pipes[2]);
+    if (proc_close($proc) !== 0 || !filesize($out)) {
+        error_log("transcribe: ffmpeg failed on {$audioPath}: {$err}");
+        unlink($out);
+        return null;
+    }
+    return $out;
+}
+
+// Streams the file to the backend; curl reads it from disk as it sends, so
+// memory stays flat however long the session is
+function uploadAudioFile($audioPath, $beat) {
+    $converted = downconvert($audioPath, $beat);
+    $sendPath  = $converted ?? $audioPath;
+    $fp = fopen($sendPath, 'rb');
+
+    $curl = curl_init();
+
+    curl_setopt_array($curl, [
+        CURLOPT_URL => TRANSCRIBE_API . "/upload",
+        CURLOPT_RETURNTRANSFER => true,
+        CURLOPT_UPLOAD => true,
+        CURLOPT_CUSTOMREQUEST => 'POST',
+        CURLOPT_HTTPHEADER => [
+            "Authorization: " . TRANSCRIBE_KEY,
+            "Content-Type: application/octet-stream",
+            "Expect:"
+        ],
+        CURLOPT_INFILE => $fp,
+        CURLOPT_INFILESIZE => filesize($sendPath),
+        CURLOPT_NOPROGRESS => false,
+        CURLOPT_PROGRESSFUNCTION => function () use ($beat) {
+            $beat();
+            return 0;
+        }
+    ]);
+
+    $response = curl_exec($curl);
+    $httpCode = curl_getinfo($curl, CURLINFO_HTTP_CODE);
+    curl_close($curl);
+    fclose($fp);
+    if ($converted !== null) {
+        unlink($converted);
+    }
+
+    if ($httpCode === 200) {
+        $data = json_decode($response, true);
+        return $data['upload_url'] ?? null;
+    }
+
+    return null;
+}
+
+function submitTranscription($audioUrl) {
+    $curl = curl_init();
+
+    curl_setopt_array($curl, [
+        CURLOPT_URL => TRANSCRIBE_API . "/transcript",
+        CURLOPT_RETURNTRANSFER => true,
+        CURLOPT_POST => true,
+        CURLOPT_HTTPHEADER => [
+            "Authorization: " . TRANSCRIBE_KEY,
+            "Content-Type: application/json"
+        ],
+        CURLOPT_POSTFIELDS => json_encode([
+            'audio_url' => $audioUrl
+        ])
+    ]);
+
+    $response = curl_exec($curl);
+    $httpCode = curl_getinfo($curl, CURLINFO_HTTP_CODE);
+    curl_close($curl);
+
+    if ($httpCode === 200) {
+        $data = json_decode($response, true);
+        return $data['id'] ?? null;
+    }
+
+    return null;
+}
+
+function getTranscriptionResult($transcriptId) {
+    $curl = curl_init();
+
+    curl_setopt_array($curl, [
+        CURLOPT_URL => TRANSCRIBE_API . "/transcript/" . $transcriptId,
+        CURLOPT_RETURNTRANSFER => true,
+        CURLOPT_HTTPHEADER => [
+            "Authorization: " . TRANSCRIBE_KEY
+        ]
+    ]);
+
+    $response = curl_exec($curl);
+    $httpCode = curl_getinfo($curl, CURLINFO_HTTP_CODE);
+    curl_close($curl);
+
+    if ($httpCode === 200) {
+        $data = json_decode($response, true);
+        return [
+            'status' => $data['status'],
+            'text' => $data['text'] ?? '',
+            'words' => array_map(fn($w) => ['text' => $w['text'], 'start' => $w['start'], 'end' => $w['end']],
+                                 $data['words'] ?? []),
+            'error' => $data['error'] ?? ''
+        ];
+    }
+
+    // a failed poll is retried; only the backend can fail the transcript
+    return ['status' => 'unknown', 'error' => 'API request failed'];
+}
+
+// Function to save transcription to file
+function saveTranscription($folderName, $audioFile, $transcription) {
+    // Simple filename - just "transcript.txt"
+    $transcriptFile = 'transcript.txt';
+    $transcriptPath = UPLOAD_ROOT . $folderName . '/' . $transcriptFile;
+
+    // Create content with metadata
+    $content = "Transcription of: " . $audioFile . "\n";
+    $content .= "Generated on: " . date('Y-m-d H:i:s') . "\n";
+    $content .= "=" . str_repeat("=", 50) . "\n\n";
+    $content .= $transcription;
+
+    // Save to file
+    if (file_put_contents($transcriptPath, $content) !== false) {
+        catalogUpdate($folderName, ['transcript' => 'done']);
+        return $transcriptFile;
+    }
+
+    return false;
+}
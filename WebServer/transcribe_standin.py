@@ -0,0 +1,154 @@
+"""Local stand-in for the AssemblyAI endpoints transcribe.php uses.
+
+Accepts uploads, queues transcripts and completes them after --delay
+seconds with a placeholder text describing the audio, so the job queue and
+worker can be exercised offline:
+
+    python3 WebServer/transcribe_standin.py --port 8100 &
+    TRANSCRIBE_API=http://localhost:8100/v2 php WebServer/transcribe_worker.php
+
+Endpoints: POST /v2/upload, POST /v2/transcript, GET /v2/transcript/<id>.
+"""
+import io
+import sys
+import json
+import time
+import uuid
+import wave
+import hashlib
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+BLOCK = 65536
+
+
+def describe(path):
+    """Placeholder transcript: what the audio is, and one word per second."""
+    size = path.stat().st_size
+    try:
+        with wave.open(str(path), 'rb') as wf:
+            rate    = wf.getframerate()
+            seconds = wf.getnframes() / rate
+        kind = f"{seconds:.1f} s of {rate} Hz audio"
+    except (wave.Error, EOFError):
+        seconds = 0
+        kind    = f"{size} bytes of audio"
+    with open(path, 'rb') as f:
+        digest = hashlib.sha1(f.read(BLOCK)).hexdigest()[:8]
+    words = [{'text': f"w{i}", 'start': i * 1000, 'end': i * 1000 + 800, 'confidence': 1.0}
+             for i in range(int(seconds))]
+    return f"[stand-in transcript {digest}: {kind}]", words
+
+
+class Backend:
+    def __init__(self, root, delay):
+        self.root        = Path(root)
+        self.delay       = delay
+        self.lock        = threading.Lock()
+        self.transcripts = {}
+        self.uploads     = 0
+        self.submitted   = 0
+
+
+class Handler(BaseHTTPRequestHandler):
+    backend = None
+
+    def log_message(self, fmt, *args):
+        sys.stderr.write(f"[STANDIN] {fmt % args}\n")
+
+    def reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_body(self, out):
+        """Copy the request body to `out` block by block, sized or chunked."""
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            while True:
+                size = int(self.rfile.readline().split(b';')[0], 16)
+                if not size:
+                    self.rfile.readline()
+                    return
+                out.write(self.rfile.read(size))
+                self.rfile.readline()
+        left = int(self.headers.get('Content-Length', 0))
+        while left > 0:
+            block = self.rfile.read(min(BLOCK, left))
+            if not block:
+                return
+            out.write(block)
+            left -= len(block)
+
+    def do_POST(self):
+        backend = self.backend
+        if self.path == '/v2/upload':
+            name = uuid.uuid4().hex
+            with open(backend.root / name, 'wb') as f:
+                self.read_body(f)
+            with backend.lock:
+                backend.uploads += 1
+            host = self.headers.get('Host', 'localhost')
+            return self.reply(200, {'upload_url': f"http://{host}/files/{name}"})
+
+        if self.path == '/v2/transcript':
+            body = io.BytesIO()
+            self.read_body(body)
+            try:
+                name = json.loads(body.getvalue())['audio_url'].rsplit('/', 1)[-1]
+            except (ValueError, KeyError):
+                return self.reply(400, {'error': 'audio_url is required'})
+            if not (backend.root / name).is_file():
+                return self.reply(400, {'error': 'unknown audio_url'})
+            tid = uuid.uuid4().hex
+            with backend.lock:
+                backend.submitted += 1
+                backend.transcripts[tid] = {'file': name, 'ready_at': time.monotonic() + backend.delay}
+            return self.reply(200, {'id': tid, 'status': 'queued'})
+
+        self.reply(404, {'error': 'not found'})
+
+    def do_GET(self):
+        backend = self.backend
+        if self.path.startswith('/v2/transcript/'):
+            tid = self.path.rsplit('/', 1)[-1]
+            with backend.lock:
+                job = backend.transcripts.get(tid)
+            if job is None:
+                return self.reply(404, {'error': 'transcript not found'})
+            if time.monotonic() < job['ready_at']:
+                return self.reply(200, {'id': tid, 'status': 'processing'})
+            text, words = describe(backend.root / job['file'])
+            return self.reply(200, {'id': tid, 'status': 'completed', 'text': text, 'words': words})
+
+        if self.path == '/stats':
+            return self.reply(200, {'uploads': backend.uploads, 'submitted': backend.submitted})
+
+        self.reply(404, {'error': 'not found'})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--delay', type=float, default=2.0, help='seconds before a transcript completes')
+    parser.add_argument('--dir', help='where uploads are kept (default: a temporary directory)')
+    args = parser.parse_args()
+
+    Handler.backend = Backend(args.dir or tempfile.mkdtemp(prefix='standin-'), args.delay)
+    server = ThreadingHTTPServer(('0.0.0.0', args.port), Handler)
+    print(f"Stand-in transcription API on http://localhost:{args.port}/v2, "
+          f"uploads in {Handler.backend.root}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
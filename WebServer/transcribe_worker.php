@@ -0,0 +1,68 @@
+<?php
+// Runs queued transcription jobs (see transcribe.php) outside the web server.
+//
+//     php transcribe_worker.php                  # 4 jobs at a time, forever
+//     php transcribe_worker.php --concurrency 8
+//     php transcribe_worker.php --once           # drain the queue and exit
+//
+// Each job runs in its own forked child, so one long upload or poll never
+// holds up the others. Without pcntl the jobs run one after another.
+
+if (PHP_SAPI !== 'cli') {
+    exit("Run from the command line.\n");
+}
+require __DIR__ . '/transcribe.php';
+
+define('WORKER_IDLE_SEC', 2);       // queue poll interval when there is nothing to do
+
+$opts        = getopt('', ['concurrency:', 'once']);
+$concurrency = max(1, (int)($opts['concurrency'] ?? 4));
+$once        = isset($opts['once']);
+$canFork     = function_exists('pcntl_fork');
+
+function workerLog($msg) {
+    fwrite(STDERR, '[' . date('Y-m-d H:i:s') . '] ' . $msg . "\n");
+}
+
+function runLogged($job) {
+    workerLog("job {$job['id']}: {$job['folder']}/{$job['file']} (attempt {$job['attempts']})");
+    runJob($job);
+    $job = getJob($job['id']);
+    workerLog("job {$job['id']}: {$job['status']}" . ($job['error'] ? " - {$job['error']}" : ''));
+}
+
+$children = [];
+while (true) {
+    // reap finished children
+    while ($children && ($pid = pcntl_waitpid(-1, $status, WNOHANG)) > 0) {
+        unset($children[$pid]);
+    }
+
+    $job = count($children) < $concurrency ? claimJob() : null;
+    if ($job === null) {
+        if ($once && !$children) {
+            break;
+        }
+        sleep(WORKER_IDLE_SEC);
+        continue;
+    }
+
+    if (!$canFork) {
+        runLogged($job);
+        continue;
+    }
+    jobsDb(true);
+    catalogDb(true);
+    $pid = pcntl_fork();
+    if ($pid === 0) {
+        runLogged($job);
+        exit(0);
+    }
+    if ($pid < 0) {
+        workerLog("fork failed for job {$job['id']}");
+        touchJob($job['id'], ['status' => 'queued']);
+        sleep(WORKER_IDLE_SEC);
+        continue;
+    }
+    $children[$pid] = $job['id'];
+}
@@ -1,19 +1,452 @@
 <?php
+require_once __DIR__ . '/timeline.php';
+require __DIR__ . '/transcribe.php';
+
 // Configuration
 $allowedExtensions = ['wav', 'mp3', 'csv', 'opus', 'raw'];
 $uploadBaseDir    = 'uploads/';
 $logFile          = 'upload_log.csv';
 $apiKey           = '@YourPassword123';
 
-// For raw→WAV conversion
+// For raw→WAV conversion: defaults for clients that don't send their format
 define('RAW_SAMPLE_RATE',   88200);
 define('RAW_CHANNELS',      1);
 define('RAW_BITS_PER_SAMPLE', 16);
 
+// Chunk envelope written by Device/Firmware/envelope.py (version 1 fields,
+// then the version 2 and 3 extensions when header_len covers them)
+define('ENVELOPE_MAGIC',  'SCRB');
+define('ENVELOPE_SIZE',   52);
+define('ENVELOPE_FORMAT', 'a4magic/Cversion/Ccodec/Cchannels/Cbits/vheader_len/vflags/'
+                        . 'Vsample_rate/Vseq/Pbyte_offset/Psample_offset/Pcapture_us/Vlength/Vcrc');
+define('ENVELOPE_EXT_SIZE',   12);
+define('ENVELOPE_EXT_FORMAT', 'Pmono_us/Vframes');
+define('ENVELOPE_LEVELS_SIZE',   8);
+define('ENVELOPE_LEVELS_FORMAT', 'vrms/vpeak/Vclipped');    // dBFS x 100, signed
+
+define('CODEC_PCM',  0);
+define('CODEC_OPUS', 1);
+define('FLAG_FINAL',   1);          // last chunk of a session
+define('FLAG_SILENCE', 2);          // no payload: `frames` of silence the device's VAD skipped
+
+// Ingest tuning
+define('HEADER_PATCH_SEC', 10);     // rewrite WAV header sizes at most this often
+define('LOG_FLUSH_CHUNKS', 30);     // enveloped chunk log lines buffered per session
+define('COPY_BLOCK',       65536);
+
+// A session is flagged when this share of its samples hit full scale, or
+// when even its loudest chunk stays below QUIET_FLAG_DBFS (a dead mic)
+define('CLIP_FLAG_RATIO', 0.001);
+define('QUIET_FLAG_DBFS', -50);
+
+// Live transcription: every LIVE_WINDOW_SEC of streamed audio is queued for
+// transcribe_worker.php as it lands (0 turns it off). A window waits
+// LIVE_WINDOW_LAG_SEC longer so an Opus encoder's last pages are in.
+define('LIVE_WINDOW_SEC',     30);
+define('LIVE_WINDOW_LAG_SEC', 1);
+
+// ————————————————————————————————————————————————————————————————
+// HELPERS
+// ————————————————————————————————————————————————————————————————
+
+// Multipart clients send form fields; raw envelope bodies send X- headers
+function param($name, $default = null) {
+    $header = 'HTTP_X_' . strtoupper($name);
+    return $_POST[$name] ?? $_SERVER[$header] ?? $default;
+}
+
+// Standard 44-byte PCM WAV header; sizes are patched as data arrives
+function wavHeader($sampleRate, $channels, $bitsPerSample, $dataSize = 0) {
+    $byteRate    = $sampleRate * $channels * ($bitsPerSample/8);
+    $blockAlign  = $channels * ($bitsPerSample/8);
+
+    $header  = 'RIFF' . pack('V', $dataSize + 36) . 'WAVE';
+    $header .= 'fmt ' . pack('V', 16);          // Subchunk1Size
+    $header .= pack('v', 1);                    // PCM format
+    $header .= pack('v', $channels);
+    $header .= pack('V', $sampleRate);
+    $header .= pack('V', $byteRate);
+    $header .= pack('v', $blockAlign);
+    $header .= pack('v', $bitsPerSample);
+    $header .= 'data' . pack('V', $dataSize);   // Subchunk2Size
+    return $header;
+}
+
+// Reads exactly $length bytes from a stream (php://input may return less)
+function readFully($in, $length) {
+    $data = '';
+    while (strlen($data) < $length && !feof($in)) {
+        $block = fread($in, $length - strlen($data));
+        if ($block === false || $block === '') break;
+        $data .= $block;
+    }
+    return $data;
+}
+
+// Reads and discards $length bytes of $in, a payload not being stored, so
+// the next envelope in a batch starts where it should. Returns the bytes
+// actually skipped.
+function skipPayload($in, $length) {
+    $left = $length;
+    while ($left > 0) {
+        $block = fread($in, min(COPY_BLOCK, $left));
+        if ($block === false || $block === '') break;
+        $left -= strlen($block);
+    }
+    return $length - $left;
+}
+
+// Reads the envelope header from $in and leaves it positioned at the
+// payload. Returns null if the stream does not start with an envelope;
+// $read says how many bytes were consumed looking (0 at end of stream).
+function readEnvelopeHeader($in, &$read = null) {
+    $head = readFully($in, ENVELOPE_SIZE);
+    $read = strlen($head);
+    if (strlen($head) < ENVELOPE_SIZE || substr($head, 0, 4) !== ENVELOPE_MAGIC) {
+        return null;
+    }
+    $env = unpack(ENVELOPE_FORMAT, $head)
+         + ['mono_us' => 0, 'frames' => 0, 'rms' => null, 'peak' => null, 'clipped' => 0];
+    if ($env['header_len'] > ENVELOPE_SIZE) {
+        $extra = readFully($in, $env['header_len'] - ENVELOPE_SIZE);
+        if (strlen($extra) >= ENVELOPE_EXT_SIZE) {
+            $env = unpack(ENVELOPE_EXT_FORMAT, $extra) + $env;
+        }
+        if (strlen($extra) >= ENVELOPE_EXT_SIZE + ENVELOPE_LEVELS_SIZE) {
+            $levels = unpack(ENVELOPE_LEVELS_FORMAT, substr($extra, ENVELOPE_EXT_SIZE));
+            $env['rms']     = signed16($levels['rms']) / 100;
+            $env['peak']    = signed16($levels['peak']) / 100;
+            $env['clipped'] = $levels['clipped'];
+        }
+        // anything past that is from newer versions and skipped
+    }
+    return $env;
+}
+
+// Queues the session's audio for live transcription in LIVE_WINDOW_SEC
+// windows, each as soon as the stream holds it with no chunk missing before
+// it. Windows are cut in stream time (the audio in the stream file, without
+// the silence the device skipped); the worker maps them back to session
+// time. The last, shorter window goes once the final chunk is in.
+function queueLiveWindows(&$state, $sessionDir, $streamName) {
+    $live = ($state['live'] ?? []) + ['queued' => 0, 'windows' => 0, 'done' => false];
+    if (!LIVE_WINDOW_SEC || $live['done'] || $state['highest_seq'] !== $state['received']) {
+        return;
+    }
+    $rate     = $state['format'][1];
+    $window   = LIVE_WINDOW_SEC * $rate;
+    $streamed = $state['frames'] - ($state['silent_frames'] ?? 0);
+    $folder   = basename($sessionDir);
+
+    while ($streamed - $live['queued'] >= $window + LIVE_WINDOW_LAG_SEC * $rate) {
+        enqueueWindow($folder, $streamName, 'live', $live['windows']++,
+                      $live['queued'] / $rate, LIVE_WINDOW_SEC);
+        $live['queued'] += $window;
+    }
+    if ($state['final']) {
+        if ($streamed > $live['queued']) {
+            enqueueWindow($folder, $streamName, 'live', $live['windows']++,
+                          $live['queued'] / $rate, ($streamed - $live['queued']) / $rate);
+            $live['queued'] = $streamed;
+        }
+        $live['done'] = true;
+    }
+    $state['live'] = $live;
+}
+
+// Why a session's levels make it a bad recording, or null. Quietness is
+// only judged once the whole session is in.
+function levelFlag($state) {
+    if (empty($state['frames']) || !isset($state['loudest_rms'])) {
+        return null;
+    }
+    $samples = $state['frames'] * $state['format'][2];
+    if ($state['clipped'] >= CLIP_FLAG_RATIO * $samples) {
+        return 'clipping';
+    }
+    if ($state['final'] && $state['loudest_rms'] < QUIET_FLAG_DBFS) {
+        return 'too quiet';
+    }
+    return null;
+}
+
+// Copies one enveloped payload from $in into the session stream at its byte
+// offset, block by block, so neither the chunk nor the stream is ever held
+// in memory. stream.state (JSON, under flock) holds the format, counters,
+// when the WAV header was last patched and the buffered log lines;
+// stream.seqs has one byte per seq to spot duplicates and gaps.
+// Returns [http status, message].
+function ingestEnvelope($in, $env, $sessionDir, $logPrefix) {
+    global $logFile;
+
+    if ($env['version'] < 1 || $env['header_len'] < ENVELOPE_SIZE) {
+        return [422, 'Error: Unsupported envelope.'];
+    }
+
+    $isOpus     = $env['codec'] === CODEC_OPUS;
+    $isFinal    = ($env['flags'] & FLAG_FINAL) !== 0;
+    $isSilence  = ($env['flags'] & FLAG_SILENCE) !== 0;
+    $streamName = $isOpus ? 'stream.opus' : 'stream.wav';
+    $streamPath = $sessionDir . $streamName;
+    $headerSize = $isOpus ? 0 : 44;
+    $format     = [$env['codec'], $env['sample_rate'], $env['channels'], $env['bits']];
+    $seq        = $env['seq'];
+
+    // one writer per session at a time
+    $stateFp = fopen($sessionDir . 'stream.state', 'c+');
+    flock($stateFp, LOCK_EX);
+    $state = json_decode(stream_get_contents($stateFp), true);
+    $isNew = !$state;
+    if ($isNew) {
+        $state = [
+            'format'        => $format,
+            'highest_seq'   => 0,
+            'received'      => 0,
+            'duplicates'    => 0,
+            'data_end'      => 0,
+            'header_end'    => 0,
+            'header_at'     => 0,
+            'final'         => false,
+            'frames'        => 0,
+            'silent_frames' => 0,
+            'clipped'       => 0,
+            'loudest_rms'   => null,
+            'flag'          => null,
+            'log'           => [],
+        ];
+    } elseif ($state['format'] !== $format) {
+        flock($stateFp, LOCK_UN);
+        fclose($stateFp);
+        skipPayload($in, $env['length']);
+        return [409, 'Error: Chunk format does not match the session stream.'];
+    }
+
+    $seqsFp = fopen($sessionDir . 'stream.seqs', 'c+b');
+    fseek($seqsFp, $seq);
+    $isDuplicate = fread($seqsFp, 1) === "\x01";
+
+    $status  = 200;
+    $message = '';
+    if ($isDuplicate) {
+        // a retry of a chunk already stored: its bytes still have to be
+        // read past before the next envelope
+        $state['duplicates']++;
+        $message = "Duplicate chunk {$seq} ignored.";
+        if (skipPayload($in, $env['length']) < $env['length']) {
+            $status  = 422;
+            $message = 'Error: Truncated chunk.';
+        }
+    } else {
+        $fp = fopen($streamPath, 'c+b');
+        if ($isNew && !$isOpus) {
+            fwrite($fp, wavHeader($env['sample_rate'], $env['channels'], $env['bits']));
+        }
+
+        // stream the payload straight into place, checksumming as it goes
+        fseek($fp, $headerSize + $env['byte_offset']);
+        $crc  = hash_init('crc32b');
+        $left = $env['length'];
+        while ($left > 0) {
+            $block = fread($in, min(COPY_BLOCK, $left));
+            if ($block === false || $block === '') break;
+            hash_update($crc, $block);
+            fwrite($fp, $block);
+            $left -= strlen($block);
+        }
+
+        if ($left > 0) {
+            $status  = 422;
+            $message = 'Error: Truncated chunk.';
+        } elseif (hexdec(hash_final($crc)) !== $env['crc']) {
+            // the bad bytes stay in place until the device's retry overwrites them
+            $status  = 422;
+            $message = 'Error: Checksum mismatch.';
+        } else {
+            $state['data_end']    = max($state['data_end'], $env['byte_offset'] + $env['length']);
+            $state['received']++;
+            $state['highest_seq'] = max($state['highest_seq'], $seq);
+            $state['final']       = $state['final'] || $isFinal;
+            // frames of the session the server holds, and how many were silence
+            $state['frames']      = ($state['frames'] ?? 0) + $env['frames'];
+            if ($isSilence) {
+                $state['silent_frames'] = ($state['silent_frames'] ?? 0) + $env['frames'];
+            }
+            // levels from version 3 devices; older ones leave them unset
+            if ($env['rms'] !== null) {
+                $state['clipped'] = ($state['clipped'] ?? 0) + $env['clipped'];
+                if ($env['frames'] && !$isSilence) {
+                    $state['loudest_rms'] = max($state['loudest_rms'] ?? $env['rms'], $env['rms']);
+                }
+            }
+            $flag = levelFlag($state);
+            if ($flag !== null && $flag !== ($state['flag'] ?? null)) {
+                file_put_contents($logFile, implode(',', array_merge($logPrefix, ['flagged', $flag])) . "\n",
+                                  FILE_APPEND | LOCK_EX);
+            }
+            $state['flag'] = $flag;
+            fseek($seqsFp, $seq);
+            fwrite($seqsFp, "\x01");
+
+            // timeline record in the chunk's own slot, so seeks and gap
+            // checks never depend on arrival order
+            $tlFp = fopen($sessionDir . 'stream.timeline', 'c+b');
+            fseek($tlFp, ($seq - 1) * TIMELINE_RECORD);
+            fwrite($tlFp, timelineRecord($seq, $env));
+            fclose($tlFp);
+
+            queueLiveWindows($state, $sessionDir, $streamName);
+
+            $missing = $state['highest_seq'] - $state['received'];
+            $message = $isSilence
+                ? "Stored silence marker {$seq}: {$env['frames']} frames at frame {$env['sample_offset']}. Missing chunks: {$missing}"
+                : "Stored chunk {$seq} at offset {$env['byte_offset']} ({$env['length']} bytes). Missing chunks: {$missing}";
+            if ($flag !== null) {
+                $message .= " Flagged: {$flag}.";
+            }
+        }
+
+        // WAV sizes are only rewritten every HEADER_PATCH_SEC and at the end
+        // of the session, not on every chunk
+        $headerDue = $state['final'] || time() - $state['header_at'] >= HEADER_PATCH_SEC;
+        if (!$isOpus && $headerDue && $state['header_end'] !== $state['data_end']) {
+            fseek($fp, 4);
+            fwrite($fp, pack('V', $state['data_end'] + 36));
+            fseek($fp, 40);
+            fwrite($fp, pack('V', $state['data_end']));
+            $state['header_end'] = $state['data_end'];
+            $state['header_at']  = time();
+        }
+        fclose($fp);
+    }
+    fclose($seqsFp);
+
+    if ($status === 200) {
+        $state['log'][] = implode(',', array_merge($logPrefix, [
+            $streamName, "seq{$seq}", $env['length'], $streamPath
+        ]));
+        if (count($state['log']) >= LOG_FLUSH_CHUNKS || $state['final']) {
+            file_put_contents($logFile, implode("\n", $state['log']) . "\n", FILE_APPEND | LOCK_EX);
+            $state['log'] = [];
+        }
+    }
+
+    ftruncate($stateFp, 0);
+    rewind($stateFp);
+    fwrite($stateFp, json_encode($state));
+    fflush($stateFp);
+    flock($stateFp, LOCK_UN);
+    fclose($stateFp);
+
+    // the manager's listing; a new session gets a full scan for its file list
+    $folder = basename($sessionDir);
+    if ($isNew) {
+        catalogScan($folder, ['device' => $logPrefix[2], 'session' => $logPrefix[3]]);
+    } elseif ($status === 200 && !$isDuplicate) {
+        catalogUpdate($folder, [
+            'updated_at'   => time(),
+            'duration_sec' => $state['frames'] / $env['sample_rate'],
+            'bytes'        => $headerSize + $state['data_end'],
+            'chunks'       => $state['received'],
+            'final'        => (int)$state['final'],
+            'flag'         => $state['flag'],
+        ]);
+    }
+
+    return [$status, $message];
+}
+
+// Ingests every envelope in $in. A batch from the device is simply several
+// envelopes back to back, so a single chunk is a batch of one. Stops at the
+// first chunk that fails; those before it are stored, and the device's retry
+// of the whole batch is absorbed by the duplicate check.
+// Returns [http status, message], or null if $in holds no envelope at all.
+function ingestEnvelopes($in, $sessionDir, $logPrefix) {
+    $messages = [];
+    while (($env = readEnvelopeHeader($in, $read)) !== null) {
+        [$status, $message] = ingestEnvelope($in, $env, $sessionDir, $logPrefix);
+        $messages[] = $message;
+        if ($status !== 200) {
+            return [$status, implode("\n", $messages)];
+        }
+    }
+    if (!$messages) {
+        return null;
+    }
+    if ($read > 0) {
+        $messages[] = 'Error: Trailing bytes after chunk ' . count($messages) . '.';
+        return [400, implode("\n", $messages)];
+    }
+    return [200, implode("\n", $messages)];
+}
+
+// Appends highlight events (JSON lines from Device/Firmware/highlights.py)
+// to the session's highlights.csv, skipping ids it already holds so a
+// retried delivery is harmless. Returns [http status, message].
+function ingestHighlights($body, $sessionDir, $logPrefix) {
+    global $logFile;
+
+    $events = [];
+    foreach (preg_split('/\r?\n/', trim($body)) as $line) {
+        $event = json_decode($line, true);
+        if (!is_array($event) || !isset($event['id'], $event['press_sample'],
+                                         $event['start_sample'], $event['end_sample'])) {
+            return [400, 'Error: Malformed highlight event.'];
+        }
+        $events[] = $event;
+    }
+
+    $fp = fopen($sessionDir . 'highlights.csv', 'c+');
+    flock($fp, LOCK_EX);
+    $known = [];
+    while (($row = fgetcsv($fp)) !== false) {
+        $known[$row[0]] = true;
+    }
+    $isNew = !$known;
+    if ($isNew) {
+        fwrite($fp, "id,event,press_sample,start_sample,end_sample,sample_rate,press_time\n");
+    }
+
+    $stored = 0;
+    $logLines = [];
+    foreach ($events as $event) {
+        $id = preg_replace('/[^A-Za-z0-9_\-\.]/', '_', $event['id']);
+        if (isset($known[$id])) {
+            continue;
+        }
+        $known[$id] = true;
+        fputcsv($fp, [
+            $id,
+            (int)($event['event'] ?? 0),
+            (int)$event['press_sample'],
+            (int)$event['start_sample'],
+            (int)$event['end_sample'],
+            (int)($event['sample_rate'] ?? 0),
+            date('c', (int)($event['press_time'] ?? time())),
+        ]);
+        $logLines[] = implode(',', array_merge($logPrefix, ['highlight', $id, $event['press_sample']]));
+        $stored++;
+    }
+    fflush($fp);
+    flock($fp, LOCK_UN);
+    fclose($fp);
+
+    if ($logLines) {
+        file_put_contents($logFile, implode("\n", $logLines) . "\n", FILE_APPEND | LOCK_EX);
+    }
+    // $known still counts the header row
+    if ($isNew) {
+        catalogScan(basename($sessionDir), ['device' => $logPrefix[2], 'session' => $logPrefix[3]]);
+    } elseif ($stored) {
+        catalogUpdate(basename($sessionDir), ['highlights' => count($known) - 1]);
+    }
+    $duplicates = count($events) - $stored;
+    return [200, "Stored {$stored} highlight(s), {$duplicates} duplicate(s)."];
+}
+
 // ————————————————————————————————————————————————————————————————
 // 1) AUTHENTICATE
 // ————————————————————————————————————————————————————————————————
-if (!isset($_POST['api_key']) || $_POST['api_key'] !== $apiKey) {
+if (param('api_key') !== $apiKey) {
     http_response_code(403);
     echo "Forbidden: Invalid API key.";
     exit;
@@ -24,8 +457,22 @@ if (!isset($_POST['api_key']) || $_POST['api_key'] !== $apiKey) {
 // ————————————————————————————————————————————————————————————————
 $clientIp  = $_SERVER['REMOTE_ADDR'];
 $timestamp = date('Y-m-d H:i:s');
-$deviceId  = preg_replace('/[^A-Za-z0-9_\-\.]/','_', $_POST['device_id']  ?? 'unknown_device');
-$sessionId = preg_replace('/[^A-Za-z0-9_\-\.]/','_', $_POST['session_id'] ?? 'unknown_session');
+$deviceId  = preg_replace('/[^A-Za-z0-9_\-\.]/','_', param('device_id',  'unknown_device'));
+$sessionId = preg_replace('/[^A-Za-z0-9_\-\.]/','_', param('session_id', 'unknown_session'));
+$logPrefix = [$timestamp, $clientIp, $deviceId, $sessionId];
+$logLines  = [];   // written to $logFile in one append at the end
+
+// PCM format of raw chunks, sent by the device with each upload
+$sampleRate    = (int)param('sample_rate',     RAW_SAMPLE_RATE);
+$channels      = (int)param('channels',        RAW_CHANNELS);
+$bitsPerSample = (int)param('bits_per_sample', RAW_BITS_PER_SAMPLE);
+if ($sampleRate < 8000 || $sampleRate > 192000
+    || $channels < 1 || $channels > 8
+    || !in_array($bitsPerSample, [8, 16, 24, 32])) {
+    http_response_code(400);
+    echo "Error: Unsupported audio format.";
+    exit;
+}
 
 $sessionDir = $uploadBaseDir . "{$deviceId}_{$sessionId}/";
 if (!is_dir($sessionDir) && !mkdir($sessionDir, 0775, true)) {
@@ -35,8 +482,41 @@ if (!is_dir($sessionDir) && !mkdir($sessionDir, 0775, true)) {
 }
 
 // ————————————————————————————————————————————————————————————————
-// 3) HANDLE EACH UPLOADED FILE
+// 3) RAW ENVELOPE BODY
+//    Content-Type: application/octet-stream, one or more enveloped chunks
+//    streamed from php://input without a temporary upload file.
+// ————————————————————————————————————————————————————————————————
+if (stripos($_SERVER['CONTENT_TYPE'] ?? '', 'application/octet-stream') === 0) {
+    $in     = fopen('php://input', 'rb');
+    $result = ingestEnvelopes($in, $sessionDir, $logPrefix);
+    fclose($in);
+    if ($result === null) {
+        http_response_code(400);
+        echo "Error: Body is not a chunk envelope.";
+        exit;
+    }
+    [$status, $message] = $result;
+    http_response_code($status);
+    echo $message . "\n";
+    exit;
+}
+
+// ————————————————————————————————————————————————————————————————
+// 3b) HIGHLIGHT EVENTS
+//    One small form field per delivery, deduplicated by event id.
 // ————————————————————————————————————————————————————————————————
+$highlightEvents = param('highlight_events');
+if ($highlightEvents !== null) {
+    [$status, $message] = ingestHighlights($highlightEvents, $sessionDir, $logPrefix);
+    http_response_code($status);
+    echo $message . "\n";
+    exit;
+}
+
+// ————————————————————————————————————————————————————————————————
+// 4) HANDLE EACH UPLOADED FILE
+// ————————————————————————————————————————————————————————————————
+$catalogDue = false;   // a legacy or one-off file changed the folder
 foreach ($_FILES as $field => $file) {
     $origName = basename($file['name']);
     $ext      = strtolower(pathinfo($origName, PATHINFO_EXTENSION));
@@ -54,7 +534,57 @@ foreach ($_FILES as $field => $file) {
     }
 
     // ————————————————————————————————————————
-    // A) WAV or RAW AUDIO CHUNK STREAMING
+    // A) ENVELOPED CHUNKS
+    //    The envelope says where the payload belongs, so chunks can arrive
+    //    in any order (see ingestEnvelope).
+    // ————————————————————————————————————————
+    if ($field === 'audio_chunk') {
+        $in     = fopen($file['tmp_name'], 'rb');
+        $result = ingestEnvelopes($in, $sessionDir, $logPrefix);
+        fclose($in);
+        if ($result !== null) {
+            [$status, $message] = $result;
+            if ($status !== 200) {
+                http_response_code($status);
+                echo $message;
+                exit;
+            }
+            echo $message . "\n";
+            continue;
+        }
+    }
+
+    // ————————————————————————————————————————
+    // B) OGG/OPUS CHUNK STREAMING (legacy, no envelope)
+    //    Each chunk is the next slice of one Ogg stream from the device's
+    //    encoder, so appending them in order rebuilds a playable file.
+    // ————————————————————————————————————————
+    if ($field === 'audio_chunk' && $ext === 'opus') {
+        $streamPath = $sessionDir . 'stream.opus';
+        file_put_contents($streamPath, file_get_contents($file['tmp_name']), FILE_APPEND | LOCK_EX);
+        clearstatcache(true, $streamPath);
+        $totalSize = filesize($streamPath);
+
+        echo "Appended opus chunk ({$size} bytes). Total stream size: {$totalSize} bytes\n";
+
+        $logEntry = [
+            $timestamp,
+            $clientIp,
+            $deviceId,
+            $sessionId,
+            'stream.opus',
+            $ext,
+            $size,
+            $streamPath
+        ];
+        $logLines[] = implode(',', $logEntry);
+        $catalogDue = true;
+
+        continue;
+    }
+
+    // ————————————————————————————————————————
+    // C) WAV or RAW AUDIO CHUNK STREAMING (legacy, no envelope)
     // ————————————————————————————————————————
     if ($field === 'audio_chunk' && in_array($ext, ['wav','raw'])) {
         $streamPath = $sessionDir . 'stream.wav';
@@ -71,19 +601,7 @@ foreach ($_FILES as $field => $file) {
 
         // First chunk? write WAV header + PCM
         if (!file_exists($streamPath)) {
-            // Build standard 44-byte WAV header with placeholders
-            $byteRate    = RAW_SAMPLE_RATE * RAW_CHANNELS * (RAW_BITS_PER_SAMPLE/8);
-            $blockAlign  = RAW_CHANNELS * (RAW_BITS_PER_SAMPLE/8);
-
-            $header  = 'RIFF' . pack('V', 0) . 'WAVE';
-            $header .= 'fmt ' . pack('V', 16);          // Subchunk1Size
-            $header .= pack('v', 1);                    // PCM format
-            $header .= pack('v', RAW_CHANNELS);
-            $header .= pack('V', RAW_SAMPLE_RATE);
-            $header .= pack('V', $byteRate);
-            $header .= pack('v', $blockAlign);
-            $header .= pack('v', RAW_BITS_PER_SAMPLE);
-            $header .= 'data' . pack('V', 0);           // Subchunk2Size
+            $header = wavHeader($sampleRate, $channels, $bitsPerSample);
 
             // Write header + first PCM block
             file_put_contents($streamPath, $header . $pcmData);
@@ -121,21 +639,33 @@ foreach ($_FILES as $field => $file) {
             $size,
             $streamPath
         ];
-        file_put_contents($logFile, implode(',', $logEntry) . "\n", FILE_APPEND);
+        $logLines[] = implode(',', $logEntry);
+        $catalogDue = true;
 
         continue;
     }
 
     // ————————————————————————————————————————
-    // B) ONE-OFF FILES (CSV, MP3, OPUS, etc.)
+    // D) ONE-OFF FILES (CSV, MP3, OPUS, etc.)
+    //    Highlight clips cut on the device go to highlights/.
     // ————————————————————————————————————————
-    $dest = $sessionDir . $origName;
+    $destDir = $sessionDir;
+    if ($field === 'highlight_clip') {
+        $destDir .= 'highlights/';
+        if (!is_dir($destDir) && !mkdir($destDir, 0775, true)) {
+            http_response_code(500);
+            echo "Error: Could not create highlights directory.";
+            exit;
+        }
+    }
+    $dest = $destDir . $origName;
     if (!move_uploaded_file($file['tmp_name'], $dest)) {
         echo "Failed to upload: {$origName}\n";
         continue;
     }
 
     echo "Uploaded: {$origName}\n";
+    $catalogDue = true;
 
     // Log
     $logEntry = [
@@ -148,6 +678,13 @@ foreach ($_FILES as $field => $file) {
         $size,
         $dest
     ];
-    file_put_contents($logFile, implode(',', $logEntry) . "\n", FILE_APPEND);
+    $logLines[] = implode(',', $logEntry);
+}
+
+if ($logLines) {
+    file_put_contents($logFile, implode("\n", $logLines) . "\n", FILE_APPEND | LOCK_EX);
+}
+if ($catalogDue) {
+    catalogScan("{$deviceId}_{$sessionId}", ['device' => $deviceId, 'session' => $sessionId]);
 }
 ?>